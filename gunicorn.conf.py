@@ -0,0 +1,35 @@
+"""
+Gunicorn settings for the UW Alerts web app.
+The app is imported once in the master process and the geospatial
+assets are loaded there, so every forked worker shares them
+copy-on-write instead of reading and indexing them again.
+"""
+import os
+import sys
+
+preload_app = True
+# Tells the app not to start background threads before the fork
+os.environ['UW_ALERTS_PRELOAD'] = '1'
+
+
+def get_app_module():
+    """
+    Returns the imported uw-alert-web.uw-alert-web module.
+    """
+    return sys.modules['uw-alert-web.uw-alert-web']
+
+
+def when_ready(server):
+    """
+    Loads the shared assets in the master after the app was preloaded.
+    """
+    get_app_module().preload_assets()
+    server.log.info("Preloaded street index and alerts")
+
+
+def post_fork(server, worker):
+    """
+    Starts the background threads of each worker.
+    """
+    get_app_module().start_background_tasks()
+    server.log.info(f"Worker {worker.pid} started background tasks")
@@ -0,0 +1,402 @@
+"""
+Name: Alert Store
+What it does:
+- Holds the cleaned UW Alerts data (data/uw_alerts_clean.csv)
+  in memory so web routes do not re-read and re-parse the csv
+  on every request
+- Reloads the data only when the file changes on disk
+- Appends new alerts to a journal file next to the csv, so writes
+  cost O(new rows), and compacts the journal into a new csv
+  snapshot with an atomic rename
+
+outputs:
+- Pandas dataframe of the alerts with typed columns
+"""
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import ast
+import json
+import os
+import re
+import tempfile
+import threading
+import pandas as pd
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+
+def to_plain_value(value):
+    """
+    Converts a dataframe cell to a plain python value that can be
+    stored as JSON or in SQLite: NaN becomes None, numpy scalars
+    become python numbers and dates/times become strings.
+    """
+    if isinstance(value, (dict, list)):
+        return value
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if hasattr(value, 'item'):
+        # numpy scalars
+        return value.item()
+    if not isinstance(value, (str, int, float)):
+        # dates and times from clean_gpt_output
+        return str(value)
+    return value
+
+
+def parse_alert_frame(alerts_df):
+    """
+    Adds typed columns to a raw uw_alerts_clean.csv dataframe.
+
+    Parameters
+    ----------
+    alerts_df : pd.DataFrame
+        Result of reading in data/uw_alerts_clean.csv. The
+        geometry column may hold either the Google geocode
+        dictionaries or their python literal strings.
+
+    Returns
+    -------
+    alerts_df : pd.DataFrame
+        A copy of `alerts_df` where geometry holds dictionaries
+        and the following columns are added:
+            - date (datetime64) : parsed Date column
+            - report_datetime (datetime64) : parsed Date and Report Time,
+              NaT where the alert has no Report Time
+            - lat (float64) : latitude of the geocoded address
+            - lng (float64) : longitude of the geocoded address
+    """
+    if not isinstance(alerts_df, pd.DataFrame):
+        raise TypeError("alerts_df must be of type pd.DataFrame")
+    alerts_df = alerts_df.copy()
+    if 'geometry' in alerts_df.columns:
+        alerts_df['geometry'] = [
+            ast.literal_eval(geometry) if isinstance(geometry, str) else geometry
+            for geometry in alerts_df['geometry']]
+        locations = [geometry['location'] if isinstance(geometry, dict) else {}
+                     for geometry in alerts_df['geometry']]
+        alerts_df['lat'] = pd.to_numeric(
+            [location.get('lat') for location in locations], errors='coerce')
+        alerts_df['lng'] = pd.to_numeric(
+            [location.get('lng') for location in locations], errors='coerce')
+    if 'Date' in alerts_df.columns:
+        alerts_df['date'] = pd.to_datetime(alerts_df['Date'].astype(str), errors='coerce')
+        if 'Report Time' in alerts_df.columns:
+            has_report_time = ~alerts_df['Report Time'].isna()
+            report_datetimes = alerts_df['Date'].astype(str) + ' ' + \
+                alerts_df['Report Time'].astype(str)
+            alerts_df['report_datetime'] = pd.to_datetime(
+                report_datetimes.where(has_report_time), errors='coerce')
+    return alerts_df
+
+
+# pylint: disable=too-many-instance-attributes
+class AlertStore:
+    """
+    Process-wide, read-mostly store of the cleaned alerts csv.
+    The csv is parsed once per worker and only parsed again when
+    the file's version (inode, size and modification time) changes.
+
+    New alerts are appended to a journal (`<filepath>.journal`, one
+    JSON batch per line, fsynced) instead of rewriting the csv.
+    Readers merge the journal in front of the csv snapshot. Once the
+    journal grows past `compact_bytes` it is folded into a new csv
+    written to a temporary file and renamed over the old one. Writers
+    in different processes are serialized with a lock file.
+
+    The dataframe returned by get_alerts is shared between requests
+    and must be treated as read-only.
+
+    Parameters
+    ----------
+    filepath : str
+        Path to the cleaned alerts .csv file
+    compact_bytes : int (default=262144)
+        Journal size in bytes after which append_alerts compacts
+    """
+    def __init__(self, filepath, compact_bytes=262144):
+        if not isinstance(filepath, str):
+            raise ValueError("filepath must be a string")
+        if re.search(r'\.csv$', filepath) is None:
+            raise ValueError("filepath must have a .csv extension")
+        self.filepath = filepath
+        self.journal_path = filepath + '.journal'
+        self.lock_path = filepath + '.lock'
+        self.compact_bytes = compact_bytes
+        self.columns = []
+        # (alerts_df, version) swapped in as one object so readers
+        # never pair a dataframe with another load's version
+        self._snapshot = (None, None)
+        # Parsed csv kept between journal appends: (csv version, raw, typed)
+        self._csv_cache = (None, None, None)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _stat_version(path):
+        """
+        Returns (inode, size, mtime in ns) of `path`, or None if missing.
+        """
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def file_version(self):
+        """
+        Returns
+        -------
+        version : tuple
+            The (inode, size, mtime in ns) of the csv file and of
+            its journal. None for a file that does not exist.
+        """
+        return (self._stat_version(self.filepath), self._stat_version(self.journal_path))
+
+    @property
+    def version(self):
+        """
+        The version of the data currently held in memory.
+        Changes every time the store reloads.
+        """
+        return self._snapshot[1]
+
+    def get_alerts(self):
+        """
+        Returns the parsed alerts, reloading them first if the
+        file changed since the last load.
+
+        Returns
+        -------
+        alerts_df : pd.DataFrame
+            The typed alerts dataframe (see parse_alert_frame),
+            newest alerts first
+        """
+        return self.snapshot()[0]
+
+    def snapshot(self):
+        """
+        Same as get_alerts, but also returns the version of the
+        returned dataframe.
+
+        Returns
+        -------
+        (alerts_df, version) : tuple
+        """
+        alerts_df, version = self._snapshot
+        if alerts_df is None or self.file_version() != version:
+            self.reload()
+        return self._snapshot
+
+    def _read_journal(self, csv_inode):
+        """
+        Reads the journal batches that are not yet part of the csv.
+
+        Returns
+        -------
+        batches : list of lists of dict
+            Journal batches, oldest first
+        end : int
+            Byte offset after the last complete journal line
+        """
+        batches = []
+        end = 0
+        try:
+            with open(self.journal_path, 'rb') as journal:
+                for line in journal:
+                    if not line.endswith(b'\n'):
+                        # A write still in progress (or torn by a crash)
+                        break
+                    end += len(line)
+                    entry = json.loads(line)
+                    if 'compacted_inode' in entry:
+                        # Batches before the marker are in the snapshot
+                        # the compaction renamed into place
+                        if entry['compacted_inode'] == csv_inode:
+                            batches = []
+                    else:
+                        batches.append(entry['rows'])
+        except FileNotFoundError:
+            pass
+        return batches, end
+
+    def _load(self):
+        """
+        Reads the csv snapshot (unless unchanged) and the journal.
+
+        Returns
+        -------
+        (raw_df, typed_df, journal_end) : tuple
+            Untyped and typed merged alerts, newest first, and the
+            journal offset they include
+        """
+        csv_version = self._stat_version(self.filepath)
+        if self._csv_cache[0] != csv_version or self._csv_cache[1] is None:
+            raw_csv = pd.read_csv(self.filepath, index_col=False)
+            self._csv_cache = (csv_version, raw_csv, parse_alert_frame(raw_csv))
+        _, raw_csv, typed_csv = self._csv_cache
+        batches, journal_end = self._read_journal(csv_version[0])
+        columns = raw_csv.columns.to_list()
+        if len(batches) == 0:
+            self.columns = columns
+            return raw_csv, typed_csv, journal_end
+        # Newest batch first, keeping the row order within each batch
+        raw_journal = pd.DataFrame(
+            [row for batch in reversed(batches) for row in batch])
+        columns += [column for column in raw_journal.columns if column not in columns]
+        self.columns = columns
+        raw_df = pd.concat([raw_journal, raw_csv], ignore_index=True)
+        typed_df = pd.concat([parse_alert_frame(raw_journal), typed_csv], ignore_index=True)
+        return raw_df, typed_df, journal_end
+
+    def reload(self):
+        """
+        Loads the csv and journal into memory if they changed
+        since the last load. Concurrent callers wait for a single
+        reload.
+        """
+        with self._lock, self._file_lock(shared=True):
+            version = self.file_version()
+            if self._snapshot[0] is not None and version == self._snapshot[1]:
+                return
+            self._snapshot = (self._load()[1], version)
+
+    def get_raw_alerts(self):
+        """
+        Returns
+        -------
+        alerts_df : pd.DataFrame
+            A copy of the alerts with only the csv columns, suitable
+            for appending new rows and writing back to disk
+        """
+        return self.get_alerts()[self.columns].copy()
+
+    def query_urgent_alerts(self, time_frame):
+        """
+        Returns only the alerts of incidents that get_urgent_incidents
+        can report for `time_frame`: incidents with an alert reported
+        within the last `time_frame` hours, or with an alert from
+        today that has no report time.
+
+        Parameters
+        ----------
+        time_frame: int
+            The time_frame cutoff in hours
+
+        Returns
+        -------
+        alerts_df : pd.DataFrame
+            Every alert of the candidate incidents, newest first.
+            Can be passed directly to get_urgent_incidents.
+        """
+        alerts_df = self.get_alerts()
+        now = datetime.now()
+        recent = alerts_df['report_datetime'] > now - timedelta(hours=time_frame)
+        today = alerts_df['Report Time'].isna() & (alerts_df['date'].dt.date == now.date())
+        incident_ids = alerts_df.loc[recent | today, 'Incident ID'].unique()
+        return alerts_df[alerts_df['Incident ID'].isin(incident_ids)]
+
+    @contextmanager
+    def _file_lock(self, shared):
+        """
+        Context manager holding the inter-process lock file, shared
+        for readers and exclusive for writers.
+        """
+        with open(self.lock_path, 'a', encoding='utf8') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            # Closing the file releases the lock
+            yield
+
+    @contextmanager
+    def write_lock(self):
+        """
+        Context manager holding the store's exclusive write lock,
+        across threads and processes.
+        """
+        with self._lock, self._file_lock(shared=False):
+            yield
+
+    def _append_journal(self, entry):
+        """
+        Appends one JSON line to the journal and fsyncs it.
+        Callers hold the write lock.
+        """
+        line = json.dumps(entry) + '\n'
+        with open(self.journal_path, 'ab+') as journal:
+            # Drop a line torn by a crashed writer before appending after it
+            if journal.seek(0, os.SEEK_END) > 0:
+                journal.seek(-1, os.SEEK_END)
+                if journal.read(1) != b'\n':
+                    journal.seek(0)
+                    journal.truncate(journal.read().rfind(b'\n') + 1)
+            journal.write(line.encode('utf8'))
+            journal.flush()
+            os.fsync(journal.fileno())
+
+    def append_alerts(self, new_alerts):
+        """
+        Adds new alerts in front of the stored alerts by appending
+        them to the journal. Compacts the journal once it is larger
+        than `compact_bytes`.
+
+        Parameters
+        ----------
+        new_alerts : pd.DataFrame
+            Cleaned alerts with the uw_alerts_clean.csv columns,
+            newest first
+        """
+        if not isinstance(new_alerts, pd.DataFrame):
+            raise TypeError("new_alerts must be of type pd.DataFrame")
+        rows = [{column: to_plain_value(value) for column, value in row.items()}
+                for row in new_alerts.to_dict(orient='records')]
+        with self.write_lock():
+            self._append_journal({'rows': rows})
+            journal_size = os.path.getsize(self.journal_path)
+        if journal_size > self.compact_bytes:
+            self.compact()
+
+    def _write_snapshot(self, alerts_df):
+        """
+        Atomically replaces the csv with `alerts_df` and starts a new
+        journal. Callers hold the write lock.
+        """
+        directory = os.path.dirname(os.path.abspath(self.filepath))
+        with tempfile.NamedTemporaryFile(
+            'w', dir=directory, suffix='.csv.tmp', delete=False, encoding='utf8') as tmp:
+            alerts_df.to_csv(tmp, index=False)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        # Record which snapshot holds the current journal, so readers skip
+        # these batches even if we stop between the rename and the truncate
+        self._append_journal({'compacted_inode': os.stat(tmp.name).st_ino})
+        os.replace(tmp.name, self.filepath)
+        with open(self.journal_path, 'wb') as journal:
+            os.fsync(journal.fileno())
+
+    def compact(self):
+        """
+        Folds the journal into a new csv snapshot written to a
+        temporary file and renamed over the csv.
+        """
+        with self.write_lock():
+            raw_df, _, journal_end = self._load()
+            if journal_end > 0:
+                self._write_snapshot(raw_df[self.columns])
+
+    def replace_alerts(self, alerts_df):
+        """
+        Writes `alerts_df` as the new csv snapshot, replacing the
+        csv and journal.
+
+        Parameters
+        ----------
+        alerts_df : pd.DataFrame
+            Cleaned alerts with the uw_alerts_clean.csv columns,
+            newest first
+        """
+        if not isinstance(alerts_df, pd.DataFrame):
+            raise TypeError("alerts_df must be of type pd.DataFrame")
+        with self.write_lock():
+            self._write_snapshot(alerts_df)
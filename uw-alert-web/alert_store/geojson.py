@@ -0,0 +1,175 @@
+"""
+Name: Alerts GeoJSON
+What it does:
+- Filters the alerts held by an alert store by report time,
+  bounding box and incident category
+- Converts alerts to a GeoJSON FeatureCollection with one
+  Point feature per alert
+
+outputs:
+- GeoJSON FeatureCollection dictionaries for the /api/alerts route
+"""
+import hashlib
+import re
+import pandas as pd
+from .alert_store import to_plain_value
+
+# Columns returned as feature properties
+PROPERTY_COLUMNS = [
+    'Alert ID',
+    'Incident ID',
+    'Date',
+    'Report Time',
+    'Incident Time',
+    'Nearest Address to Incident',
+    'Incident Category',
+    'Incident Summary',
+    'Incident Alert',
+    'Alert Type',
+    'Google Address',
+]
+# Report times are stored as naive times in the campus time zone
+LOCAL_TIMEZONE = 'America/Los_Angeles'
+DATE_ONLY_PATTERN = re.compile(r'^\s*\d{4}-\d{2}-\d{2}\s*$')
+
+
+def to_local_time(timestamp):
+    """
+    Returns `timestamp` as a naive local time, converting it from
+    its time zone when it has one, so it compares with the stored
+    report times.
+    """
+    if timestamp is not None and timestamp.tzinfo is not None:
+        return timestamp.tz_convert(LOCAL_TIMEZONE).tz_localize(None)
+    return timestamp
+
+
+def parse_alert_query(args):
+    """
+    Parses the query parameters of the /api/alerts route.
+
+    Parameters
+    ----------
+    args : dict-like
+        Query parameters. Recognized keys:
+            - since : ISO date or datetime, alerts reported at or after it
+            - until : ISO date or datetime, alerts reported at or before
+              it; a date includes its whole day
+            Datetimes with a time zone are converted to local time.
+            - bbox : "min_lng,min_lat,max_lng,max_lat"
+            - category : incident category, comma separated for several
+
+    Returns
+    -------
+    query : dict
+        Keys since, until (pd.Timestamp or None), bbox (tuple of
+        four floats or None) and categories (frozenset of lower
+        case names or None)
+    """
+    query = {'since': None, 'until': None, 'bbox': None, 'categories': None}
+    for key in ['since', 'until']:
+        if args.get(key):
+            try:
+                query[key] = to_local_time(pd.Timestamp(args.get(key)))
+            except ValueError as error:
+                raise ValueError(f"{key} must be an ISO date or datetime") from error
+            if key == 'until' and DATE_ONLY_PATTERN.match(args.get(key)):
+                query[key] += pd.Timedelta(days=1) - pd.Timedelta(1, unit='ns')
+    if args.get('bbox'):
+        try:
+            bbox = tuple(float(value) for value in args.get('bbox').split(','))
+        except ValueError as error:
+            raise ValueError("bbox must be four numbers") from error
+        if len(bbox) != 4 or bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+            raise ValueError("bbox must be min_lng,min_lat,max_lng,max_lat")
+        query['bbox'] = bbox
+    if args.get('category'):
+        query['categories'] = frozenset(
+            category.strip().lower() for category in args.get('category').split(',')
+            if category.strip())
+    return query
+
+
+def query_etag(version, query):
+    """
+    Returns an ETag for the result of `query` on the alerts of
+    `version`. It only changes when the data or the query changes.
+    """
+    # Sets are sorted so every worker process computes the same tag
+    key = repr((version, sorted(
+        (key, repr(sorted(value) if isinstance(value, frozenset) else value))
+        for key, value in query.items())))
+    return hashlib.sha1(key.encode('utf8')).hexdigest()
+
+
+def filter_alerts(alerts_df, since=None, until=None, bbox=None, categories=None):
+    """
+    Selects the alerts matching a parsed /api/alerts query.
+
+    Parameters
+    ----------
+    alerts_df : pd.DataFrame
+        Alerts with typed columns (see parse_alert_frame)
+    since, until : pd.Timestamp or None
+        Time range, converted to local time if it has a time
+        zone. Alerts without a report time are matched by
+        their date.
+    bbox : tuple or None
+        (min_lng, min_lat, max_lng, max_lat). Alerts without
+        a geocoded location never match.
+    categories : set or None
+        Lower case incident categories
+
+    Returns
+    -------
+    alerts_df : pd.DataFrame
+        The matching rows, in the order of `alerts_df`
+    """
+    if not isinstance(alerts_df, pd.DataFrame):
+        raise TypeError("alerts_df must be of type pd.DataFrame")
+    mask = pd.Series(True, index=alerts_df.index)
+    reported = alerts_df['report_datetime'].fillna(alerts_df['date'])
+    since, until = to_local_time(since), to_local_time(until)
+    if since is not None:
+        # An alert without a report time matches for its whole day
+        mask &= (reported >= since) | (alerts_df['report_datetime'].isna() &
+                                       (alerts_df['date'] == since.normalize()))
+    if until is not None:
+        mask &= reported <= until
+    if bbox is not None:
+        mask &= alerts_df['lng'].between(bbox[0], bbox[2]) & \
+            alerts_df['lat'].between(bbox[1], bbox[3])
+    if categories is not None:
+        mask &= alerts_df['Incident Category'].astype(str).str.lower().isin(categories)
+    return alerts_df[mask]
+
+
+def to_feature_collection(alerts_df):
+    """
+    Converts alerts to a GeoJSON FeatureCollection.
+
+    Parameters
+    ----------
+    alerts_df : pd.DataFrame
+        Alerts with typed columns (see parse_alert_frame)
+
+    Returns
+    -------
+    feature_collection : dict
+        FeatureCollection with one Point feature per alert. Alerts
+        without a geocoded location have a null geometry.
+    """
+    columns = [column for column in PROPERTY_COLUMNS if column in alerts_df.columns]
+    features = []
+    for lat, lng, values in zip(alerts_df['lat'], alerts_df['lng'],
+                                alerts_df[columns].itertuples(index=False, name=None)):
+        geometry = None
+        if not pd.isna(lat) and not pd.isna(lng):
+            geometry = {'type': 'Point', 'coordinates': [float(lng), float(lat)]}
+        features.append({
+            'type': 'Feature',
+            'geometry': geometry,
+            'properties': {column: to_plain_value(value)
+                           for column, value in zip(columns, values)},
+        })
+    return {'type': 'FeatureCollection', 'features': features}
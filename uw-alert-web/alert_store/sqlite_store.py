@@ -0,0 +1,296 @@
+"""
+Name: SQLite Alert Store
+What it does:
+- Stores the cleaned UW Alerts data in an indexed SQLite database
+  (WAL mode) instead of rewriting data/uw_alerts_clean.csv
+- Keeps latitude/longitude as real columns and the geocode result
+  as JSON instead of python dict literals
+- Migrates an existing uw_alerts_clean.csv once
+- Answers the urgent incident query used by get_urgent_incidents
+  with the report datetime and incident id indexes
+
+outputs:
+- Pandas dataframes with the same columns as AlertStore
+"""
+from contextlib import closing
+from datetime import datetime, timedelta
+import json
+import sqlite3
+import threading
+import pandas as pd
+from .alert_store import parse_alert_frame, to_plain_value
+
+# (csv column, sql column) pairs of the uw_alerts_clean.csv schema
+COLUMNS = [
+    ('Date', 'date_text'),
+    ('Report Time', 'report_time'),
+    ('Incident Time', 'incident_time'),
+    ('Nearest Address to Incident', 'nearest_address'),
+    ('Incident Category', 'incident_category'),
+    ('Incident Summary', 'incident_summary'),
+    ('Incident Alert', 'incident_alert'),
+    ('Alert Type', 'alert_type'),
+    ('Alert ID', 'alert_id'),
+    ('Incident ID', 'incident_id'),
+    ('Google Address', 'google_address'),
+    ('geometry', 'geometry'),
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS alerts (
+    seq INTEGER PRIMARY KEY,
+    date_text TEXT,
+    report_time TEXT,
+    incident_time TEXT,
+    nearest_address TEXT,
+    incident_category TEXT,
+    incident_summary TEXT,
+    incident_alert TEXT,
+    alert_type TEXT,
+    alert_id INTEGER,
+    incident_id INTEGER,
+    google_address TEXT,
+    geometry TEXT,
+    alert_date TEXT,
+    report_datetime TEXT,
+    lat REAL,
+    lng REAL
+);
+CREATE INDEX IF NOT EXISTS idx_alerts_incident_id ON alerts (incident_id);
+CREATE INDEX IF NOT EXISTS idx_alerts_alert_id ON alerts (alert_id);
+CREATE INDEX IF NOT EXISTS idx_alerts_report_datetime ON alerts (report_datetime);
+CREATE INDEX IF NOT EXISTS idx_alerts_alert_date ON alerts (alert_date);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+"""
+
+
+def _to_sql_value(value):
+    """
+    Converts a dataframe cell to a value sqlite3 can bind.
+    """
+    value = to_plain_value(value)
+    if isinstance(value, dict):
+        return json.dumps(value)
+    return value
+
+
+class SqliteAlertStore:
+    """
+    Alert store backed by an SQLite database. Exposes the same
+    read/write methods as AlertStore, so the web routes can use
+    either backend.
+
+    Rows keep the csv order through the `seq` column: the newest
+    alerts have the highest seq and are returned first.
+
+    Parameters
+    ----------
+    db_path : str
+        Path to the SQLite database file. Created if missing.
+    """
+    def __init__(self, db_path):
+        if not isinstance(db_path, str):
+            raise ValueError("db_path must be a string")
+        self.db_path = db_path
+        self.columns = [column for column, _ in COLUMNS]
+        self._snapshot = (None, None)
+        self._lock = threading.Lock()
+        with closing(self.connect()) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+
+    def connect(self):
+        """
+        Returns
+        -------
+        conn : sqlite3.Connection
+            A new connection to the database. Connections are
+            short lived so the store can be used from any thread.
+        """
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    @property
+    def version(self):
+        """
+        The version of the data in the database. Incremented
+        by every write.
+        """
+        with closing(self.connect()) as conn:
+            return conn.execute(
+                "SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def __len__(self):
+        with closing(self.connect()) as conn:
+            return conn.execute('SELECT COUNT(*) FROM alerts').fetchone()[0]
+
+    def _read_frame(self, conn, where='', params=()):
+        """
+        Reads alerts into a dataframe with the AlertStore columns,
+        newest first.
+        """
+        sql_columns = ', '.join(f'{sql} AS "{csv}"' for csv, sql in COLUMNS)
+        alerts_df = pd.read_sql_query(
+            f'SELECT {sql_columns}, alert_date AS date, report_datetime, lat, lng '
+            f'FROM alerts {where} ORDER BY seq DESC', conn, params=params)
+        alerts_df['geometry'] = [json.loads(geometry) if geometry is not None else None
+                                 for geometry in alerts_df['geometry']]
+        alerts_df['date'] = pd.to_datetime(alerts_df['date'])
+        alerts_df['report_datetime'] = pd.to_datetime(alerts_df['report_datetime'])
+        return alerts_df
+
+    def snapshot(self):
+        """
+        Returns
+        -------
+        (alerts_df, version) : tuple
+            All alerts with typed columns (see parse_alert_frame)
+            and the version they were read at. Only read from the
+            database when the version changed.
+        """
+        alerts_df, version = self._snapshot
+        if alerts_df is not None and self.version == version:
+            return self._snapshot
+        with self._lock:
+            with closing(self.connect()) as conn:
+                # Read the version and rows in one transaction
+                conn.execute('BEGIN')
+                version = conn.execute(
+                    "SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+                if self._snapshot[0] is None or self._snapshot[1] != version:
+                    self._snapshot = (self._read_frame(conn), version)
+                conn.rollback()
+        return self._snapshot
+
+    def get_alerts(self):
+        """
+        Returns
+        -------
+        alerts_df : pd.DataFrame
+            All alerts with typed columns, newest first. Shared
+            between callers and must be treated as read-only.
+        """
+        return self.snapshot()[0]
+
+    def get_raw_alerts(self):
+        """
+        Returns
+        -------
+        alerts_df : pd.DataFrame
+            A copy of the alerts with only the csv columns
+        """
+        return self.get_alerts()[self.columns].copy()
+
+    def query_urgent_alerts(self, time_frame):
+        """
+        Reads only the alerts of incidents that get_urgent_incidents
+        can report for `time_frame`: incidents with an alert reported
+        within the last `time_frame` hours, or with an alert from
+        today that has no report time. Uses the report datetime,
+        date and incident id indexes instead of loading every alert.
+
+        Parameters
+        ----------
+        time_frame: int
+            The time_frame cutoff in hours
+
+        Returns
+        -------
+        alerts_df : pd.DataFrame
+            Every alert of the candidate incidents, newest first.
+            Can be passed directly to get_urgent_incidents.
+        """
+        now = datetime.now()
+        cutoff = (now - timedelta(hours=time_frame)).strftime('%Y-%m-%d %H:%M:%S')
+        with closing(self.connect()) as conn:
+            return self._read_frame(
+                conn,
+                'WHERE incident_id IN ('
+                'SELECT incident_id FROM alerts WHERE report_datetime > ? '
+                'UNION SELECT incident_id FROM alerts '
+                'WHERE report_time IS NULL AND alert_date = ?)',
+                (cutoff, now.strftime('%Y-%m-%d')))
+
+    def _insert(self, conn, alerts_df, first_seq):
+        """
+        Inserts `alerts_df` so that its first row gets the highest seq.
+        """
+        typed_df = parse_alert_frame(alerts_df.reindex(columns=self.columns))
+        typed_df['date'] = typed_df['date'].dt.strftime('%Y-%m-%d')
+        typed_df['report_datetime'] = typed_df['report_datetime'].dt.strftime(
+            '%Y-%m-%d %H:%M:%S')
+        value_columns = self.columns + ['date', 'report_datetime', 'lat', 'lng']
+        rows = [
+            [first_seq + len(typed_df) - i] + [_to_sql_value(value) for value in values]
+            for i, values in enumerate(
+                typed_df[value_columns].itertuples(index=False, name=None))]
+        sql_columns = ['seq'] + [sql for _, sql in COLUMNS] + \
+            ['alert_date', 'report_datetime', 'lat', 'lng']
+        conn.executemany(
+            f"INSERT INTO alerts ({', '.join(sql_columns)}) "
+            f"VALUES ({', '.join('?' for _ in sql_columns)})", rows)
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+
+    def append_alerts(self, new_alerts):
+        """
+        Adds new alerts in front of the stored alerts.
+
+        Parameters
+        ----------
+        new_alerts : pd.DataFrame
+            Cleaned alerts with the uw_alerts_clean.csv columns,
+            newest first
+        """
+        if not isinstance(new_alerts, pd.DataFrame):
+            raise TypeError("new_alerts must be of type pd.DataFrame")
+        with closing(self.connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            max_seq = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM alerts').fetchone()[0]
+            self._insert(conn, new_alerts, max_seq)
+            conn.commit()
+
+    def replace_alerts(self, alerts_df):
+        """
+        Replaces every stored alert with `alerts_df`.
+
+        Parameters
+        ----------
+        alerts_df : pd.DataFrame
+            Cleaned alerts with the uw_alerts_clean.csv columns,
+            newest first
+        """
+        if not isinstance(alerts_df, pd.DataFrame):
+            raise TypeError("alerts_df must be of type pd.DataFrame")
+        with closing(self.connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('DELETE FROM alerts')
+            self._insert(conn, alerts_df, 0)
+            conn.commit()
+
+
+def migrate_csv_to_sqlite(csv_filepath, db_path):
+    """
+    One-shot migration of a cleaned alerts csv into an SQLite store.
+    Does nothing if the database already holds alerts.
+
+    Parameters
+    ----------
+    csv_filepath : str
+        Path to uw_alerts_clean.csv
+    db_path : str
+        Path to the SQLite database file
+
+    Returns
+    -------
+    store : SqliteAlertStore
+        The store of the migrated database
+    """
+    store = SqliteAlertStore(db_path)
+    if len(store) == 0:
+        store.replace_alerts(pd.read_csv(csv_filepath, index_col=False))
+    return store
@@ -0,0 +1,234 @@
+"""
+Parallel backfill of the historical UW Alerts archive.
+Segments the .txt archive into the same ordered alert chunks that
+parse_txt_data sends to generate_csv (segmenter.iter_alert_chunks),
+extracts the chunks on a
+bounded thread pool, and assigns Incident and Alert IDs in one
+ordered merge, so the output matches the sequential path while the
+GPT requests run concurrently (within the shared rate limits).
+Extracted chunks are appended to a checkpoint file as they finish,
+so a restarted backfill only extracts the chunks it is missing and
+the .csv is written once at the end.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import os
+import threading
+import time
+import pandas as pd
+from . import batch_prompt, parse_uw_alerts
+from .token_counter import count_tokens
+from .segmenter import iter_alert_chunks
+from .id_allocator import get_id_allocator, next_ids, state_from_alerts
+
+# Column order of uw_alerts_gpt.csv
+GPT_COLUMNS = ['Date', 'Report Time', 'Incident Time',
+               'Nearest Address to Incident', 'Incident Category',
+               'Incident Summary', 'Incident Alert', 'Alert Type',
+               'Incident ID', 'Alert ID']
+
+
+def extract_chunk(chunk_lines):
+    """
+    Arguments:
+        chunk_lines - [date_line] + chunk_lines of one iter_alert_chunks chunk.
+    Returns:
+        The (gpt_table, alert_type) tuple of prompt_gpt for the chunk,
+        with the duplicated date line dropped as in generate_csv.
+    """
+    if len(chunk_lines) > 1 and chunk_lines[0] == chunk_lines[1]:
+        chunk_lines = chunk_lines[1:]
+    return parse_uw_alerts.prompt_gpt(chunk_lines, return_alert_type=True)
+
+
+def extract_chunks(chunks):
+    """
+    Arguments:
+        chunks - list of [date_line] + chunk_lines of iter_alert_chunks chunks.
+    Returns:
+        The (gpt_table, alert_type) tuples of the chunks, extracted
+        together with batch_prompt.prompt_gpt_batch.
+    """
+    chunks = [chunk_lines[1:] if len(chunk_lines) > 1 and chunk_lines[0] == chunk_lines[1]
+              else chunk_lines for chunk_lines in chunks]
+    return batch_prompt.prompt_gpt_batch(chunks, max_batch_size=len(chunks))
+
+
+def assign_ids(previous, results):
+    """
+    Assigns Incident and Alert IDs to extracted chunks in order with
+    next_ids in archive order, as generate_ids(parsing=True) does:
+    every chunk gets the next Alert ID, and a new Incident ID when the
+    chunk before it was an 'Original' post (the archive lists each
+    incident newest first).
+
+    Arguments:
+        previous - Pandas DataFrame of the rows already in the output.
+        results - (gpt_table, alert_type) tuples in chunk order.
+    Returns:
+        A list with a copy of each gpt_table with the ID columns added.
+    """
+    state = state_from_alerts(previous, archive_order=True)
+    tables = []
+    for gpt_table, alert_type in results:
+        gpt_table = gpt_table.copy()
+        incident_id, alert_id, state = next_ids(state, alert_type, archive_order=True)
+        gpt_table['Incident ID'] = incident_id
+        gpt_table['Alert ID'] = alert_id
+        tables.append(gpt_table)
+    return tables
+
+
+def chunk_key(offset, chunk_lines):
+    """
+    Returns:
+        The checkpoint key of a chunk: its offset in the archive and
+        the sha256 of its text, so edited chunks are extracted again.
+    """
+    digest = hashlib.sha256(''.join(chunk_lines).encode('UTF-8')).hexdigest()
+    return f'{offset}:{digest}'
+
+
+class ChunkCheckpoint:
+    """
+    Append-only JSON lines file of extracted chunks. Every line holds
+    the key, alert type and GPT table of one chunk and is flushed as
+    soon as the chunk is extracted, so an interrupted backfill loses
+    at most the chunks in flight. A partly written last line is
+    ignored when the file is loaded.
+
+    Arguments:
+        path - path to the checkpoint file, created if missing.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.results = {}
+        self._lock = threading.Lock()
+        # a crash while writing leaves one partial line, which the
+        # next entry must not be appended to
+        self._partial_line = False
+        if os.path.exists(path):
+            with open(path, encoding='UTF-8') as checkpoint_file:
+                for line in checkpoint_file:
+                    self._partial_line = not line.endswith('\n')
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    gpt_table = pd.DataFrame(entry['data'], columns=entry['columns'])
+                    self.results[entry['key']] = (gpt_table, entry['alert_type'])
+
+    def __contains__(self, key):
+        return key in self.results
+
+    def get(self, key):
+        """
+        Returns:
+            The (gpt_table, alert_type) of a checkpointed chunk.
+        """
+        return self.results[key]
+
+    def append(self, key, result):
+        """
+        Writes the (gpt_table, alert_type) result of a chunk.
+        """
+        gpt_table, alert_type = result
+        line = json.dumps({'key': key, 'alert_type': alert_type,
+                           'columns': list(gpt_table.columns),
+                           'data': gpt_table.values.tolist()}, default=str)
+        with self._lock:
+            with open(self.path, 'a', encoding='UTF-8') as checkpoint_file:
+                if self._partial_line:
+                    checkpoint_file.write('\n')
+                    self._partial_line = False
+                checkpoint_file.write(line + '\n')
+                checkpoint_file.flush()
+                os.fsync(checkpoint_file.fileno())
+            self.results[key] = result
+
+
+# pylint: disable=too-many-arguments,too-many-locals
+def backfill_txt_data(filepath, out_filepath, file_start=0, max_workers=4,
+                      extract=extract_chunk, checkpoint_path=None, batch_size=1,
+                      extract_batch=extract_chunks):
+    """
+    Arguments:
+        filepath - path to .txt file containing historial UW Alerts blogposts.
+        out_filepath - path to .csv file storing GPT output. Replaced when
+            file_start is 0, otherwise the new rows are appended to it.
+        file_start - int representing index at which parsing should start.
+        max_workers - number of chunks extracted at the same time.
+        extract - function turning a chunk into (gpt_table, alert_type).
+        checkpoint_path - path to the checkpoint of extracted chunks,
+            defaults to out_filepath + '.checkpoint.jsonl'. Chunks found
+            in it are not extracted again.
+        batch_size - number of chunks per extraction. Above 1, groups
+            of chunks are extracted with extract_batch, so several
+            alerts share one GPT request.
+        extract_batch - function turning a list of chunks into their
+            (gpt_table, alert_type) tuples.
+    Returns:
+        A dictionary of throughput stats: chunks, resumed (chunks read
+        from the checkpoint), rows, tokens (prompt tokens of the
+        extracted chunks), seconds, chunks_per_sec and tokens_per_sec.
+    Exceptions:
+        max_workers and batch_size must be positive integers.
+    """
+    if not isinstance(max_workers, int) or max_workers < 1:
+        raise ValueError("max_workers must be a positive integer")
+    if not isinstance(batch_size, int) or batch_size < 1:
+        raise ValueError("batch_size must be a positive integer")
+    start = time.perf_counter()
+    keyed_chunks = []
+    with open(filepath, encoding='UTF-8') as file:
+        for date_line, chunk_lines, offset in iter_alert_chunks(file, file_start):
+            chunk_lines = [date_line] + chunk_lines
+            keyed_chunks.append((chunk_key(offset, chunk_lines), chunk_lines))
+    if file_start == 0:
+        previous = pd.DataFrame({column: [] for column in GPT_COLUMNS})
+    else:
+        previous = pd.read_csv(out_filepath, index_col=False)
+    if checkpoint_path is None:
+        checkpoint_path = out_filepath + '.checkpoint.jsonl'
+    checkpoint = ChunkCheckpoint(checkpoint_path)
+    missing = [(key, chunk_lines) for key, chunk_lines in keyed_chunks
+               if key not in checkpoint]
+
+    def extract_missing(keyed_chunks):
+        if len(keyed_chunks) == 1:
+            key, chunk_lines = keyed_chunks[0]
+            checkpoint.append(key, extract(chunk_lines))
+            return
+        results = extract_batch([chunk_lines for _, chunk_lines in keyed_chunks])
+        for (key, _), result in zip(keyed_chunks, results):
+            checkpoint.append(key, result)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # list() raises the first extraction error after the others finish
+        list(executor.map(extract_missing, [missing[start:start + batch_size]
+                                            for start in range(0, len(missing), batch_size)]))
+    tables = assign_ids(previous, [checkpoint.get(key) for key, _ in keyed_chunks])
+    if tables:
+        output = pd.concat(tables, ignore_index=True)
+        if len(previous.index) > 0:
+            output = pd.concat([previous, output], ignore_index=True)
+    else:
+        output = previous
+    tmp_filepath = out_filepath + '.tmp'
+    output.to_csv(tmp_filepath, index=False)
+    os.replace(tmp_filepath, out_filepath)
+    # generate_csv continues the IDs where the backfill stopped
+    get_id_allocator(out_filepath).reset(state_from_alerts(output, archive_order=True))
+
+    seconds = time.perf_counter() - start
+    tokens = sum(count_tokens(''.join(chunk_lines)) for _, chunk_lines in missing)
+    return {
+        'chunks': len(keyed_chunks),
+        'resumed': len(keyed_chunks) - len(missing),
+        'rows': sum(len(table.index) for table in tables),
+        'tokens': tokens,
+        'seconds': seconds,
+        'chunks_per_sec': len(missing) / seconds if seconds > 0 else 0.0,
+        'tokens_per_sec': tokens / seconds if seconds > 0 else 0.0,
+    }
@@ -0,0 +1,213 @@
+"""
+Batched GPT extraction of several alert chunks per completion.
+Chunks that are not in the LLM cache and not read by the rule-based
+fast path are packed into prompts of up to MAX_BATCH_SIZE alerts
+within the context of the model. Each alert is tagged with a
+delimiter id ("A1", "A2", ...) that GPT writes in the Alert column of
+its rows, so the returned table is split back into one table per
+chunk. The instructions are sent once per batch instead of once per
+alert, and chunks missing from a malformed response are extracted
+one at a time with prompt_gpt.
+"""
+import io
+import pandas as pd
+from . import parse_uw_alerts
+from .llm_cache import cache_key, get_llm_cache
+from .rule_extractor import GPT_COLUMNS
+from .table_stream import COMPLETION_BASE_TOKENS
+from .token_counter import count_tokens
+
+BATCH_TASK = ('Extract a markdown table with the columns Alert, Date (mm/dd/yyyy),'
+              ' Report Time (hh:mm AM/PM), Incident Time (hh:mm AM/PM),'
+              ' Nearest Address to Incident, Incident Category, and'
+              ' Incident Summary from each of the following alert messages.'
+              ' Write the id of the alert message in the Alert column of its rows.\n')
+# Alerts packed into one prompt
+MAX_BATCH_SIZE = 8
+# Completion tokens reserved for the rows of each alert of a batch
+BATCH_TOKENS_PER_ALERT = 200
+
+
+def alert_id(index):
+    """
+    Returns:
+        The delimiter id of the alert at `index` of a batch.
+    """
+    return f'A{index + 1}'
+
+
+def format_batch_alert(index, alert_chunk):
+    """
+    Returns:
+        An alert of a batch prompt, tagged with its delimiter id.
+    """
+    return f'Alert {alert_id(index)}: """\n{alert_chunk}"""\n'
+
+
+def pack_batches(alert_chunks, max_batch_size=MAX_BATCH_SIZE):
+    """
+    Arguments:
+        alert_chunks - alert texts from format_alert_chunk.
+        max_batch_size - maximum number of alerts per prompt.
+    Returns:
+        Lists of indexes of alert_chunks, in order, such that the
+        prompt of each batch, the table header and
+        BATCH_TOKENS_PER_ALERT completion tokens per alert fit in the
+        model context. An alert too long
+        to share a prompt gets a batch of its own.
+    """
+    budget = parse_uw_alerts.MODEL_CONTEXT_TOKENS - count_tokens(BATCH_TASK) - \
+        COMPLETION_BASE_TOKENS
+    batches = []
+    batch, batch_tokens = [], 0
+    for index, alert_chunk in enumerate(alert_chunks):
+        tokens = count_tokens(format_batch_alert(len(batch), alert_chunk)) + \
+            BATCH_TOKENS_PER_ALERT
+        if batch and (len(batch) == max_batch_size or batch_tokens + tokens > budget):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(index)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def parse_batch_completion(completion, n_alerts):
+    """
+    Arguments:
+        completion - markdown table returned for a batch prompt.
+        n_alerts - number of alerts in the batch.
+    Returns:
+        A dictionary of alert index to a Pandas DataFrame with the
+        GPT_COLUMNS of its rows, as parse_completion returns them.
+        Alerts without rows are missing from the dictionary.
+    Exceptions:
+        A completion that is not a table with the Alert column and the
+        six extracted columns raises ValueError.
+    """
+    rows = [line for line in completion.split('\n') if line.strip().startswith('|')]
+    if not rows:
+        raise ValueError("completion has no markdown table")
+    try:
+        table = pd.read_table(io.StringIO('\n'.join(rows)), sep='|', header=0,
+                              skipinitialspace=True, index_col=False, dtype=str)
+    except (pd.errors.ParserError, pd.errors.EmptyDataError) as error:
+        raise ValueError("completion is not a markdown table") from error
+    table = table.drop(list(table.filter(regex='Unnamed')), axis=1)
+    if len(table.columns) != len(GPT_COLUMNS) + 1:
+        raise ValueError("completion does not have the batch columns")
+    table.columns = ['Alert'] + GPT_COLUMNS
+    table = table.apply(lambda column: column.astype(str).str.strip())
+    table = table[~table['Alert'].str.match(r'^:?-{2,}')]
+    ids = {alert_id(index): index for index in range(n_alerts)}
+    unknown = set(table['Alert']) - set(ids)
+    if unknown:
+        raise ValueError(f"completion has unknown alert ids {sorted(unknown)}")
+    return {ids[key]: alert_rows.loc[:, GPT_COLUMNS].reset_index(drop=True)
+            for key, alert_rows in table.groupby('Alert', sort=False)}
+
+
+def table_completion(gpt_table):
+    """
+    Returns:
+        The markdown table of a single-alert completion (the
+        GPT_COLUMNS header and the rows of gpt_table), which
+        parse_completion reads back into gpt_table.
+    """
+    lines = ['| ' + ' | '.join(GPT_COLUMNS) + ' |', '|---' * len(GPT_COLUMNS) + '|']
+    lines += ['| ' + ' | '.join(str(value) for value in row) + ' |'
+              for row in gpt_table[GPT_COLUMNS].values.tolist()]
+    return '\n'.join(lines)
+
+
+def extract_batch(lines_list, alert_chunks, rate_limiter=None, llm_cache=None):
+    """
+    Arguments:
+        lines_list - alert chunks as lists of lines.
+        alert_chunks - format_alert_chunk of each chunk.
+        rate_limiter - optional RateLimiter for the OpenAI request.
+        llm_cache - optional LLMCache to store each extraction in.
+    Returns:
+        The extracted table of each chunk, in order. Chunks missing
+        from the response, or all of them if it is malformed, are
+        extracted one at a time with prompt_gpt, as is a batch of one.
+    """
+    if len(lines_list) == 1:
+        return [parse_uw_alerts.prompt_gpt(lines_list[0], rate_limiter=rate_limiter,
+                                           llm_cache=llm_cache, fast_path=False)]
+    prompt = BATCH_TASK + ''.join(format_batch_alert(index, alert_chunk)
+                                  for index, alert_chunk in enumerate(alert_chunks))
+    completion = parse_uw_alerts.request_completion(
+        prompt, rate_limiter,
+        max_tokens=COMPLETION_BASE_TOKENS + BATCH_TOKENS_PER_ALERT * len(alert_chunks))
+    try:
+        tables = parse_batch_completion(completion, len(alert_chunks))
+    except ValueError:
+        tables = {}
+    results = []
+    for index, (lines, alert_chunk) in enumerate(zip(lines_list, alert_chunks)):
+        if index not in tables:
+            results.append(parse_uw_alerts.prompt_gpt(
+                lines, rate_limiter=rate_limiter, llm_cache=llm_cache, fast_path=False))
+            continue
+        gpt_table = tables[index]
+        if llm_cache is not None:
+            # Stored as the completion of the single-alert prompt it shares a key with
+            llm_cache.put(cache_key(parse_uw_alerts.GPT_MODEL, parse_uw_alerts.GPT_TASK,
+                                    alert_chunk), table_completion(gpt_table), gpt_table)
+        gpt_table, _ = parse_uw_alerts.finish_table(
+            gpt_table, lines, alert_chunk, 'batch', None)
+        results.append(gpt_table)
+    return results
+
+
+def prompt_gpt_batch(chunks, rate_limiter=None, llm_cache=None, fast_path=True,
+                     max_batch_size=MAX_BATCH_SIZE):
+    """
+    Arguments:
+        chunks - alert chunks, each a list of lines as passed to
+            prompt_gpt.
+        rate_limiter - optional RateLimiter for the OpenAI requests.
+        llm_cache - optional LLMCache of extraction results. Defaults
+            to the process-wide cache.
+        fast_path - whether to use the rule-based tables of confident
+            alerts, as in prompt_gpt.
+        max_batch_size - maximum number of alerts per completion.
+    Returns:
+        A list with the (gpt_table, alert_type) tuple of prompt_gpt
+        for each chunk, in order.
+    Exceptions:
+        chunks must be a list of valid prompt_gpt lines.
+        max_batch_size must be a positive integer.
+    """
+    if not isinstance(chunks, list):
+        raise ValueError("chunks must be a list")
+    if not isinstance(max_batch_size, int) or max_batch_size < 1:
+        raise ValueError("max_batch_size must be a positive integer")
+    for lines in chunks:
+        if not isinstance(lines, list) or len(lines) < 1:
+            raise ValueError("each chunk must be a list of length at least 1")
+        if parse_uw_alerts.DATE_PATTERN.match(lines[0]) is None:
+            raise ValueError("First item in each chunk must contain a date")
+    if llm_cache is None:
+        llm_cache = get_llm_cache()
+    alert_chunks = [parse_uw_alerts.format_alert_chunk(lines) for lines in chunks]
+    tables = []
+    pending = []
+    for index, (lines, alert_chunk) in enumerate(zip(chunks, alert_chunks)):
+        gpt_table, method, confidence = parse_uw_alerts.lookup_extraction(
+            lines, alert_chunk, llm_cache, fast_path)
+        if gpt_table is not None:
+            gpt_table, _ = parse_uw_alerts.finish_table(gpt_table, lines, alert_chunk,
+                                                        method, confidence)
+        else:
+            pending.append(index)
+        tables.append(gpt_table)
+    for batch in pack_batches([alert_chunks[index] for index in pending], max_batch_size):
+        batch = [pending[position] for position in batch]
+        for index, gpt_table in zip(batch, extract_batch(
+                [chunks[index] for index in batch], [alert_chunks[index] for index in batch],
+                rate_limiter, llm_cache)):
+            tables[index] = gpt_table
+    return [(gpt_table, gpt_table['Alert Type'].values[0]) for gpt_table in tables]
@@ -0,0 +1,230 @@
+"""
+Offline end-to-end benchmarks of alert ingestion. The OpenAI and
+Google Maps clients are pointed at standin_services servers with the
+given latency and error rate, the LLM and geocode caches are turned
+off so every alert reaches the stand-ins, and archived alerts are run
+through parse_txt_data (with clean_gpt_output), scrape_uw_alerts and
+the /update_map route of the web app. Data is written to a temporary
+directory, never to data/. Run from uw-alert-web/ with
+python -m parse_uw_alerts.benchmark.
+"""
+from html import escape
+import argparse
+import importlib
+import itertools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import openai
+from . import parse_uw_alerts
+from .geocode_cache import make_gmaps_client
+from .segmenter import iter_alert_chunks
+from .standin_services import DEFAULT_CLEAN_PATH, load_completions, load_geocodes, \
+    StandInServer
+
+DEFAULT_TXT_PATH = os.path.join(os.path.dirname(__file__), '../../data/UW_Alerts_2018_2022.txt')
+REPO_ROOT = os.path.join(os.path.dirname(__file__), '../..')
+STANDIN_MAPS_KEY = 'AIza-standin'
+STANDIN_OPENAI_KEY = 'sk-standin'
+
+
+def point_clients(openai_server, maps_server, rate_limits=True):
+    """
+    Points openai and make_gmaps_client at the stand-in servers and
+    turns off the LLM and geocode caches through the environment.
+    Call before the process-wide caches and rate limiters are created.
+
+    Arguments:
+        openai_server - started StandInServer answering completions.
+        maps_server - started StandInServer answering geocodes.
+        rate_limits - whether to keep the configured OpenAI and
+            Google Maps rate limits.
+    """
+    openai.api_base = openai_server.openai_api_base
+    openai.api_key = STANDIN_OPENAI_KEY
+    os.environ.update({'OPENAI_API_BASE': openai_server.openai_api_base,
+                       'OPENAI_API_KEY': STANDIN_OPENAI_KEY,
+                       'GOOGLE_MAPS_BASE_URL': maps_server.url,
+                       'GOOGLE_MAPS_API_KEY': STANDIN_MAPS_KEY,
+                       'UW_ALERTS_LLM_CACHE_DIR': '',
+                       'UW_ALERTS_GEOCODE_CACHE': ''})
+    if not rate_limits:
+        for service in ['OPENAI', 'GOOGLE_MAPS']:
+            os.environ[f'{service}_REQUESTS_PER_SECOND'] = ''
+            os.environ[f'{service}_TOKENS_PER_MINUTE'] = ''
+
+
+def read_alerts(txt_path, n_alerts):
+    """
+    Returns:
+        The first n_alerts alert chunks of an archive, each a list of
+        lines starting with the date line.
+    """
+    with open(txt_path, encoding='UTF-8') as file:
+        return [[date_line] + chunk_lines for date_line, chunk_lines, _
+                in itertools.islice(iter_alert_chunks(file), n_alerts)]
+
+
+def throughput(n_alerts, seconds, **extra):
+    """
+    Returns:
+        A result dictionary with the number of alerts, seconds and
+        alerts per second, and the extra values.
+    """
+    return dict({'alerts': n_alerts, 'seconds': round(seconds, 3),
+                 'alerts_per_second': round(n_alerts / seconds, 3) if seconds else None},
+                **extra)
+
+
+def benchmark_parse_txt_data(alerts, work_dir):
+    """
+    Extracts the alerts with parse_txt_data and geocodes them with
+    clean_gpt_output.
+
+    Returns:
+        The throughput of both steps together, with the seconds of each.
+    """
+    txt_path = os.path.join(work_dir, 'alerts.txt')
+    gpt_path = os.path.join(work_dir, 'alerts_gpt.csv')
+    with open(txt_path, 'w', encoding='UTF-8') as file:
+        for lines in alerts:
+            file.writelines(line if line.endswith('\n') else line + '\n' for line in lines)
+    start = time.perf_counter()
+    parse_uw_alerts.parse_txt_data(txt_path, gpt_path)
+    parsed = time.perf_counter()
+    parse_uw_alerts.clean_gpt_output(gpt_path, make_gmaps_client(STANDIN_MAPS_KEY))
+    end = time.perf_counter()
+    return throughput(len(alerts), end - start, parse_seconds=round(parsed - start, 3),
+                      clean_seconds=round(end - parsed, 3))
+
+
+def blog_page(lines):
+    """
+    Returns:
+        emergency.uw.edu html whose newest alert is the alert chunk
+        `lines`.
+    """
+    body = ' '.join(line.strip() for line in lines[1:] if line.strip())
+    return (f'<html><body><div id="main_content"><p>{escape(lines[0].strip())}</p>'
+            f'<p>{escape(body)}</p></div></body></html>').encode('UTF-8')
+
+
+def benchmark_scrape(alerts, work_dir, clean_path=DEFAULT_CLEAN_PATH):
+    """
+    Ingests each alert with scrape_uw_alerts, from a blog page made of
+    it, into a copy of the clean alerts.
+
+    Returns:
+        The throughput over the alerts, with the number stored.
+    """
+    uw_alert_filepath = os.path.join(work_dir, 'alerts_clean.csv')
+    shutil.copyfile(clean_path, uw_alert_filepath)
+    gmaps_client = make_gmaps_client(STANDIN_MAPS_KEY)
+    pages = [blog_page(lines) for lines in alerts]
+    stored = 0
+    start = time.perf_counter()
+    for page_content in pages:
+        new_alerts = parse_uw_alerts.scrape_uw_alerts(uw_alert_filepath,
+                                                      page_content=page_content,
+                                                      gmaps_client=gmaps_client)
+        stored += 0 if new_alerts is None else len(new_alerts.index)
+    return throughput(len(alerts), time.perf_counter() - start, stored=stored)
+
+
+# pylint: disable=import-outside-toplevel
+def benchmark_update_map(alerts, work_dir, poll_interval=0.01):
+    """
+    Submits each alert to the /update_map route of the web app, backed
+    by a SQLite store and job states in work_dir, and waits for every
+    ingestion job.
+
+    Returns:
+        The throughput from the first submission to the last finished
+        job, with the job statuses and the mean and maximum seconds
+        from submission to finish.
+    """
+    os.environ['UW_ALERTS_DB'] = os.path.join(work_dir, 'alerts.db')
+    os.environ['UW_ALERTS_INGEST_DIR'] = os.path.join(work_dir, 'ingest_jobs')
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    web_app = importlib.import_module('uw-alert-web.uw-alert-web')
+    client = web_app.app.test_client()
+    texts = [''.join(lines) for lines in alerts]
+    job_ids = []
+    start = time.perf_counter()
+    while len(job_ids) < len(texts):
+        response = client.post('/update_map', data={'text-input': texts[len(job_ids)]})
+        if response.status_code == 503:
+            time.sleep(poll_interval)
+            continue
+        job_ids.append(json.loads(response.data)['job_id'])
+    jobs = {}
+    while len(jobs) < len(job_ids):
+        for job_id in set(job_ids) - set(jobs):
+            job = json.loads(client.get(f'/update_map/{job_id}').data)
+            if job['status'] in ('done', 'failed'):
+                jobs[job_id] = job
+        time.sleep(poll_interval)
+    seconds = time.perf_counter() - start
+    latencies = [job['finished_at'] - job['submitted_at'] for job in jobs.values()]
+    statuses = [job['status'] for job in jobs.values()]
+    return throughput(len(alerts), seconds,
+                      done=statuses.count('done'), failed=statuses.count('failed'),
+                      mean_job_seconds=round(sum(latencies) / len(latencies), 3),
+                      max_job_seconds=round(max(latencies), 3))
+
+
+BENCHMARKS = {'parse_txt_data': benchmark_parse_txt_data,
+              'scrape_uw_alerts': benchmark_scrape,
+              'update_map': benchmark_update_map}
+
+
+def run_benchmarks(args):
+    """
+    Starts the stand-in servers and runs the selected benchmarks.
+
+    Returns:
+        A dictionary of benchmark name to its results, and the request
+        counts of the stand-in servers.
+    """
+    completions = load_completions()
+    geocodes = load_geocodes()
+    openai_server = StandInServer(completions, {}, latency=args.openai_latency,
+                                  stream_interval=args.stream_interval,
+                                  error_rate=args.error_rate, seed=args.seed)
+    maps_server = StandInServer({}, geocodes, latency=args.maps_latency,
+                                error_rate=args.error_rate, seed=args.seed)
+    alerts = read_alerts(args.txt_path, args.alerts)
+    results = {}
+    with openai_server, maps_server, tempfile.TemporaryDirectory() as work_dir:
+        point_clients(openai_server, maps_server, rate_limits=not args.no_rate_limits)
+        for name in args.benchmarks:
+            results[name] = BENCHMARKS[name](alerts, work_dir)
+        results['openai_server'] = dict(openai_server.stats)
+        results['maps_server'] = dict(maps_server.stats)
+    return results
+
+
+if __name__ == "__main__":
+    PARSER = argparse.ArgumentParser(description=__doc__.strip().split('\n', maxsplit=1)[0])
+    PARSER.add_argument('--txt-path', default=DEFAULT_TXT_PATH,
+                        help='archive of alerts to ingest')
+    PARSER.add_argument('--alerts', type=int, default=20,
+                        help='number of alerts per benchmark')
+    PARSER.add_argument('--benchmarks', nargs='+', choices=sorted(BENCHMARKS),
+                        default=list(BENCHMARKS))
+    PARSER.add_argument('--openai-latency', type=float, default=0.8,
+                        help='seconds before each completion starts')
+    PARSER.add_argument('--stream-interval', type=float, default=0.02,
+                        help='seconds between streamed completion events')
+    PARSER.add_argument('--maps-latency', type=float, default=0.1,
+                        help='seconds before each geocode response')
+    PARSER.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of requests answered with HTTP 500')
+    PARSER.add_argument('--seed', type=int, default=0)
+    PARSER.add_argument('--no-rate-limits', action='store_true',
+                        help='ignore the OpenAI and Google Maps rate limits')
+    print(json.dumps(run_benchmarks(PARSER.parse_args()), indent=2))
@@ -0,0 +1,187 @@
+"""
+Background poller for the UW Alerts blog (emergency.uw.edu).
+Fetches the blog on an interval with conditional GET requests
+(ETag / If-Modified-Since), so an unchanged page costs one empty
+304 response, and runs ingestion off the web request path.
+"""
+import hashlib
+import os
+import threading
+import requests
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+UW_ALERTS_URL = "https://emergency.uw.edu/"
+
+
+def fetch_blog_page(url, session, etag=None, last_modified=None, timeout=10):
+    """
+    Arguments:
+        url - url of the blog page.
+        session - requests.Session used for the request.
+        etag - ETag of the last fetched page or None.
+        last_modified - Last-Modified header of the last fetched page or None.
+        timeout - request timeout in seconds.
+    Returns:
+        A tuple (content, etag, last_modified) where content is None
+        if the server answered 304 Not Modified.
+    Exceptions:
+        requests.HTTPError for error responses.
+    """
+    headers = {}
+    if etag is not None:
+        headers['If-None-Match'] = etag
+    if last_modified is not None:
+        headers['If-Modified-Since'] = last_modified
+    response = session.get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304:
+        return None, etag, last_modified
+    response.raise_for_status()
+    return (response.content,
+            response.headers.get('ETag'),
+            response.headers.get('Last-Modified'))
+
+
+# pylint: disable=too-many-instance-attributes
+class BlogPoller:
+    """
+    Polls the UW Alerts blog and hands changed pages to `ingest`.
+
+    Arguments:
+        ingest - callable taking the page content (bytes). Returns
+            None if the page had no new alert, otherwise the new data.
+        url - url of the blog page.
+        interval - seconds between polls.
+        lock_path - optional lock file. When several processes (e.g.
+            gunicorn workers) run a poller, only the one holding the
+            lock polls.
+        on_update - optional callable run after ingest published new data.
+        session - optional requests.Session shared by all polls.
+    """
+    # pylint: disable=too-many-arguments
+    def __init__(self, ingest, url=UW_ALERTS_URL, interval=60,
+                 lock_path=None, on_update=None, session=None):
+        if not callable(ingest):
+            raise ValueError("ingest must be callable")
+        if not isinstance(interval, (int, float)) or interval <= 0:
+            raise ValueError("interval must be a positive number")
+        self.ingest = ingest
+        self.url = url
+        self.interval = interval
+        self.lock_path = lock_path
+        self.on_update = on_update
+        self.session = session if session is not None else requests.Session()
+        self.etag = None
+        self.last_modified = None
+        self.content_hash = None
+        self.stats = {'polls': 0, 'not_modified': 0, 'ingested': 0, 'errors': 0}
+        self._lock_file = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def _is_leader(self):
+        """
+        Returns True if this process may poll, taking the lock file
+        the first time it is free.
+        """
+        if self.lock_path is None or fcntl is None:
+            return True
+        if self._lock_file is None:
+            # pylint: disable=consider-using-with
+            lock_file = open(self.lock_path, 'a', encoding='utf8')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+            self._lock_file = lock_file
+        return True
+
+    def poll_once(self):
+        """
+        Fetches the blog once and ingests it if it changed.
+        Returns:
+            True if ingest published new data, otherwise False.
+        """
+        if not self._is_leader():
+            return False
+        self.stats['polls'] += 1
+        content, etag, last_modified = fetch_blog_page(
+            self.url, self.session, self.etag, self.last_modified)
+        if content is None:
+            self.stats['not_modified'] += 1
+            return False
+        # Servers without validators still send the same bytes
+        content_hash = hashlib.sha256(content).hexdigest()
+        if content_hash != self.content_hash:
+            output = self.ingest(content)
+        else:
+            self.stats['not_modified'] += 1
+            output = None
+        # Only remember the page once it was ingested, so a failed
+        # ingest is retried instead of answered with 304
+        self.etag, self.last_modified = etag, last_modified
+        self.content_hash = content_hash
+        if output is None:
+            return False
+        self.stats['ingested'] += 1
+        if self.on_update is not None:
+            self.on_update()
+        return True
+
+    def run(self):
+        """
+        Polls every `interval` seconds until stop is called. Errors
+        are counted and retried on the next poll.
+        """
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+            # pylint: disable=broad-exception-caught
+            except Exception:
+                self.stats['errors'] += 1
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def start(self):
+        """
+        Starts polling on a daemon thread.
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self.run, name='uw-alerts-blog-poller', daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        """
+        Makes a running poller poll now instead of after the interval.
+        """
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        """
+        Stops the polling thread and releases the lock file.
+        """
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+
+def poller_interval():
+    """
+    Returns:
+        The poll interval in seconds from the UW_ALERTS_POLL_INTERVAL
+        environment variable, or None if background polling is off.
+    """
+    interval = os.getenv('UW_ALERTS_POLL_INTERVAL')
+    if not interval:
+        return None
+    return float(interval)
@@ -0,0 +1,261 @@
+"""
+Persistent cache and batch geocoding of alert addresses.
+Addresses are normalized ("1400 NE 42nd Street." and "1400 ne 42nd st"
+share an entry), every unique address of a batch is geocoded once,
+concurrently on a bounded thread pool, and results are kept in a SQLite
+file for a time to live, so cleaning the alerts again only geocodes
+the addresses it has not seen.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from functools import lru_cache
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import googlemaps
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(__file__),
+                                  '../../data/geocode_cache.sqlite')
+DEFAULT_TTL = 30 * 24 * 60 * 60
+# Appended to every address so the geocoder searches near campus
+ADDRESS_SUFFIX = ', University District, Seattle WA'
+GOOGLE_MAPS_BASE_URL = 'https://maps.googleapis.com'
+# Geocode requests of a batch sent at the same time
+GEOCODE_WORKERS = int(os.getenv('UW_ALERTS_GEOCODE_WORKERS', '8'))
+
+ADDRESS_ABBREVIATIONS = {
+    'street': 'st', 'avenue': 'ave', 'av': 'ave', 'boulevard': 'blvd',
+    'place': 'pl', 'road': 'rd', 'drive': 'dr', 'lane': 'ln',
+    'court': 'ct', 'terrace': 'ter', 'parkway': 'pkwy',
+    'northeast': 'ne', 'northwest': 'nw', 'southeast': 'se', 'southwest': 'sw',
+    'and': '&',
+}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS geocodes (
+    key TEXT PRIMARY KEY,
+    address TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created REAL NOT NULL
+);
+'''
+
+
+def normalize_address(address):
+    """
+    Arguments:
+        address - address extracted from an alert.
+    Returns:
+        The address lowercased, without punctuation and with the
+        street types and directions abbreviated.
+    """
+    words = re.findall(r"[a-z0-9#&]+(?:'[a-z]+)?", str(address).lower().replace('/', ' & '))
+    return ' '.join(ADDRESS_ABBREVIATIONS.get(word, word) for word in words)
+
+
+class GeocodeCache:
+    """
+    SQLite table of geocoding results keyed by normalized address.
+    Connections are short lived, so the cache can be shared by
+    threads and processes.
+
+    Arguments:
+        db_path - path to the SQLite file, created if missing.
+        ttl - seconds a result stays valid.
+        clock - function returning the current time in seconds.
+    """
+    def __init__(self, db_path, ttl=DEFAULT_TTL, clock=time.time):
+        if not isinstance(db_path, str):
+            raise ValueError("db_path must be a string")
+        if not isinstance(ttl, (int, float)) or ttl <= 0:
+            raise ValueError("ttl must be a positive number")
+        self.db_path = db_path
+        self.ttl = ttl
+        self.clock = clock
+        self.stats = {'hits': 0, 'misses': 0}
+        self._lock = threading.Lock()
+        with closing(self.connect()) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+
+    def connect(self):
+        """
+        Returns:
+            A new connection to the cache database.
+        """
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def get_many(self, keys):
+        """
+        Arguments:
+            keys - normalized addresses.
+        Returns:
+            A dictionary of the keys with an unexpired result to
+            the geocode result (list of Google Maps matches).
+        """
+        keys = list(keys)
+        results = {}
+        oldest = self.clock() - self.ttl
+        with closing(self.connect()) as conn:
+            # stay below SQLite's limit of bound parameters
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = conn.execute(
+                    'SELECT key, result FROM geocodes'
+                    f' WHERE created > ? AND key IN ({placeholders})', [oldest] + batch)
+                results.update((key, json.loads(result)) for key, result in rows)
+        with self._lock:
+            self.stats['hits'] += len(results)
+            self.stats['misses'] += len(keys) - len(results)
+        return results
+
+    def put_many(self, entries):
+        """
+        Arguments:
+            entries - dictionary of normalized address to
+                (address, geocode result).
+        """
+        now = self.clock()
+        with closing(self.connect()) as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO geocodes (key, address, result, created)'
+                ' VALUES (?, ?, ?, ?)',
+                [(key, address, json.dumps(result), now)
+                 for key, (address, result) in entries.items()])
+            conn.commit()
+
+    def purge_expired(self):
+        """
+        Deletes the expired results.
+        Returns:
+            The number of deleted results.
+        """
+        with closing(self.connect()) as conn:
+            deleted = conn.execute('DELETE FROM geocodes WHERE created <= ?',
+                                   (self.clock() - self.ttl,)).rowcount
+            conn.commit()
+        return deleted
+
+
+# pylint: disable=too-many-locals
+def geocode_batch(addresses, geocode, cache=None, local_geocode=None,
+                  max_workers=GEOCODE_WORKERS):
+    """
+    Geocodes a batch of addresses, calling `geocode` once per unique
+    normalized address that is not in the cache. The calls run on a
+    thread pool, so a batch takes about one round trip of wall time
+    (within the rate limit of `geocode`).
+
+    Arguments:
+        addresses - addresses extracted from alerts.
+        geocode - thread-safe function geocoding one address string,
+            e.g. a rate limited gmaps_client.geocode.
+        cache - optional GeocodeCache to read and fill.
+        local_geocode - optional offline geocoder (e.g.
+            StreetGeocoder.geocode) tried first. Addresses it returns
+            None for are looked up in the cache and with `geocode`.
+        max_workers - maximum number of concurrent `geocode` calls.
+    Returns:
+        (results, stats): the geocode results in the order of
+        `addresses`, and a dictionary with the number of addresses,
+        unique addresses, addresses resolved locally, from the cache
+        and by `geocode`, the batch seconds and the mean and max
+        seconds of the `geocode` calls.
+    """
+    if not isinstance(max_workers, int) or max_workers < 1:
+        raise ValueError("max_workers must be a positive integer")
+    start = time.perf_counter()
+    keys = [normalize_address(address) for address in addresses]
+    unique = {}
+    for key, address in zip(keys, addresses):
+        unique.setdefault(key, address)
+    results = {}
+    if local_geocode is not None:
+        for key, address in unique.items():
+            result = local_geocode(address)
+            if result:
+                results[key] = result
+    n_local = len(results)
+    if cache is not None:
+        results.update(cache.get_many(key for key in unique if key not in results))
+    missing = [(key, address) for key, address in unique.items() if key not in results]
+
+    def timed_geocode(address):
+        request_start = time.perf_counter()
+        result = geocode(''.join([address, ADDRESS_SUFFIX]))
+        return result, time.perf_counter() - request_start
+
+    latencies = []
+    new_results = {}
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(missing))) as executor:
+            responses = executor.map(timed_geocode, [address for _, address in missing])
+            for (key, address), (result, latency) in zip(missing, responses):
+                results[key] = result
+                latencies.append(latency)
+                # empty results may be transient, geocode them again next time
+                if result:
+                    new_results[key] = (address, result)
+    if cache is not None and new_results:
+        cache.put_many(new_results)
+    stats = {
+        'addresses': len(keys),
+        'unique': len(unique),
+        'local': n_local,
+        'cached': len(unique) - n_local - len(missing),
+        'geocoded': len(missing),
+        'seconds': time.perf_counter() - start,
+        'mean_latency': sum(latencies) / len(latencies) if latencies else 0.0,
+        'max_latency': max(latencies, default=0.0),
+    }
+    return [results[key] for key in keys], stats
+
+
+def geocode_addresses(addresses, geocode, cache=None, local_geocode=None):
+    """
+    Returns:
+        The geocode results of geocode_batch, without the stats.
+    """
+    return geocode_batch(addresses, geocode, cache, local_geocode)[0]
+
+
+def make_gmaps_client(key, pool_size=GEOCODE_WORKERS, base_url=None):
+    """
+    Arguments:
+        key - Google Maps API key.
+        pool_size - connections kept open to the API, at least the
+            number of concurrent geocode requests.
+        base_url - URL of the Maps API. Defaults to GOOGLE_MAPS_BASE_URL
+            (e.g. a standin_services.StandInServer url) or to Google.
+    Returns:
+        A googlemaps.Client whose requests share one session with a
+        connection pool sized for the batch geocoding threads.
+    """
+    if base_url is None:
+        base_url = os.getenv('GOOGLE_MAPS_BASE_URL') or GOOGLE_MAPS_BASE_URL
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return googlemaps.Client(key=key, requests_session=session, base_url=base_url)
+
+
+@lru_cache(maxsize=None)
+def get_geocode_cache():
+    """
+    Returns:
+        The process-wide GeocodeCache in UW_ALERTS_GEOCODE_CACHE
+        (default data/geocode_cache.sqlite) with a time to live of
+        UW_ALERTS_GEOCODE_TTL seconds, or None if UW_ALERTS_GEOCODE_CACHE
+        is set to an empty string.
+    """
+    db_path = os.getenv('UW_ALERTS_GEOCODE_CACHE', DEFAULT_CACHE_PATH)
+    if not db_path:
+        return None
+    return GeocodeCache(db_path, ttl=float(os.getenv('UW_ALERTS_GEOCODE_TTL', str(DEFAULT_TTL))))
@@ -0,0 +1,240 @@
+"""
+Allocation of Incident and Alert IDs without reading the alert data.
+The next Alert ID, the next Incident ID and a pointer to the incident
+and alert type of the last allocated alert are kept in a small JSON
+state file next to the data (<data path>.ids.json). The state is
+seeded from the data, then every allocation reads and replaces only
+the state file under an exclusive lock file, so it costs the same for
+any number of stored alerts and alerts ingested at the same time by
+several threads or worker processes never get the same IDs. The state
+also holds a fingerprint of the data (the size and modification time
+of the file, or the store version): when the data was rewritten by
+anything else, e.g. a pull of a new csv or replace_alerts, the state
+is seeded again, never moving the counters back.
+"""
+from contextlib import contextmanager
+from functools import lru_cache, partial
+import json
+import os
+import tempfile
+import threading
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+STATE_SUFFIX = '.ids.json'
+ALERT_TYPES = ['Update', 'Original']
+
+
+def state_from_alerts(alerts, archive_order=False):
+    """
+    Arguments:
+        alerts - Pandas DataFrame with the Incident ID, Alert ID and
+            Alert Type columns, or None.
+        archive_order - whether the last allocated alert is the last
+            row (the .txt archive parsed newest first, rows appended)
+            instead of the first row (new alerts stored in front).
+    Returns:
+        The allocator state of the data: the next Alert and Incident
+        IDs and the incident and alert type of the last allocated alert.
+    """
+    if alerts is None or len(alerts.index) == 0:
+        return {'next_alert_id': 1, 'next_incident_id': 1,
+                'last_incident_id': None, 'last_alert_type': None}
+    last = alerts.iloc[-1] if archive_order else alerts.iloc[0]
+    last_alert_type = last.get('Alert Type')
+    return {'next_alert_id': int(alerts['Alert ID'].max()) + 1,
+            'next_incident_id': int(alerts['Incident ID'].max()) + 1,
+            'last_incident_id': int(last['Incident ID']),
+            'last_alert_type': last_alert_type if isinstance(last_alert_type, str) else None}
+
+
+def data_fingerprint(data_path):
+    """
+    Returns:
+        [inode, size, mtime in ns] of the file at data_path, or None
+        if it does not exist.
+    """
+    try:
+        stat = os.stat(data_path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_ino, stat.st_size, stat.st_mtime_ns]
+
+
+def merge_state(saved, seeded):
+    """
+    Returns:
+        The state seeded from the data, with counters no lower than
+        those of the saved state, so no ID is given out twice.
+    """
+    if saved is None:
+        return seeded
+    return dict(seeded,
+                next_alert_id=max(saved['next_alert_id'], seeded['next_alert_id']),
+                next_incident_id=max(saved['next_incident_id'], seeded['next_incident_id']))
+
+
+def next_ids(state, alert_type, archive_order=False):
+    """
+    Arguments:
+        state - allocator state from state_from_alerts.
+        alert_type - 'Update' or 'Original'.
+        archive_order - whether alerts are allocated in the order of
+            the .txt archive, newest first, where an incident ends at
+            its 'Original' post, instead of in the order they are posted,
+            where an 'Original' post starts a new incident.
+    Returns:
+        (incident_id, alert_id, state): the IDs of the alert and the
+        state after it. Every alert gets the next Alert ID.
+    Exceptions:
+        alert_type must be 'Update' or 'Original'.
+    """
+    if alert_type not in ALERT_TYPES:
+        raise ValueError("alert_type must be either 'Update' or 'Original'")
+    if archive_order:
+        new_incident = state['last_alert_type'] == 'Original'
+    else:
+        new_incident = alert_type == 'Original'
+    if new_incident or state['last_incident_id'] is None:
+        incident_id = state['next_incident_id']
+    else:
+        incident_id = state['last_incident_id']
+    alert_id = state['next_alert_id']
+    return incident_id, alert_id, {
+        'next_alert_id': alert_id + 1,
+        'next_incident_id': max(state['next_incident_id'], incident_id + 1),
+        'last_incident_id': incident_id,
+        'last_alert_type': alert_type}
+
+
+class IdAllocator:
+    """
+    Persisted Incident and Alert ID counters of one alert data file.
+
+    Arguments:
+        state_path - path to the JSON state file.
+        fingerprint - optional function returning a JSON value that
+            changes whenever the data is written, e.g. a partial of
+            data_fingerprint or the version of an alert store.
+    """
+    def __init__(self, state_path, fingerprint=None):
+        if not isinstance(state_path, str):
+            raise ValueError("state_path must be a string")
+        self.state_path = state_path
+        self.fingerprint = fingerprint
+        self.lock_path = state_path + '.lock'
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _file_lock(self):
+        """
+        Context manager holding the exclusive lock of the state,
+        across threads and processes.
+        """
+        with self._lock, open(self.lock_path, 'a', encoding='utf8') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # Closing the file releases the lock
+            yield
+
+    def _read(self):
+        """
+        Returns:
+            The saved state, or None before the first allocation.
+        """
+        try:
+            with open(self.state_path, encoding='utf8') as state_file:
+                return json.load(state_file)
+        except FileNotFoundError:
+            return None
+
+    def _write(self, state):
+        """
+        Atomically replaces the state file. Callers hold the lock.
+        """
+        directory = os.path.dirname(os.path.abspath(self.state_path))
+        with tempfile.NamedTemporaryFile('w', dir=directory, suffix='.ids.tmp',
+                                         delete=False, encoding='utf8') as tmp:
+            json.dump(state, tmp)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        os.replace(tmp.name, self.state_path)
+
+    def state(self):
+        """
+        Returns:
+            The saved state, or None if the allocator was not seeded.
+        """
+        with self._file_lock():
+            return self._read()
+
+    def allocate(self, alert_type, archive_order=False, load_alerts=None):
+        """
+        Arguments:
+            alert_type - 'Update' or 'Original'.
+            archive_order - allocation order, as in next_ids.
+            load_alerts - function returning the stored alerts as a
+                Pandas DataFrame, called only to seed the state on
+                the first allocation and after the data changed
+                without sync.
+        Returns:
+            (incident_id, alert_id) of the alert.
+        """
+        with self._file_lock():
+            state = self._read()
+            fingerprint = self.fingerprint() if self.fingerprint is not None else None
+            if state is None or state.get('fingerprint') != fingerprint:
+                state = merge_state(state, state_from_alerts(
+                    load_alerts() if load_alerts is not None else None, archive_order))
+            incident_id, alert_id, state = next_ids(state, alert_type, archive_order)
+            self._write(dict(state, fingerprint=fingerprint))
+        return incident_id, alert_id
+
+    def sync(self):
+        """
+        Records the fingerprint of the data after the alerts given
+        IDs were written to it, so the next allocation does not seed
+        the state again.
+        """
+        with self._file_lock():
+            state = self._read()
+            if state is not None and self.fingerprint is not None:
+                self._write(dict(state, fingerprint=self.fingerprint()))
+
+    def reset(self, state=None):
+        """
+        Replaces the state after the data was rewritten, e.g. with
+        state_from_alerts of the new data. With None, the next
+        allocation seeds the state from the data again.
+        """
+        with self._file_lock():
+            if state is None:
+                if os.path.exists(self.state_path):
+                    os.remove(self.state_path)
+            else:
+                fingerprint = self.fingerprint() if self.fingerprint is not None else None
+                self._write(dict(state, fingerprint=fingerprint))
+
+
+@lru_cache(maxsize=None)
+def _id_allocator(data_path):
+    """
+    Returns the IdAllocator of a normalized data path.
+    """
+    return IdAllocator(data_path + STATE_SUFFIX, partial(data_fingerprint, data_path))
+
+
+def get_id_allocator(data_path):
+    """
+    Arguments:
+        data_path - path to the alert data (.csv file or SQLite
+            database) whose IDs are allocated.
+    Returns:
+        The process-wide IdAllocator of the data, with its state in
+        data_path + STATE_SUFFIX and the data_fingerprint of the file.
+    """
+    if not isinstance(data_path, str):
+        raise ValueError("data_path must be a string")
+    return _id_allocator(os.path.abspath(data_path))
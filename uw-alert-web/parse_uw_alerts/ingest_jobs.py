@@ -0,0 +1,165 @@
+"""
+Background ingestion jobs for alerts submitted to the web app.
+Runs the prompt_gpt -> generate_ids -> clean_gpt_output pipeline
+on a bounded thread pool, so the web request that submits an alert
+returns right away with a job id whose status can be polled.
+"""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+# pylint: disable=too-many-instance-attributes
+class IngestJobQueue:
+    """
+    Bounded queue of ingestion jobs.
+
+    Arguments:
+        run_job - callable taking a job payload. Its return value
+            must be JSON serializable and is stored as the job result.
+        max_workers - number of jobs that run at the same time.
+        max_pending - number of queued and running jobs accepted
+            before submit refuses new jobs.
+        max_history - number of finished jobs whose status is kept.
+        state_dir - optional directory where every status change is
+            written as <job id>.json, so any web worker process can
+            answer status requests.
+    """
+    # pylint: disable=too-many-arguments
+    def __init__(self, run_job, max_workers=2, max_pending=16,
+                 max_history=256, state_dir=None):
+        if not callable(run_job):
+            raise ValueError("run_job must be callable")
+        for name, value in [('max_workers', max_workers), ('max_pending', max_pending),
+                            ('max_history', max_history)]:
+            if not isinstance(value, int) or value <= 0:
+                raise ValueError(f"{name} must be a positive integer")
+        self.run_job = run_job
+        self.max_pending = max_pending
+        self.max_history = max_history
+        self.state_dir = state_dir
+        if state_dir is not None:
+            os.makedirs(state_dir, exist_ok=True)
+        self._jobs = OrderedDict()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='uw-alerts-ingest')
+
+    def submit(self, payload):
+        """
+        Arguments:
+            payload - argument passed to run_job.
+        Returns:
+            The job id, or None if max_pending jobs are already
+            queued or running.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                return None
+            self._pending += 1
+            job_id = uuid.uuid4().hex
+            job = {'id': job_id, 'status': QUEUED, 'submitted_at': time.time(),
+                   'started_at': None, 'finished_at': None, 'result': None,
+                   'error': None}
+            self._jobs[job_id] = job
+            self._save(job)
+        self._executor.submit(self._run, job_id, payload)
+        return job_id
+
+    def _run(self, job_id, payload):
+        """
+        Runs one job and records its status.
+        """
+        self._update(job_id, status=RUNNING, started_at=time.time())
+        try:
+            result = self.run_job(payload)
+        # pylint: disable=broad-exception-caught
+        except Exception as error:
+            self._update(job_id, status=FAILED, finished_at=time.time(),
+                         error=f"{type(error).__name__}: {error}")
+        else:
+            self._update(job_id, status=DONE, finished_at=time.time(), result=result)
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._trim()
+
+    def _update(self, job_id, **changes):
+        """
+        Applies `changes` to a job and saves it.
+        """
+        with self._lock:
+            job = dict(self._jobs[job_id], **changes)
+            self._jobs[job_id] = job
+            self._save(job)
+
+    def _trim(self):
+        """
+        Forgets the oldest finished jobs beyond max_history.
+        Callers hold the lock.
+        """
+        finished = [job_id for job_id, job in self._jobs.items()
+                    if job['status'] in (DONE, FAILED)]
+        for job_id in finished[:max(0, len(finished) - self.max_history)]:
+            del self._jobs[job_id]
+            if self.state_dir is not None:
+                try:
+                    os.remove(self._state_path(job_id))
+                except FileNotFoundError:
+                    pass
+
+    def _state_path(self, job_id):
+        """
+        Returns the status file of a job.
+        """
+        return os.path.join(self.state_dir, job_id + '.json')
+
+    def _save(self, job):
+        """
+        Atomically writes the status file of a job.
+        """
+        if self.state_dir is None:
+            return
+        file_descriptor, tmp_path = tempfile.mkstemp(dir=self.state_dir, suffix='.tmp')
+        with os.fdopen(file_descriptor, 'w', encoding='utf8') as tmp_file:
+            json.dump(job, tmp_file)
+        os.replace(tmp_path, self._state_path(job['id']))
+
+    def status(self, job_id):
+        """
+        Arguments:
+            job_id - id returned by submit.
+        Returns:
+            A dictionary with the job id, status (queued, running,
+            done or failed), timestamps, result and error, or None
+            for an unknown job id.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return dict(job)
+        # Jobs submitted to another worker process
+        if self.state_dir is None or not isinstance(job_id, str) or not job_id.isalnum():
+            return None
+        try:
+            with open(self._state_path(job_id), encoding='utf8') as state_file:
+                return json.load(state_file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def shutdown(self, wait=True):
+        """
+        Stops accepting jobs and waits for the running ones if `wait`.
+        """
+        self._executor.shutdown(wait=wait)
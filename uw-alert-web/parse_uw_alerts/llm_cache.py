@@ -0,0 +1,160 @@
+"""
+Content-addressed disk cache of GPT extraction results.
+Entries are keyed by a hash of the model, the prompt template and
+the normalized alert chunk, and hold the raw completion together
+with the parsed table, so re-extracting an unchanged alert (a
+re-backfill, a resubmitted /update_map form) skips the OpenAI call.
+The cache is bounded in bytes and evicts least recently used entries.
+"""
+from functools import lru_cache
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import pandas as pd
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(__file__), '../../data/llm_cache')
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def normalize_chunk(chunk):
+    """
+    Returns:
+        The alert chunk with whitespace runs collapsed and blank lines
+        dropped, so formatting-only differences share a cache entry.
+    """
+    lines = (' '.join(line.split()) for line in chunk.split('\n'))
+    return '\n'.join(line for line in lines if line)
+
+
+def cache_key(model, prompt_template, chunk):
+    """
+    Arguments:
+        model - name of the completion model.
+        prompt_template - task text the chunk is appended to.
+        chunk - alert text sent to the model.
+    Returns:
+        The sha256 hex digest identifying the extraction.
+    """
+    payload = json.dumps([model, prompt_template, normalize_chunk(chunk)])
+    return hashlib.sha256(payload.encode('UTF-8')).hexdigest()
+
+
+class LLMCache:
+    """
+    Directory of <key>.json entries. Writes are atomic (temporary file
+    and rename), so several threads and processes can share a cache
+    directory; reading an entry refreshes its modification time, which
+    orders the least recently used eviction.
+
+    Arguments:
+        directory - cache directory, created if missing.
+        max_bytes - total size of the entries kept on disk.
+    """
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        if not isinstance(max_bytes, int) or max_bytes < 1:
+            raise ValueError("max_bytes must be a positive integer")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(size for _, _, size in self._entries())
+
+    def _path(self, key):
+        """
+        Returns the path of the entry `key`.
+        """
+        return os.path.join(self.directory, key + '.json')
+
+    def _entries(self):
+        """
+        Returns:
+            (mtime, path, size) of every entry in the directory.
+        """
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if not entry.name.endswith('.json'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+    def get(self, key):
+        """
+        Returns:
+            A dictionary with the raw 'completion' and the parsed
+            'table' (Pandas DataFrame) stored under `key`, or None.
+        """
+        path = self._path(key)
+        try:
+            with open(path, encoding='UTF-8') as entry_file:
+                entry = json.load(entry_file)
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.stats['misses'] += 1
+            return None
+        with self._lock:
+            self.stats['hits'] += 1
+        return {'completion': entry['completion'],
+                'table': pd.DataFrame(entry['data'], columns=entry['columns'])}
+
+    def put(self, key, completion, table):
+        """
+        Stores the raw completion and parsed table of an extraction,
+        then evicts the least recently used entries above max_bytes.
+        """
+        content = json.dumps({'completion': completion,
+                              'columns': list(table.columns),
+                              'data': table.values.tolist()}, default=str)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='UTF-8') as tmp_file:
+            tmp_file.write(content)
+        path = self._path(key)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._size += os.path.getsize(path) - replaced
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """
+        Removes the oldest entries until the cache fits in max_bytes.
+        Recounts the directory, which other processes may also write.
+        """
+        entries = sorted(self._entries())
+        self._size = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if self._size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._size -= size
+            self.stats['evictions'] += 1
+
+
+@lru_cache(maxsize=None)
+def get_llm_cache():
+    """
+    Returns:
+        The process-wide LLMCache in UW_ALERTS_LLM_CACHE_DIR (default
+        data/llm_cache) bounded by UW_ALERTS_LLM_CACHE_MAX_BYTES, or
+        None if UW_ALERTS_LLM_CACHE_DIR is set to an empty string.
+    """
+    directory = os.getenv('UW_ALERTS_LLM_CACHE_DIR', DEFAULT_CACHE_DIR)
+    if not directory:
+        return None
+    max_bytes = int(os.getenv('UW_ALERTS_LLM_CACHE_MAX_BYTES', str(DEFAULT_MAX_BYTES)))
+    return LLMCache(directory, max_bytes)
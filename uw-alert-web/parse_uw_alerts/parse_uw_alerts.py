@@ -2,95 +2,224 @@
 Functions to parse UW Alerts text data and extract 
 key incident information in a tabular format.
 """
+from functools import partial
 import os
 import io
-import time
 import re
 import pandas as pd
 import openai
-from transformers import GPT2Tokenizer
 import googlemaps
 from dotenv import load_dotenv
 from bs4 import BeautifulSoup
 import requests
+from .token_counter import count_tokens
+from .rate_limiter import get_rate_limiter
+from .llm_cache import cache_key, get_llm_cache
+from .geocode_cache import geocode_batch, get_geocode_cache, make_gmaps_client
+from .street_geocoder import get_street_geocoder
+from .segmenter import iter_alert_chunks, DATE_PATTERN, UPDATE_PATTERN
+from .rule_extractor import extract_alert, GPT_COLUMNS, RULE_MIN_CONFIDENCE
+from .table_stream import completion_max_tokens, read_table_stream
+from .id_allocator import get_id_allocator, next_ids, state_from_alerts
 
-def prompt_gpt(lines, return_alert_type=False):
+GPT_MODEL = "text-davinci-003"
+GPT_TASK = ('Extract a markdown table with the columns Date (mm/dd/yyyy),'
+            ' Report Time (hh:mm AM/PM), Incident Time (hh:mm AM/PM),'
+            ' Nearest Address to Incident, Incident Category, and'
+            ' Incident Summary from the following alert message.\n'
+            'Text: """')
+# Context size of text-davinci-003 in tokens
+MODEL_CONTEXT_TOKENS = 4097
+
+def parse_completion(completion):
     """
     Arguments:
-        lines - lines of text from .readlines output.
+        completion - markdown table text returned by GPT.
     Returns:
-        A Pandas dataframe containing a structured 
-        table from the UW alert message chunk.
-    Exceptions:
-        lines must be a list of length at least 1.
-        return_alert_type must be a boolean.
-        The first item in lines must contain a date.
+        A Pandas DataFrame with the six extracted columns.
     """
-    if not isinstance(lines, list):
-        raise ValueError("lines must be a list")
-    if len(lines) < 1:
-        raise ValueError("lines must be at least length 1")
-    if not isinstance(return_alert_type, bool):
-        raise ValueError("return_alert_type must be a boolean")
-    if re.match(r'^[A-z]+\s\d{1,2},\s\d{4}', lines[0]) is None:
-        raise ValueError("First item in lines must contain a date")
-
-    gpt_task = ('Extract a markdown table with the columns Date (mm/dd/yyyy),'
-                ' Report Time (hh:mm AM/PM), Incident Time (hh:mm AM/PM),'
-                ' Nearest Address to Incident, Incident Category, and'
-                ' Incident Summary from the following alert message.\n'
-                'Text: """')
-    alert_chunk = '\n'.join(line for line in lines if not line.isspace())
-    alert_chunk = alert_chunk.strip('\n')
-    alert_chunk = re.sub(r'\u2013|\u2014', '-', alert_chunk)
-    gpt_prompt = '\n'.join([gpt_task, alert_chunk])
-    gpt_prompt += '"""'
-    tokenizer = GPT2Tokenizer.from_pretrained('gpt2')
-    n_tokens = len(tokenizer(gpt_prompt)['input_ids'])
-    response = openai.Completion.create(
-        engine="text-davinci-003",
-        prompt=gpt_prompt,
-        max_tokens=4097-n_tokens)
     gpt_table = pd.read_table(
-        io.StringIO(response['choices'][0]['text']), sep='|', \
+        io.StringIO(completion), sep='|', \
             skipinitialspace=True, header=0, index_col=False)
     gpt_table.drop(list(
         gpt_table.filter(regex = 'Unnamed')), axis = 1, inplace = True)
-    column_names = ['Date', 'Report Time', 'Incident Time',
-                    'Nearest Address to Incident', 'Incident Category',
-                    'Incident Summary']
-    gpt_table.columns = column_names
+    gpt_table.columns = GPT_COLUMNS
     if re.match(r'(:)?--', gpt_table['Date'].values[0]):
         gpt_table = gpt_table.iloc[1:]
     gpt_table.reset_index(inplace=True)
-    gpt_table = gpt_table.loc[:, column_names]
+    gpt_table = gpt_table.loc[:, GPT_COLUMNS]
+    for column in GPT_COLUMNS:
+        gpt_table[column] = gpt_table[column].astype(str).str.strip()
+    return gpt_table
+
+def format_alert_chunk(lines):
+    """
+    Arguments:
+        lines - lines of an alert chunk, starting with the date line.
+    Returns:
+        The alert text sent to GPT: the non-blank lines with en and
+        em dashes replaced by hyphens.
+    """
+    alert_chunk = '\n'.join(line for line in lines if not line.isspace())
+    alert_chunk = alert_chunk.strip('\n')
+    return re.sub(r'\u2013|\u2014', '-', alert_chunk)
+
+def lookup_extraction(lines, alert_chunk, llm_cache, fast_path):
+    """
+    Arguments:
+        lines - lines of an alert chunk, starting with the date line.
+        alert_chunk - format_alert_chunk(lines).
+        llm_cache - LLMCache of extraction results or None.
+        fast_path - whether to try rule_extractor.extract_alert.
+    Returns:
+        (gpt_table, method, confidence): the cached table ('cache') or
+        the rule-based table if its confidence is at least
+        RULE_MIN_CONFIDENCE ('rules'), otherwise gpt_table is None and
+        the alert needs GPT. confidence is None when the rules were
+        not run.
+    """
+    cached = None
+    if llm_cache is not None:
+        cached = llm_cache.get(cache_key(GPT_MODEL, GPT_TASK, alert_chunk))
+    if cached is not None:
+        return cached['table'], 'cache', None
+    if not fast_path:
+        return None, None, None
+    rule_table, confidence = extract_alert(lines)
+    if confidence < RULE_MIN_CONFIDENCE:
+        return None, None, confidence
+    return rule_table, 'rules', confidence
+
+def finish_table(gpt_table, lines, alert_chunk, method, confidence):
+    """
+    Adds the Incident Alert and Alert Type columns to the extracted
+    table of an alert chunk, and the method and confidence of the
+    extraction to its attrs['extraction'].
+    Returns:
+        (gpt_table, alert_type), alert_type being 'Update' or 'Original'.
+    """
     alert_chunk = alert_chunk.split('\n')
     alert_chunk = [line for line in alert_chunk if not line.isspace()]
     alert_chunk = alert_chunk[1:]
     alert_chunk = '\n'.join(alert_chunk)
     gpt_table['Incident Alert'] = alert_chunk.strip('\n')
     alert_type = 'Original'
-    for line in lines:
-        if re.match(r'(\[)?update(d)?(:|\s+)', line, re.IGNORECASE):
-            alert_type = 'Update'
+    if any(UPDATE_PATTERN.match(line) for line in lines):
+        alert_type = 'Update'
     gpt_table['Alert Type'] = alert_type
-    for column in column_names:
-        gpt_table[column] = gpt_table[column].astype(str).str.strip()
-    time.sleep(5)
+    gpt_table.attrs['extraction'] = {'method': method, 'confidence': confidence}
+    return gpt_table, alert_type
+
+def request_completion(gpt_prompt, rate_limiter=None, max_tokens=None,
+                       on_row=None):
+    """
+    Streams a completion and stops reading it once its table closes.
+    Arguments:
+        gpt_prompt - prompt sent to GPT_MODEL.
+        rate_limiter - optional RateLimiter for the OpenAI request.
+            Defaults to the process-wide OpenAI limiter.
+        max_tokens - completion tokens to request. Defaults to
+            completion_max_tokens of the prompt size.
+        on_row - optional function called with each table line as
+            soon as it arrives.
+    Returns:
+        The completion text up to the end of its table. A completion
+        cut off by max_tokens is requested again with the rest of the
+        model context, and one whose stream fails is retried by the
+        rate limiter (its lines are passed to on_row again).
+    """
+    n_tokens = count_tokens(gpt_prompt)
+    if rate_limiter is None:
+        rate_limiter = get_rate_limiter('openai')
+    if max_tokens is None:
+        max_tokens = completion_max_tokens(n_tokens, MODEL_CONTEXT_TOKENS)
+    max_tokens = min(max_tokens, MODEL_CONTEXT_TOKENS - n_tokens)
+
+    def stream_table(max_tokens):
+        events = openai.Completion.create(engine=GPT_MODEL, prompt=gpt_prompt,
+                                          max_tokens=max_tokens, stream=True)
+        return read_table_stream(events, on_row)
+
+    while True:
+        # The stream is read within the call, so an error in the middle
+        # of it retries the whole completion. The prompt and max_tokens
+        # both count against the tokens per minute.
+        completion, complete = rate_limiter.call(stream_table, max_tokens,
+                                                 tokens=n_tokens + max_tokens)
+        if complete or max_tokens >= MODEL_CONTEXT_TOKENS - n_tokens:
+            return completion
+        max_tokens = MODEL_CONTEXT_TOKENS - n_tokens
+
+def prompt_gpt(lines, return_alert_type=False, rate_limiter=None,
+               llm_cache=None, fast_path=True):
+    """
+    Arguments:
+        lines - lines of text from .readlines output.
+        rate_limiter - optional RateLimiter for the OpenAI request.
+            Defaults to the process-wide OpenAI limiter.
+        llm_cache - optional LLMCache of extraction results. Defaults
+            to the process-wide cache; an alert already in the cache
+            is not sent to OpenAI again.
+        fast_path - whether an alert that rule_extractor.extract_alert
+            reads with a confidence of at least RULE_MIN_CONFIDENCE
+            uses the rule-based table instead of GPT.
+    Returns:
+        A Pandas dataframe containing a structured 
+        table from the UW alert message chunk. attrs['extraction']
+        holds the method ('cache', 'rules' or 'gpt') and the
+        confidence of the rules (None when they were not run).
+    Exceptions:
+        lines must be a list of length at least 1.
+        return_alert_type must be a boolean.
+        The first item in lines must contain a date.
+    """
+    if not isinstance(lines, list):
+        raise ValueError("lines must be a list")
+    if len(lines) < 1:
+        raise ValueError("lines must be at least length 1")
+    if not isinstance(return_alert_type, bool):
+        raise ValueError("return_alert_type must be a boolean")
+    if not isinstance(fast_path, bool):
+        raise ValueError("fast_path must be a boolean")
+    if DATE_PATTERN.match(lines[0]) is None:
+        raise ValueError("First item in lines must contain a date")
+
+    alert_chunk = format_alert_chunk(lines)
+    if llm_cache is None:
+        llm_cache = get_llm_cache()
+    gpt_table, method, confidence = lookup_extraction(lines, alert_chunk,
+                                                      llm_cache, fast_path)
+    if gpt_table is None:
+        method = 'gpt'
+        completion = request_completion(
+            '\n'.join([GPT_TASK, alert_chunk]) + '"""', rate_limiter)
+        gpt_table = parse_completion(completion)
+        if llm_cache is not None:
+            llm_cache.put(cache_key(GPT_MODEL, GPT_TASK, alert_chunk),
+                          completion, gpt_table)
+    gpt_table, alert_type = finish_table(gpt_table, lines, alert_chunk,
+                                         method, confidence)
     if return_alert_type:
         return (gpt_table, alert_type)
     return gpt_table
 
-def generate_ids(uw_alert_file, gpt_table, alert_type, parsing=False):
+def generate_ids(uw_alert_file, gpt_table, alert_type, parsing=False,
+                 id_allocator=None):
     """
     Arguments:
         uw_alert_file - either a filepath to csv file or Pandas DataFrame.
         gpt_table - Pandas DataFrame of GPT output.
         alert_type - string either 'Update' or 'Original'.
-        parsing - Boolean for if function call is to parse .txt file.
+        parsing - Boolean for if function call is to parse .txt file,
+            whose alerts are allocated in archive order (see next_ids).
+        id_allocator - optional IdAllocator of the stored alerts.
+            Defaults to the allocator of the csv filepath. The stored
+            alerts are only read to seed its state, so allocation
+            does not depend on their number. Without either, the ids
+            are computed from the DataFrame.
     Returns:
-        A Pandas DataFrame where gpt_table has added columns
-        containing the incident and alert ids.
+        gpt_table with added columns containing the incident and
+        alert ids.
     Exceptions:
         uw_alert_file must be a filepath with .csv extension or
         a Pandas DataFrame.
@@ -100,11 +229,13 @@ def generate_ids(uw_alert_file, gpt_table, alert_type, parsing=False):
         if not isinstance(uw_alert_file, pd.DataFrame):
             raise ValueError(
                 "uw_alert_file must be a filepath or Pandas DataFrame")
-        clean_data = uw_alert_file.copy()
+        load_alerts = uw_alert_file.copy
     else:
         if not re.search('.csv$', uw_alert_file):
             raise ValueError("uw_alert_file must be a .csv filepath")
-        clean_data = pd.read_csv(uw_alert_file, index_col=False)
+        load_alerts = partial(pd.read_csv, uw_alert_file, index_col=False)
+        if id_allocator is None:
+            id_allocator = get_id_allocator(uw_alert_file)
     if not isinstance(gpt_table, pd.DataFrame):
         raise ValueError(
             "gpt_table must be a filepath or Pandas DataFrame")
@@ -115,22 +246,13 @@ def generate_ids(uw_alert_file, gpt_table, alert_type, parsing=False):
     if not isinstance(parsing, bool):
         raise ValueError("parsing must be a boolean")
 
-    if len(clean_data.index) == 0:
-        gpt_table['Incident ID'] = 1
-        gpt_table['Alert ID'] = 1
-        return gpt_table
-    gpt_table['Alert ID'] = clean_data['Alert ID'].max() + 1
-    if parsing:
-        if clean_data['Alert Type'].values[-1] == 'Original':
-            gpt_table['Incident ID'] = clean_data[
-                'Incident ID'].values[-1] + 1
-            return pd.concat([clean_data, gpt_table], ignore_index=True)
-        gpt_table['Incident ID'] = clean_data['Incident ID'].values[-1]
-        return pd.concat([clean_data, gpt_table], ignore_index=True)
-    if gpt_table['Alert Type'].values[0] == 'Update':
-        gpt_table['Incident ID'] = clean_data['Incident ID'].values[0]
-        return gpt_table
-    gpt_table['Incident ID'] = clean_data['Incident ID'].max() + 1
+    if id_allocator is None:
+        incident_id, alert_id, _ = next_ids(state_from_alerts(uw_alert_file, parsing),
+                                            alert_type, parsing)
+    else:
+        incident_id, alert_id = id_allocator.allocate(alert_type, parsing, load_alerts)
+    gpt_table['Incident ID'] = incident_id
+    gpt_table['Alert ID'] = alert_id
     return gpt_table
 
 def generate_csv(out_filepath, lines):
@@ -157,9 +279,17 @@ def generate_csv(out_filepath, lines):
     gpt_table = prompt_gpt(lines, return_alert_type=True)
     alert_type = gpt_table[1]
     gpt_table = gpt_table[0]
-    clean_data = generate_ids(out_filepath, gpt_table,
-                              alert_type, parsing=True)
-    clean_data.to_csv(out_filepath, index=False)
+    gpt_table = generate_ids(out_filepath, gpt_table,
+                             alert_type, parsing=True)
+    columns = pd.read_csv(out_filepath, index_col=False, nrows=0).columns
+    if set(columns) == set(gpt_table.columns):
+        gpt_table[columns].to_csv(out_filepath, mode='a', header=False, index=False)
+    else:
+        # Output written without some of the columns is rewritten whole
+        clean_data = pd.read_csv(out_filepath, index_col=False)
+        clean_data = pd.concat([clean_data, gpt_table], ignore_index=True)
+        clean_data.to_csv(out_filepath, index=False)
+    get_id_allocator(out_filepath).sync()
     return 'CSV generated'
 
 def parse_txt_data(filepath, out_filepath, file_start=0):
@@ -191,45 +321,30 @@ def parse_txt_data(filepath, out_filepath, file_start=0):
         columns = ['Date', 'Report Time', 'Incident Time',
                    'Nearest Address to Incident',
                    'Incident Category', 'Incident Summary',
-                   'Incident Alert', 'Incident ID', 'Alert ID']
+                   'Incident Alert', 'Alert Type', 'Incident ID', 'Alert ID']
         empty_file = pd.DataFrame({column: [] for column in columns})
         empty_file.to_csv(out_filepath, index=False)
+        get_id_allocator(out_filepath).reset()
     with open(filepath, encoding='UTF-8') as file:
-        lines = file.readlines()
-        last_date = None
-        last_event = None
-        last_event_index = None
-        for i, line in enumerate(lines[file_start:]):
-            if (i + file_start) == (len(lines) - 1):
-                generate_csv(out_filepath,
-                             [last_date]+lines[last_event_index:])
-            date_check = re.match(r'^[A-z]+\s\d{1,2},\s\d{4}', line)
-            if date_check:
-                if last_event is not None:
-                    alert_end = i + file_start
-                    generate_csv(
-                        out_filepath,
-                        [last_date]+lines[last_event_index:alert_end])
-                last_date = line
-                last_event = 'date'
-                last_event_index = i + file_start
-            if re.match(
-                r'(\[)?update(d)?(:|\s+)', line, re.IGNORECASE) or re.match(
-                r'(\[)?original (post)?', line, re.IGNORECASE):
-                alert_end = i + file_start
-                if last_event == 'original/update':
-                    generate_csv(
-                        out_filepath,
-                        [last_date]+lines[last_event_index:alert_end])
-                last_event = 'original/update'
-                last_event_index = i + file_start
+        for date_line, chunk_lines, _ in iter_alert_chunks(file, file_start):
+            generate_csv(out_filepath, [date_line] + chunk_lines)
     return 'Parsing complete'
 
 def clean_gpt_output(gpt_output='../data/uw_alerts_gpt.csv',
-                     gmaps_client=None):
+                     gmaps_client=None, rate_limiter=None, geocode_cache=None,
+                     street_geocoder=None):
     """
     Arguments:
         gpt_output - either a filepath to csv file or Pandas DataFrame.
+        gmaps_client - Google Maps Client used to geocode addresses.
+        rate_limiter - optional RateLimiter for the geocode requests.
+            Defaults to the process-wide Google Maps limiter.
+        geocode_cache - optional GeocodeCache of geocoded addresses.
+            Defaults to the process-wide cache. Each unique address
+            missing from the cache is geocoded once.
+        street_geocoder - optional StreetGeocoder resolving street
+            intersections and blocks offline. Defaults to the
+            process-wide geocoder; Google geocodes the other addresses.
     Returns:
         A Pandas DataFrame with cleaned columns.
     Exceptions:
@@ -250,6 +365,20 @@ def clean_gpt_output(gpt_output='../data/uw_alerts_gpt.csv',
         raise ValueError("gpt_ouput must have at least 1 row")
     if not isinstance(gmaps_client, googlemaps.Client):
         raise ValueError("gmaps_client must be a Google Maps Client")
+    gpt_data = normalize_gpt_output(gpt_data)
+    return geocode_gpt_output(gpt_data, gmaps_client, rate_limiter, geocode_cache,
+                              street_geocoder)
+
+def normalize_gpt_output(gpt_data):
+    """
+    Arguments:
+        gpt_data - Pandas DataFrame of GPT output with incident ids,
+            newest alerts first.
+    Returns:
+        gpt_data with parsed dates and times, where missing dates,
+        times and addresses are filled from the older alerts of the
+        same incident.
+    """
     gpt_data['Date'] = pd.to_datetime(gpt_data['Date'],
                                       infer_datetime_format=True,
                                       errors='coerce')
@@ -274,19 +403,97 @@ def clean_gpt_output(gpt_output='../data/uw_alerts_gpt.csv',
         'Nearest Address to Incident'].bfill()
     gpt_data[['Nearest Address to Incident']] = gpt_data[
         ['Nearest Address to Incident']].fillna('')
-    geocode_results = [gmaps_client.geocode(
-        ''.join([address, ', University District, Seattle WA'])
-        ) for address in gpt_data['Nearest Address to Incident']]
+    return gpt_data
+
+def geocode_gpt_output(gpt_data, gmaps_client, rate_limiter=None,
+                       geocode_cache=None, street_geocoder=None):
+    """
+    Arguments:
+        gpt_data - Pandas DataFrame from normalize_gpt_output.
+        gmaps_client - Google Maps Client used to geocode addresses.
+        rate_limiter - optional RateLimiter for the geocode requests.
+        geocode_cache - optional GeocodeCache of geocoded addresses.
+        street_geocoder - optional StreetGeocoder tried before Google.
+    Returns:
+        gpt_data with the Google Address and geometry columns. The
+        geocode_batch stats are in gpt_data.attrs['geocode_stats'].
+    """
+    if rate_limiter is None:
+        rate_limiter = get_rate_limiter('google_maps')
+    if geocode_cache is None:
+        geocode_cache = get_geocode_cache()
+    if street_geocoder is None:
+        street_geocoder = get_street_geocoder()
+    geocode_results, stats = geocode_batch(
+        gpt_data['Nearest Address to Incident'],
+        lambda address: rate_limiter.call(gmaps_client.geocode, address),
+        geocode_cache,
+        street_geocoder.geocode if street_geocoder is not None else None)
+    gpt_data.attrs['geocode_stats'] = stats
     gpt_data['Google Address'] = [
         result[0]['formatted_address'] for result in geocode_results]
     gpt_data['geometry'] = [
         result[0]['geometry'] for result in geocode_results]
     return gpt_data
 
-def scrape_uw_alerts(uw_alert_filepath='../data/uw_alerts_clean.csv'):
+# pylint: disable=too-many-arguments
+def clean_new_alerts(new_alerts, uw_alerts, gmaps_client=None,
+                     rate_limiter=None, geocode_cache=None, street_geocoder=None):
+    """
+    Incremental clean_gpt_output for alerts added on top of the stored
+    clean alerts. Only the stored rows of the incidents the new alerts
+    belong to are read to fill their missing values, and only the new
+    alerts are geocoded, so the cost does not grow with the history.
+
+    Arguments:
+        new_alerts - Pandas DataFrame of GPT output from generate_ids,
+            newest alerts first.
+        uw_alerts - Pandas DataFrame of the stored clean alerts.
+        gmaps_client - Google Maps Client used to geocode addresses.
+        rate_limiter - optional RateLimiter for the geocode requests.
+        geocode_cache - optional GeocodeCache of geocoded addresses.
+        street_geocoder - optional StreetGeocoder tried before Google.
+    Returns:
+        new_alerts cleaned as clean_gpt_output cleans them on top of
+        the whole dataset, ready to be prepended to uw_alerts.
+    Exceptions:
+        new_alerts and uw_alerts must be Pandas DataFrames and
+        new_alerts must have at least 1 row.
+    """
+    if not isinstance(new_alerts, pd.DataFrame):
+        raise ValueError("new_alerts must be a Pandas DataFrame")
+    if not isinstance(uw_alerts, pd.DataFrame):
+        raise ValueError("uw_alerts must be a Pandas DataFrame")
+    if len(new_alerts.index) == 0:
+        raise ValueError("new_alerts must have at least 1 row")
+    if not isinstance(gmaps_client, googlemaps.Client):
+        raise ValueError("gmaps_client must be a Google Maps Client")
+    incident_alerts = uw_alerts.loc[
+        uw_alerts['Incident ID'].isin(new_alerts['Incident ID']),
+        new_alerts.columns.intersection(uw_alerts.columns)].copy()
+    # stored dates and times may already be parsed
+    for column in ['Date', 'Report Time', 'Incident Time']:
+        incident_alerts[column] = incident_alerts[column].astype(str)
+    gpt_data = normalize_gpt_output(
+        pd.concat([new_alerts, incident_alerts], ignore_index=True))
+    gpt_data = gpt_data.iloc[:len(new_alerts.index)].copy()
+    return geocode_gpt_output(gpt_data, gmaps_client, rate_limiter, geocode_cache,
+                              street_geocoder)
+
+def scrape_uw_alerts(uw_alert_filepath='../data/uw_alerts_clean.csv',
+                     alert_store=None, page_content=None, gmaps_client=None,
+                     id_allocator=None):
     """
     Arguments:
         uw_alert_filepath - string containing filepath to clean UW Alerts data
+        alert_store - optional alert store (AlertStore or SqliteAlertStore)
+            used to read and write the clean data instead of the csv file.
+        page_content - optional html of emergency.uw.edu already fetched
+            (e.g. by BlogPoller). Fetched here when None.
+        gmaps_client - optional Google Maps Client to reuse. When None,
+            the API keys are loaded from ../.env and a client is created.
+        id_allocator - optional IdAllocator of the stored alerts.
+            Defaults to the allocator of uw_alert_filepath.
     Returns:
         If a new alert was made, returns a Pandas DataFrame.
         Otherwise, returns None.
@@ -297,15 +504,20 @@ def scrape_uw_alerts(uw_alert_filepath='../data/uw_alerts_clean.csv'):
         raise ValueError("uw_alert_filepath must be a string")
     if re.search(r'\.csv$', uw_alert_filepath) is None:
         raise ValueError("uw_alert_filepath must have a .csv extension")
-    load_dotenv('../.env')
-    openai.api_key = os.getenv('OPENAI_API_KEY')
-    gmaps_client = googlemaps.Client(key=os.getenv('GOOGLE_MAPS_API_KEY'))
-    uw_alerts = pd.read_csv(uw_alert_filepath, index_col=False)
+    if gmaps_client is None:
+        load_dotenv('../.env')
+        openai.api_key = os.getenv('OPENAI_API_KEY')
+        gmaps_client = make_gmaps_client(os.getenv('GOOGLE_MAPS_API_KEY'))
+    if alert_store is None:
+        uw_alerts = pd.read_csv(uw_alert_filepath, index_col=False)
+    else:
+        uw_alerts = alert_store.get_raw_alerts()
     last_alert = uw_alerts['Incident Alert'].values[0]
 
-    url = "https://emergency.uw.edu/"
-    page = requests.get(url, timeout=10)
-    soup = BeautifulSoup(page.content,"html.parser")
+    if page_content is None:
+        url = "https://emergency.uw.edu/"
+        page_content = requests.get(url, timeout=10).content
+    soup = BeautifulSoup(page_content,"html.parser")
     main_content = soup.find(id="main_content")
     p_tags = main_content.find_all('p')
     for para in p_tags:
@@ -316,13 +528,18 @@ def scrape_uw_alerts(uw_alert_filepath='../data/uw_alerts_clean.csv'):
                                   newest_alert_list[1])
     if not re.search(last_alert, newest_alert_list[1]):
         gpt_output = prompt_gpt(newest_alert_list, return_alert_type=True)
-        gpt_table = generate_ids(uw_alerts, gpt_output[0], gpt_output[1])
-        gpt_table = clean_gpt_output(gpt_output=gpt_table,
-                                     gmaps_client=gmaps_client)
-        uw_alerts = pd.concat([gpt_table, uw_alerts], ignore_index=True)
-        uw_alerts = clean_gpt_output(gpt_output=uw_alerts,
+        if id_allocator is None:
+            id_allocator = get_id_allocator(uw_alert_filepath)
+        gpt_table = generate_ids(uw_alerts, gpt_output[0], gpt_output[1],
+                                 id_allocator=id_allocator)
+        gpt_table = clean_new_alerts(gpt_table, uw_alerts,
                                      gmaps_client=gmaps_client)
-        uw_alerts.to_csv(uw_alert_filepath, index=False)
+        if alert_store is None:
+            uw_alerts = pd.concat([gpt_table, uw_alerts], ignore_index=True)
+            uw_alerts.to_csv(uw_alert_filepath, index=False)
+        else:
+            alert_store.append_alerts(gpt_table)
+        id_allocator.sync()
         return gpt_table
     return None
 
@@ -335,4 +552,4 @@ if __name__ == "__main__":
     CLEAN_FILEPATH = '../data/uw_alerts_clean.csv'
     FILE_START = 0
     openai.api_key = OPENAI_API_KEY
-    gmaps = googlemaps.Client(key=GOOGLE_MAPS_API_KEY)
+    gmaps = make_gmaps_client(GOOGLE_MAPS_API_KEY)
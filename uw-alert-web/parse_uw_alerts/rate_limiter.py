@@ -0,0 +1,233 @@
+"""
+Rate limiting for the OpenAI and Google Maps API calls.
+Token buckets cap requests per second and tokens per minute for
+every thread of the process, and failed calls that the API asks
+to retry (429 and 5xx responses) are retried with exponential
+backoff instead of sleeping a fixed time after every call.
+"""
+from functools import lru_cache
+import os
+import random
+import threading
+import time
+
+# Default limits per service, overridden by the environment variables
+# <SERVICE>_REQUESTS_PER_SECOND and <SERVICE>_TOKENS_PER_MINUTE
+# (e.g. OPENAI_TOKENS_PER_MINUTE)
+SERVICE_LIMITS = {
+    'openai': {'requests_per_second': 1.0, 'tokens_per_minute': 150000},
+    'google_maps': {'requests_per_second': 50.0, 'tokens_per_minute': None},
+}
+
+# Google Maps API statuses that mean "retry later"
+RETRYABLE_API_STATUSES = {'OVER_QUERY_LIMIT', 'UNKNOWN_ERROR'}
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Callers reserve tokens and sleep for
+    their reservation outside the lock, so waiting threads are served
+    in order and never hold up each other's bookkeeping.
+
+    Arguments:
+        rate - tokens added per second.
+        capacity - maximum number of tokens, the allowed burst.
+            Defaults to one second of tokens (at least 1).
+        clock - function returning monotonic seconds.
+        sleep - function sleeping a number of seconds.
+    """
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        if not isinstance(rate, (int, float)) or rate <= 0:
+            raise ValueError("rate must be a positive number")
+        if capacity is None:
+            capacity = max(rate, 1)
+        if not isinstance(capacity, (int, float)) or capacity <= 0:
+            raise ValueError("capacity must be a positive number")
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = float(capacity)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount=1):
+        """
+        Arguments:
+            amount - number of tokens to take. Amounts above the
+                capacity take a full bucket.
+        Returns:
+            The number of seconds to wait before using the tokens.
+        """
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.capacity,
+                               self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= min(amount, self.capacity)
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self, amount=1):
+        """
+        Blocks until `amount` tokens are available and takes them.
+        Returns:
+            The number of seconds waited.
+        """
+        wait = self.reserve(amount)
+        if wait > 0:
+            self.sleep(wait)
+        return wait
+
+
+def get_retry_after(error):
+    """
+    Returns:
+        The seconds an API error asks to wait (Retry-After header),
+        or 0 if it does not say.
+    """
+    headers = getattr(error, 'headers', None)
+    response = getattr(error, 'response', None)
+    if headers is None and response is not None:
+        headers = getattr(response, 'headers', None)
+    try:
+        return float((headers or {}).get('Retry-After', 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def is_retryable(error):
+    """
+    Returns:
+        True if an exception raised by an API client is a rate limit
+        (429), a server error (5xx) or a timeout/connection error.
+        Works with the openai, googlemaps and requests exceptions
+        without importing them.
+    """
+    status = getattr(error, 'http_status', None)
+    if status is None:
+        status = getattr(error, 'status_code', None)
+    response = getattr(error, 'response', None)
+    if status is None and response is not None:
+        status = getattr(response, 'status_code', None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    if getattr(error, 'status', None) in RETRYABLE_API_STATUSES:
+        return True
+    return type(error).__name__ in {'Timeout', 'APIConnectionError',
+                                    'ServiceUnavailableError', 'TryAgain',
+                                    'TransportError', 'ConnectionError', 'ReadTimeout'}
+
+
+# pylint: disable=too-many-instance-attributes
+class RateLimiter:
+    """
+    Limits calls to one API and retries retryable failures.
+
+    Arguments:
+        requests_per_second - maximum request rate, None for no limit.
+        tokens_per_minute - maximum tokens (e.g. OpenAI prompt plus
+            completion tokens) per minute, None for no limit.
+        max_retries - retries of a call before its error is raised.
+        base_delay - seconds before the first retry, doubled per retry.
+        max_delay - upper bound of the backoff delay.
+        clock - function returning monotonic seconds.
+        sleep - function sleeping a number of seconds.
+    """
+    # pylint: disable=too-many-arguments
+    def __init__(self, requests_per_second=None, tokens_per_minute=None,
+                 max_retries=5, base_delay=1.0, max_delay=60.0,
+                 clock=time.monotonic, sleep=time.sleep):
+        if not isinstance(max_retries, int) or max_retries < 0:
+            raise ValueError("max_retries must be an integer 0 or greater")
+        self.request_bucket = None
+        if requests_per_second is not None:
+            self.request_bucket = TokenBucket(requests_per_second, clock=clock, sleep=sleep)
+        self.token_bucket = None
+        if tokens_per_minute is not None:
+            self.token_bucket = TokenBucket(tokens_per_minute / 60, capacity=tokens_per_minute,
+                                            clock=clock, sleep=sleep)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        self.stats = {'calls': 0, 'retries': 0, 'waited': 0.0}
+        self._lock = threading.Lock()
+
+    def _count(self, key, value=1):
+        """
+        Adds `value` to one of the stats.
+        """
+        with self._lock:
+            self.stats[key] += value
+
+    def wait(self, tokens=0):
+        """
+        Blocks until one request and `tokens` tokens are allowed.
+        """
+        waited = 0.0
+        if self.request_bucket is not None:
+            waited += self.request_bucket.acquire(1)
+        if self.token_bucket is not None and tokens > 0:
+            waited += self.token_bucket.acquire(tokens)
+        self._count('waited', waited)
+
+    def backoff(self, attempt, error=None):
+        """
+        Returns:
+            The seconds to wait before retry number `attempt` (from 0):
+            exponential with jitter, at least the error's Retry-After.
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        delay *= 0.5 + random.random() / 2
+        if error is not None:
+            delay = max(delay, get_retry_after(error))
+        return delay
+
+    def call(self, func, *args, tokens=0, **kwargs):
+        """
+        Calls func(*args, **kwargs) within the limits and retries
+        it while it raises retryable errors.
+
+        Arguments:
+            func - the API function to call.
+            tokens - tokens the call uses, for tokens_per_minute.
+        Returns:
+            The return value of func.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.wait(tokens)
+            self._count('calls')
+            try:
+                return func(*args, **kwargs)
+            # pylint: disable=broad-exception-caught
+            except Exception as error:
+                if attempt == self.max_retries or not is_retryable(error):
+                    raise
+                self._count('retries')
+                self.sleep(self.backoff(attempt, error))
+        return None
+
+
+def _env_limit(service, name):
+    """
+    Returns the limit `name` of `service` from the environment,
+    or its default.
+    """
+    value = os.getenv(f'{service.upper()}_{name.upper()}')
+    if value is None:
+        return SERVICE_LIMITS[service][name]
+    return float(value) if value else None
+
+
+@lru_cache(maxsize=None)
+def get_rate_limiter(service):
+    """
+    Arguments:
+        service - 'openai' or 'google_maps'.
+    Returns:
+        The process-wide RateLimiter of the service.
+    """
+    if service not in SERVICE_LIMITS:
+        raise ValueError(f"service must be one of {sorted(SERVICE_LIMITS)}")
+    return RateLimiter(requests_per_second=_env_limit(service, 'requests_per_second'),
+                       tokens_per_minute=_env_limit(service, 'tokens_per_minute'))
@@ -0,0 +1,182 @@
+"""
+Rule-based extraction of UW Alerts, the fast path of prompt_gpt.
+Most alerts are short "UPDATE at 8:47 p.m.: ..." or "ORIGINAL POST"
+messages whose report time, incident time, location and type can be
+read with precompiled patterns for times, streets, campus landmarks
+and incident keywords. extract_alert returns the same six-column
+table as GPT with a confidence score, and prompt_gpt only sends the
+alerts scoring below RULE_MIN_CONFIDENCE to GPT.
+"""
+import os
+import re
+import pandas as pd
+from .segmenter import DATE_PATTERN
+
+GPT_COLUMNS = ['Date', 'Report Time', 'Incident Time',
+               'Nearest Address to Incident', 'Incident Category',
+               'Incident Summary']
+# Alerts scoring at least this are not sent to GPT, above 1 disables the fast path
+RULE_MIN_CONFIDENCE = float(os.getenv('UW_ALERTS_RULE_MIN_CONFIDENCE', '0.8'))
+# Alerts longer than this are narratives better summarized by GPT
+MAX_RULE_CHARS = 600
+
+TIME = r'(\d{1,2})(?::(\d{2}))?\s*([ap])\.?\s?m\b\.?'
+TIME_PATTERN = re.compile(TIME, re.IGNORECASE)
+# "UPDATE at 8:55 p.m.:", "[UPDATE at 2:30 p.m.]", "UPDATE (6:05 p.m.):",
+# "ORIGINAL POST at 12:53 a.m. Saturday:"
+HEADER_PATTERN = re.compile(
+    r'^\s*\[?(?:updated?|original(?: post)?)\s*(?:at\s*|\(\s*)?' + TIME +
+    r'\)?\]?(?:\s+[A-Z][a-z]+day)?\s*[:.\]-]?\s*', re.IGNORECASE)
+INCIDENT_TIME_PATTERN = re.compile(
+    r'\b(?:around|about|approximately|at|shortly after|shortly before|before|after)\s+'
+    + TIME, re.IGNORECASE)
+STREET = (r'(?:(?:N|NE|E|NW)\.?\s)?(?:\d{1,3}(?:st|nd|rd|th)|[A-Z][a-z]+)\.?\s'
+          r'(?:St|Street|Ave|Avenue|Way|Blvd|Boulevard|Pl|Place|Rd|Road|Dr|Drive|'
+          r'Ln|Lane|Pkwy|Parkway)\b\.?(?:\s(?:NE|N|E|NW)\b\.?)?')
+BLOCK_PATTERN = re.compile(r'\b\d{3,5}\s(?:[Bb]lock\s)?(?:of\s)?' + STREET)
+INTERSECTION_PATTERN = re.compile(STREET + r'\s?(?:and|&|/|at)\s?' + STREET)
+STREET_PATTERN = re.compile(STREET)
+LANDMARK_PATTERN = re.compile(
+    r'\b(?:[A-Z][\w.&\'-]*\s){1,4}(?:Hall|Building|Garage|Library|Center|Stadium|'
+    r'Field|Court|Fountain|Plaza|Pavilion|Arena|Bridge|Village|Trail)\b|'
+    r'\b(?:Red Square|the Quad|the HUB|the Ave|U Village)\b')
+# First match wins, so specific categories come before general ones
+CATEGORY_PATTERNS = [(re.compile(pattern, re.IGNORECASE), category) for pattern, category in [
+    (r'\battempted (?:armed )?robbery', 'Attempted Robbery'),
+    (r'\barmed robbery|\brobbery\b.*\b(?:gun|firearm|knife|weapon)', 'Armed Robbery'),
+    (r'\brobbery|\brobbed\b', 'Robbery'),
+    (r'\bcarjack', 'Carjacking'),
+    (r'\bhome invasion', 'Home Invasion'),
+    (r'\bhomicide', 'Homicide'),
+    (r'\bshots? (?:were )?fired|\breports? of (?:gun)?shots', 'Shots Fired'),
+    (r'\bshooting|\bshot\b', 'Shooting'),
+    (r'\bstabb', 'Stabbing'),
+    (r'\bassault', 'Assault'),
+    (r'\bburglar', 'Burglary'),
+    (r'\bbomb threat', 'Bomb Threat'),
+    (r'\barmed (?:suspect|person|man|individual)', 'Armed Suspect'),
+    (r'\bsuspicious (?:person|man|individual|package)', 'Suspicious Activity'),
+    (r'\bgas leak', 'Gas Leak'),
+    (r'\b(?:smell|odor) of (?:natural )?gas|\bgas (?:smell|odor)', 'Gas Smell'),
+    (r'\bhazardous materials?|\bhazmat', 'Hazardous Materials'),
+    (r'\bwater main', 'Water Main Break'),
+    (r'\bpower outage|\bpower (?:is|has been) (?:out|restored)', 'Power Outage'),
+    (r'\bfire\b(?! (?:department|fighters?|crews?|personnel|alarm))|\bblaze', 'Fire'),
+    (r'\bcurfew', 'Curfew'),
+    (r'\bearthquake|\bshakeout', 'Earthquake Drill'),
+    (r'\bmedical emergency', 'Medical Emergency'),
+    (r'\bpolice (?:activity|investigation)', 'Police Investigation'),
+]]
+BOILERPLATE_PATTERN = re.compile(
+    r'^(?:avoid (?:the )?area|info:|more info|updates? (?:will be )?provided|'
+    r'further updates|this is a test)', re.IGNORECASE)
+# Sentence ends, except after abbreviations like "St." or "p.m."
+SENTENCE_PATTERN = re.compile(
+    r'(?<!\bSt\.)(?<!\bAve\.)(?<!\bBlvd\.)(?<!\bm\.)(?<!\b[A-Z]\.)(?<=[.!?])\s+(?=[A-Z])')
+
+
+def format_time(match):
+    """
+    Arguments:
+        match - TIME match of a time like '8:47 p.m.' or '9pm'.
+    Returns:
+        The time in the hh:mm AM/PM format GPT is asked for.
+    """
+    hour, minute, meridiem = match.group(1), match.group(2) or '00', match.group(3)
+    return f'{int(hour)}:{minute} {meridiem.upper()}M'
+
+
+def find_address(text):
+    """
+    Arguments:
+        text - alert text without its header.
+    Returns:
+        The first block address, street intersection, campus landmark
+        or street in the text, in that order of preference, or ''.
+    """
+    for pattern in [BLOCK_PATTERN, INTERSECTION_PATTERN, LANDMARK_PATTERN, STREET_PATTERN]:
+        match = pattern.search(text)
+        if match:
+            return match.group(0).strip(' .')
+    return ''
+
+
+def find_category(text):
+    """
+    Returns:
+        The incident category of the first matching keyword, or ''.
+    """
+    for pattern, category in CATEGORY_PATTERNS:
+        if pattern.search(text):
+            return category
+    return ''
+
+
+def summarize(text):
+    """
+    Returns:
+        The first sentence of the alert text that is not boilerplate
+        such as "Avoid the area".
+    """
+    for sentence in SENTENCE_PATTERN.split(text):
+        sentence = sentence.strip()
+        if sentence and not BOILERPLATE_PATTERN.match(sentence):
+            return sentence
+    return text.strip()
+
+
+def extract_alert(lines):
+    """
+    Arguments:
+        lines - alert chunk as passed to prompt_gpt, starting with the
+            date line.
+    Returns:
+        (table, confidence): a one row Pandas DataFrame with the
+        GPT_COLUMNS as strings, in the formats GPT is asked for, and
+        a score between 0 and 1. The report time and incident category
+        count 0.35 each and the location 0.3 (updates without a
+        location get 0.2, their location is filled from the incident).
+        Alerts without the alert header or longer than MAX_RULE_CHARS
+        score at most 0.5, and alerts whose date cannot be read score 0.
+    Exceptions:
+        lines must be a list whose first item is a date line.
+    """
+    if not isinstance(lines, list) or len(lines) < 1:
+        raise ValueError("lines must be a list of length at least 1")
+    date_match = DATE_PATTERN.match(lines[0])
+    if date_match is None:
+        raise ValueError("First item in lines must contain a date")
+    # Full or abbreviated month names, e.g. "January 5" or "Sept 5"
+    date = pd.to_datetime(date_match.group(0), errors='coerce')
+    if pd.isna(date):
+        return pd.DataFrame([[''] * len(GPT_COLUMNS)], columns=GPT_COLUMNS), 0.0
+    date = date.strftime('%m/%d/%Y')
+    body = [line.strip() for line in lines[1:]
+            if line.strip() and line.strip() != lines[0].strip()]
+    text = re.sub(r'–|—', '-', ' '.join(body))
+
+    confidence = 0.0
+    report_time = ''
+    header = HEADER_PATTERN.match(text)
+    if header:
+        report_time = format_time(header)
+        text = text[header.end():]
+        confidence += 0.35
+    incident_time = ''
+    for match in INCIDENT_TIME_PATTERN.finditer(text):
+        if format_time(match) != report_time:
+            incident_time = format_time(match)
+            break
+    address = find_address(text)
+    category = find_category(text)
+    if category:
+        confidence += 0.35
+    if address:
+        confidence += 0.3
+    elif header and header.group(0).strip(' [').upper().startswith('UPDATE'):
+        confidence += 0.2
+    if not header or len(text) > MAX_RULE_CHARS:
+        confidence = min(confidence, 0.5)
+    table = pd.DataFrame([[date, report_time, incident_time, address,
+                           category, summarize(text)]], columns=GPT_COLUMNS)
+    return table, round(confidence, 2)
@@ -0,0 +1,52 @@
+"""
+Streaming segmentation of the UW Alerts archive into alert chunks.
+The archive lists each day's posts under a date line, and a post is
+either one original alert or a series of "UPDATE" and "Original post"
+paragraphs. iter_alert_chunks reads any iterable of lines once, with
+precompiled patterns, and yields one chunk per alert, so the archive
+is segmented in constant memory and without calling GPT.
+"""
+from itertools import islice
+import re
+
+DATE_PATTERN = re.compile(r'^[A-z]+\s\d{1,2},\s\d{4}')
+UPDATE_PATTERN = re.compile(r'(\[)?update(d)?(:|\s+)', re.IGNORECASE)
+ORIGINAL_PATTERN = re.compile(r'(\[)?original (post)?', re.IGNORECASE)
+
+
+def iter_alert_chunks(file, file_start=0):
+    """
+    Arguments:
+        file - file object or other iterable of archive lines.
+        file_start - index of the line at which segmenting starts.
+    Returns:
+        A generator of (date_line, chunk_lines, offset) tuples, one per
+        alert in archive order: the date line the alert was posted
+        under, the lines of the alert (starting with the date line for
+        the first alert of a day) and the index of its first line.
+        [date_line] + chunk_lines is the input of generate_csv.
+    """
+    date_line = None
+    last_event = None
+    chunk_start = None
+    chunk_lines = []
+    for offset, line in islice(enumerate(file), file_start, None):
+        if DATE_PATTERN.match(line):
+            if last_event is not None:
+                yield (date_line, chunk_lines, chunk_start)
+            date_line = line
+            last_event = 'date'
+            chunk_start = offset
+            chunk_lines = []
+        # alerts before the first date line (file_start inside a day) are skipped
+        if date_line is not None and (UPDATE_PATTERN.match(line) or
+                                      ORIGINAL_PATTERN.match(line)):
+            if last_event == 'original/update':
+                yield (date_line, chunk_lines, chunk_start)
+            last_event = 'original/update'
+            chunk_start = offset
+            chunk_lines = []
+        if last_event is not None:
+            chunk_lines.append(line)
+    if last_event is not None:
+        yield (date_line, chunk_lines, chunk_start)
@@ -0,0 +1,315 @@
+"""
+Local stand-ins for the OpenAI Completion and Google Maps Geocoding
+APIs, for tests and offline benchmarks of the ingestion pipeline.
+StandInServer answers both APIs from one HTTP server on localhost in
+a background thread, with canned responses built from
+uw_alerts_gpt.csv and uw_alerts_clean.csv (the extraction table of
+every stored alert and the geocode result of every address), a
+configurable latency, stream pace and error rate. openai.api_base and
+the GOOGLE_MAPS_BASE_URL read by make_gmaps_client point the clients
+at it.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import ast
+import json
+import os
+import random
+import re
+import threading
+import time
+import pandas as pd
+from .geocode_cache import ADDRESS_SUFFIX, normalize_address
+from .rule_extractor import GPT_COLUMNS, extract_alert
+
+DEFAULT_GPT_PATH = os.path.join(os.path.dirname(__file__), '../../data/uw_alerts_gpt.csv')
+DEFAULT_CLEAN_PATH = os.path.join(os.path.dirname(__file__), '../../data/uw_alerts_clean.csv')
+# Characters per streamed completion event and per completion token
+STREAM_PIECE_CHARS = 16
+CHARS_PER_TOKEN = 4
+
+# The alert of a prompt_gpt prompt and the tagged alerts of a batch prompt
+SINGLE_ALERT_PATTERN = re.compile(r'Text: """\n(.*?)"""', re.DOTALL)
+BATCH_ALERT_PATTERN = re.compile(r'Alert (A\d+): """\n(.*?)"""', re.DOTALL)
+
+
+def alert_key(text):
+    """
+    Returns:
+        The alert text with dashes and whitespace normalized, the key
+        of the canned completions.
+    """
+    return ' '.join(re.sub(r'–|—', '-', str(text)).split())
+
+
+def load_completions(gpt_path=DEFAULT_GPT_PATH, clean_path=DEFAULT_CLEAN_PATH):
+    """
+    Arguments:
+        gpt_path - path to uw_alerts_gpt.csv.
+        clean_path - optional path to uw_alerts_clean.csv, for the
+            alerts newer than the archive. Its parsed dates and times
+            are written back in the formats GPT is asked for.
+    Returns:
+        A dictionary of alert_key of each Incident Alert to the rows
+        (lists of GPT_COLUMNS values) GPT extracted from it.
+    """
+    alert_data = [pd.read_csv(gpt_path, index_col=False, dtype=str).fillna('')]
+    if clean_path is not None:
+        clean_data = pd.read_csv(clean_path, index_col=False, dtype=str)
+        clean_data['Date'] = pd.to_datetime(clean_data['Date'], format='%m/%d/%y',
+                                            errors='coerce').dt.strftime('%m/%d/%Y')
+        for column in ['Report Time', 'Incident Time']:
+            clean_data[column] = pd.to_datetime(clean_data[column], format='%H:%M:%S',
+                                                errors='coerce').dt.strftime('%I:%M %p')
+        alert_data.append(clean_data.fillna(''))
+    completions = {}
+    for data in reversed(alert_data):
+        for _, alert_rows in data.groupby('Alert ID', sort=False):
+            key = alert_key(alert_rows['Incident Alert'].values[0])
+            completions[key] = alert_rows[GPT_COLUMNS].values.tolist()
+    return completions
+
+
+def load_geocodes(clean_path=DEFAULT_CLEAN_PATH):
+    """
+    Arguments:
+        clean_path - path to uw_alerts_clean.csv.
+    Returns:
+        A dictionary of normalized address to its Google Maps geocode
+        results. Alerts without an address were geocoded as the
+        University District, their result is under ''.
+    """
+    clean_data = pd.read_csv(clean_path, index_col=False, dtype=str).dropna(
+        subset=['Google Address', 'geometry'])
+    clean_data['Nearest Address to Incident'] = clean_data[
+        'Nearest Address to Incident'].fillna('')
+    geocodes = {}
+    for address, google_address, geometry in clean_data[
+            ['Nearest Address to Incident', 'Google Address', 'geometry']].values:
+        geocodes[normalize_address(address)] = [
+            {'formatted_address': google_address, 'geometry': ast.literal_eval(geometry)}]
+    return geocodes
+
+
+def format_rows(rows, alert=None):
+    """
+    Returns:
+        Markdown table rows, with the Alert column first when `alert`
+        is a batch delimiter id.
+    """
+    prefix = f'| {alert} ' if alert is not None else ''
+    return ''.join(prefix + '| ' + ' | '.join(row) + ' |\n' for row in rows)
+
+
+class StandInServer:
+    """
+    Stand-in OpenAI Completion and Google Maps Geocoding server.
+
+    Arguments:
+        completions - canned rows of load_completions. Alerts without
+            canned rows get the row rule_extractor reads from them, or
+            one row of 'Unknown' values.
+        geocodes - canned results of load_geocodes. Other addresses
+            get the result of '' as Google places queries it cannot
+            find in the University District, or ZERO_RESULTS.
+        latency - seconds before each response starts.
+        stream_interval - seconds between the events of a streamed
+            completion.
+        error_rate - fraction of requests answered with HTTP 500.
+        seed - seed of the error draws.
+    Attributes:
+        url - base url of the server once started, e.g. for
+            googlemaps.Client(base_url=...).
+        openai_api_base - url + '/v1', for openai.api_base.
+        stats - number of completion and geocode requests and errors.
+    """
+    # pylint: disable=too-many-arguments,too-many-instance-attributes
+    def __init__(self, completions, geocodes, latency=0.0, stream_interval=0.0,
+                 error_rate=0.0, seed=0):
+        if not isinstance(latency, (int, float)) or latency < 0:
+            raise ValueError("latency must be a number 0 or greater")
+        if not isinstance(stream_interval, (int, float)) or stream_interval < 0:
+            raise ValueError("stream_interval must be a number 0 or greater")
+        if not isinstance(error_rate, (int, float)) or not 0 <= error_rate <= 1:
+            raise ValueError("error_rate must be between 0 and 1")
+        self.completions = completions
+        self.geocodes = geocodes
+        self.latency = latency
+        self.stream_interval = stream_interval
+        self.error_rate = error_rate
+        self.stats = {'completions': 0, 'geocodes': 0, 'errors': 0}
+        self.url = None
+        self.openai_api_base = None
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        """
+        Starts serving on a free localhost port.
+        Returns:
+            The server.
+        """
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        self._server.daemon_threads = True
+        self._server.standin = self
+        self.url = f'http://127.0.0.1:{self._server.server_address[1]}'
+        self.openai_api_base = self.url + '/v1'
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops the server.
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def count(self, name):
+        """
+        Counts a request of kind `name`.
+        Returns:
+            True if the request should fail with an HTTP 500.
+        """
+        with self._lock:
+            self.stats[name] += 1
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.stats['errors'] += 1
+        return failed
+
+    def completion(self, prompt):
+        """
+        Returns:
+            The canned markdown table completion of a prompt_gpt or
+            batch_prompt prompt.
+        """
+        tagged = BATCH_ALERT_PATTERN.findall(prompt)
+        if tagged:
+            header = '| Alert | ' + ' | '.join(GPT_COLUMNS) + ' |\n' + '|---' * 7 + '|\n'
+            return '\n' + header + ''.join(format_rows(self.alert_rows(text), alert)
+                                           for alert, text in tagged)
+        single = SINGLE_ALERT_PATTERN.search(prompt)
+        header = '| ' + ' | '.join(GPT_COLUMNS) + ' |\n' + '|---' * 6 + '|\n'
+        return '\n' + header + format_rows(self.alert_rows(single.group(1) if single else ''))
+
+    def alert_rows(self, alert_chunk):
+        """
+        Returns:
+            The canned rows of an alert chunk (date line and alert).
+        """
+        body = alert_chunk.split('\n', 1)[1] if '\n' in alert_chunk else alert_chunk
+        rows = self.completions.get(alert_key(body))
+        if rows is None:
+            try:
+                rows = extract_alert(alert_chunk.split('\n'))[0].values.tolist()
+            except ValueError:
+                rows = [['Unknown'] * len(GPT_COLUMNS)]
+        return rows
+
+    def geocode(self, address):
+        """
+        Returns:
+            The Geocoding API response body of an address query.
+        """
+        if address.endswith(ADDRESS_SUFFIX):
+            address = address[:-len(ADDRESS_SUFFIX)]
+        results = self.geocodes.get(normalize_address(address),
+                                    self.geocodes.get('', []))
+        return {'status': 'OK' if results else 'ZERO_RESULTS', 'results': results}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Request handler of StandInServer: POST .../completions and
+    GET /maps/api/geocode/json.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """Requests are not logged"""
+
+    def send_json(self, status, body):
+        """Sends a JSON response"""
+        content = json.dumps(body).encode('UTF-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Answers geocode requests"""
+        standin = self.server.standin
+        url = urlparse(self.path)
+        if url.path != '/maps/api/geocode/json':
+            self.send_json(404, {'error': 'not found'})
+            return
+        time.sleep(standin.latency)
+        if standin.count('geocodes'):
+            self.send_json(500, {'status': 'UNKNOWN_ERROR', 'results': []})
+            return
+        address = parse_qs(url.query).get('address', [''])[0]
+        self.send_json(200, standin.geocode(address))
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """Answers completion requests, streamed or not"""
+        standin = self.server.standin
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        if not urlparse(self.path).path.endswith('/completions'):
+            self.send_json(404, {'error': {'message': 'not found'}})
+            return
+        time.sleep(standin.latency)
+        if standin.count('completions'):
+            self.send_json(500, {'error': {'message': 'stand-in error', 'type': 'server_error'}})
+            return
+        completion = standin.completion(request.get('prompt', ''))
+        finish_reason = 'stop'
+        max_chars = int(request.get('max_tokens', 16)) * CHARS_PER_TOKEN
+        if len(completion) > max_chars:
+            completion, finish_reason = completion[:max_chars], 'length'
+        if not request.get('stream'):
+            self.send_json(200, {'object': 'text_completion', 'model': request.get('model'),
+                                 'choices': [{'text': completion, 'index': 0,
+                                              'finish_reason': finish_reason}]})
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        pieces = [completion[start:start + STREAM_PIECE_CHARS]
+                  for start in range(0, len(completion), STREAM_PIECE_CHARS)]
+        try:
+            for index, piece in enumerate(pieces):
+                last = index == len(pieces) - 1
+                event = {'object': 'text_completion', 'choices': [
+                    {'text': piece, 'index': 0, 'finish_reason': finish_reason if last else None}]}
+                self.wfile.write(f'data: {json.dumps(event)}\n\n'.encode('UTF-8'))
+                self.wfile.flush()
+                time.sleep(standin.stream_interval)
+            self.wfile.write(b'data: [DONE]\n\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # the client stopped reading once the table closed
+            pass
+
+
+def make_standin_server(gpt_path=DEFAULT_GPT_PATH, clean_path=DEFAULT_CLEAN_PATH, **kwargs):
+    """
+    Returns:
+        A StandInServer (not started) with the canned responses of
+        uw_alerts_gpt.csv and uw_alerts_clean.csv and the given
+        latency, stream_interval, error_rate and seed.
+    """
+    return StandInServer(load_completions(gpt_path, clean_path), load_geocodes(clean_path),
+                         **kwargs)
@@ -0,0 +1,271 @@
+"""
+Offline geocoder for the street addresses of UW Alerts.
+Indexes the intersections of data/SeattleGISData/udistrict_streets.geojson
+(STNAME_ORD, XSTRLO, XSTRHI and the segment end points) and resolves
+intersections ("NE 45th St & University Way NE"), block addresses
+("4300 block of University Way NE", interpolated between the numbered
+cross streets) and "X between A and B" with dictionary lookups. Street
+names are normalized and fuzzy matched, so "U Way", "NE 42 St." or
+"Roosevelt Ave NE" still resolve. Addresses it cannot resolve
+(landmarks, buildings) are left to the Google Maps geocoder.
+"""
+from functools import lru_cache
+import difflib
+import json
+import os
+import re
+
+DEFAULT_STREETS_PATH = os.path.join(os.path.dirname(__file__),
+                                    '../../data/SeattleGISData/udistrict_streets.geojson')
+
+STREET_ABBREVIATIONS = {
+    'STREET': 'ST', 'AVENUE': 'AVE', 'AV': 'AVE', 'BOULEVARD': 'BLVD',
+    'BV': 'BLVD', 'PARKWAY': 'PKWY', 'PY': 'PKWY', 'PLACE': 'PL',
+    'ROAD': 'RD', 'DRIVE': 'DR', 'LANE': 'LN', 'BRIDGE': 'BR',
+    'NORTHEAST': 'NE', 'EAST': 'E', 'NORTH': 'N',
+}
+# Direction of travel of divided roads ("17TH NB AVE NE")
+TRAVEL_DIRECTIONS = {'NB', 'SB', 'EB', 'WB'}
+STREET_ALIASES = {'U WAY': 'UNIVERSITY WAY', 'THE AVE': 'UNIVERSITY WAY NE'}
+ORDINAL_SUFFIXES = {1: 'ST', 2: 'ND', 3: 'RD'}
+
+# Parts of an address query
+INTERSECTION_SEPARATOR = re.compile(r'\s*(?:&|/|\bAND\b|\bAT\b)\s*')
+BETWEEN_PATTERN = re.compile(r'^(.+?)\s+BETWEEN\s+(.+?)\s*(?:&|\bAND\b)\s*(.+)$')
+BLOCK_PATTERN = re.compile(r'^(\d{3,5})\s+(BLOCK\s+)?(?:OF\s+)?(.+)$')
+QUERY_PREFIX = re.compile(r'^(?:NEAR|CORNER OF|THE INTERSECTION OF|INTERSECTION OF)\s+')
+NUMBERED_AVENUE = re.compile(r'^(\d+)(?:ST|ND|RD|TH) AVE\b')
+NUMBERED_STREET = re.compile(r'^NE (\d+)(?:ST|ND|RD|TH) ST$')
+
+
+def ordinal(number):
+    """
+    Returns:
+        The street ordinal of a number, e.g. 42 -> '42ND'.
+    """
+    number = int(number)
+    if 10 <= number % 100 <= 20:
+        return f'{number}TH'
+    return f'{number}{ORDINAL_SUFFIXES.get(number % 10, "TH")}'
+
+
+def normalize_street(name):
+    """
+    Arguments:
+        name - street name as written in an alert or the street data.
+    Returns:
+        The name in the STNAME_ORD format of the street data: upper
+        case, abbreviated street types and ordinal numbers.
+    """
+    name = re.sub(r"[.,;:()']", ' ', str(name).upper())
+    words = []
+    for word in name.split():
+        if word in TRAVEL_DIRECTIONS:
+            continue
+        if word.isdigit():
+            word = ordinal(word)
+        words.append(STREET_ABBREVIATIONS.get(word, word))
+    name = ' '.join(words)
+    for alias, street in STREET_ALIASES.items():
+        if name == alias or name.startswith(alias + ' '):
+            name = street + name[len(alias):]
+    return name
+
+
+def format_street(name):
+    """
+    Returns:
+        A STNAME_ORD name in the case Google Maps uses,
+        e.g. 'NE 45TH ST' -> 'NE 45th St'.
+    """
+    words = []
+    for word in name.split():
+        if word in {'NE', 'NW', 'SE', 'SW', 'N', 'E', 'S', 'W'}:
+            words.append(word)
+        elif word[0].isdigit():
+            words.append(word.lower())
+        else:
+            words.append(word.capitalize())
+    return ' '.join(words)
+
+
+def make_result(address, lat, lng, location_type):
+    """
+    Returns:
+        A geocode result in the format of googlemaps.Client.geocode.
+    """
+    return [{'formatted_address': f'{address}, Seattle, WA, USA',
+             'geometry': {'location': {'lat': lat, 'lng': lng},
+                          'location_type': location_type},
+             'source': 'udistrict_streets'}]
+
+
+class StreetGeocoder:
+    """
+    Intersection and block geocoder of the U-District streets.
+
+    Arguments:
+        features - GeoJSON LineString features with the STNAME_ORD,
+            XSTRLO and XSTRHI properties, whose first and last points
+            are the XSTRLO and XSTRHI intersections.
+    """
+    def __init__(self, features):
+        points = {}
+        for feature in features:
+            properties = feature['properties']
+            street = normalize_street(properties['STNAME_ORD'] or '')
+            coordinates = feature['geometry']['coordinates']
+            for cross_street, (lng, lat) in [(properties['XSTRLO'], coordinates[0]),
+                                             (properties['XSTRHI'], coordinates[-1])]:
+                if not street or not cross_street:
+                    continue
+                key = frozenset([street, normalize_street(cross_street)])
+                if len(key) == 2:
+                    points.setdefault(key, []).append((lat, lng))
+        # Divided roads have one point per direction, keep their center
+        self.intersections = {
+            key: (sum(lat for lat, _ in values) / len(values),
+                  sum(lng for _, lng in values) / len(values))
+            for key, values in points.items()}
+        self.cross_streets = {}
+        for key, point in self.intersections.items():
+            for street in key:
+                (cross_street,) = key - {street}
+                self.cross_streets.setdefault(street, {})[cross_street] = point
+        self.streets = sorted(self.cross_streets)
+
+    def match_street(self, name):
+        """
+        Arguments:
+            name - street name from an alert.
+        Returns:
+            The indexed streets the name may refer to, best first.
+        """
+        name = normalize_street(name)
+        if name in self.cross_streets:
+            return [name]
+        variants = [name + ' NE', name + ' ST', 'NE ' + name + ' ST', name + ' AVE NE']
+        if name.startswith('NE ') and not name[3:4].isdigit():
+            variants.append(name[3:] + ' NE')
+        matches = [variant for variant in variants if variant in self.cross_streets]
+        if matches:
+            return matches
+        # Only fuzzy match names with the same numbers, 'NE 39TH ST' is not 'NE 49TH ST'
+        numbers = re.findall(r'\d+', name)
+        candidates = [street for street in self.streets
+                      if re.findall(r'\d+', street) == numbers]
+        return difflib.get_close_matches(name, candidates, n=3, cutoff=0.75)
+
+    def intersection(self, street_a, street_b):
+        """
+        Returns:
+            ((lat, lng), street, cross street) of the intersection of
+            two street names from an alert, or None.
+        """
+        for match_a in self.match_street(street_a):
+            for match_b in self.match_street(street_b):
+                point = self.intersections.get(frozenset([match_a, match_b]))
+                if point is not None:
+                    return point, match_a, match_b
+        return None
+
+    def block(self, street, house_number):
+        """
+        Returns:
+            ((lat, lng), street) of a house number on a street, linearly
+            interpolated between the numbered cross streets around it
+            (the 4300 block of an avenue is at NE 43rd St, the 1400
+            block of a street at 14th Ave NE), or None.
+        """
+        for match in self.match_street(street):
+            pattern = NUMBERED_AVENUE if match.endswith(' ST') else NUMBERED_STREET
+            anchors = sorted(
+                (int(numbered.group(1)), point)
+                for cross_street, point in self.cross_streets[match].items()
+                for numbered in [pattern.match(cross_street)] if numbered)
+            target = house_number / 100
+            for (low, low_point), (high, high_point) in zip(anchors, anchors[1:]):
+                if low <= target <= high:
+                    weight = (target - low) / (high - low) if high > low else 0.0
+                    return tuple(low_value + weight * (high_value - low_value)
+                                 for low_value, high_value
+                                 in zip(low_point, high_point)), match
+        return None
+
+    def geocode_between(self, street, cross_a, cross_b):
+        """
+        Returns:
+            A geocode result at the middle of `street` between two
+            cross streets, or None.
+        """
+        found_a = self.intersection(street, cross_a)
+        found_b = self.intersection(street, cross_b)
+        if found_a is None or found_b is None:
+            return None
+        (lat_a, lng_a), match, _ = found_a
+        (lat_b, lng_b), _, _ = found_b
+        return make_result(format_street(match), (lat_a + lat_b) / 2,
+                           (lng_a + lng_b) / 2, 'GEOMETRIC_CENTER')
+
+    def geocode_block(self, street, house_number, whole_block=False):
+        """
+        Returns:
+            A geocode result of a house number, or of the middle of
+            its block when whole_block is True, or None.
+        """
+        found = self.block(street, house_number + 50 if whole_block else house_number)
+        if found is None:
+            return None
+        (lat, lng), match = found
+        return make_result(f'{house_number} {format_street(match)}',
+                           lat, lng, 'RANGE_INTERPOLATED')
+
+    def geocode_intersection(self, street_a, street_b):
+        """
+        Returns:
+            A geocode result of the intersection of two streets, or None.
+        """
+        found = self.intersection(street_a, street_b)
+        if found is None:
+            return None
+        (lat, lng), match_a, match_b = found
+        return make_result(f'{format_street(match_a)} & {format_street(match_b)}',
+                           lat, lng, 'GEOMETRIC_CENTER')
+
+    @lru_cache(maxsize=4096)
+    def geocode(self, address):
+        """
+        Arguments:
+            address - address extracted from an alert.
+        Returns:
+            A googlemaps.Client.geocode style result for intersections,
+            block addresses and "X between A and B", or None when the
+            address is not one of those (e.g. a building name).
+        """
+        query = QUERY_PREFIX.sub('', ' '.join(str(address).upper().split()))
+        between = BETWEEN_PATTERN.match(query)
+        if between:
+            return self.geocode_between(*between.groups())
+        block = BLOCK_PATTERN.match(query)
+        if block:
+            return self.geocode_block(block.group(3), int(block.group(1)),
+                                      whole_block=bool(block.group(2)))
+        streets = INTERSECTION_SEPARATOR.split(query)
+        if len(streets) == 2:
+            return self.geocode_intersection(*streets)
+        return None
+
+
+@lru_cache(maxsize=None)
+def get_street_geocoder():
+    """
+    Returns:
+        The process-wide StreetGeocoder of UW_ALERTS_STREETS_GEOJSON
+        (default data/SeattleGISData/udistrict_streets.geojson), or None
+        if UW_ALERTS_STREETS_GEOJSON is set to an empty string.
+    """
+    path = os.getenv('UW_ALERTS_STREETS_GEOJSON', DEFAULT_STREETS_PATH)
+    if not path:
+        return None
+    with open(path, encoding='UTF-8') as streets_file:
+        return StreetGeocoder(json.load(streets_file)['features'])
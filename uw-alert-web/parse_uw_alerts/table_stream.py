@@ -0,0 +1,68 @@
+"""
+Incremental reading of the markdown tables GPT streams back.
+Completions are requested with stream=True and read event by event:
+every table row is handed on as soon as its line is complete, and
+reading stops at the first line after the table, so text GPT adds
+after the table is never waited for. max_tokens is sized from the
+prompt instead of filling the rest of the model context.
+"""
+
+# Completion tokens of the table header and separator, plus a margin
+COMPLETION_BASE_TOKENS = 128
+# Completion tokens allowed per prompt token (rows summarize the alert)
+COMPLETION_TOKENS_PER_PROMPT_TOKEN = 0.5
+
+
+def completion_max_tokens(n_tokens, context_tokens):
+    """
+    Arguments:
+        n_tokens - tokens of the prompt.
+        context_tokens - context size of the model.
+    Returns:
+        max_tokens for the completion of a one alert prompt: the table
+        header and about half the prompt size, within the context.
+        The extraction tables of the 2018-2022 archive all fit.
+    """
+    return max(1, min(context_tokens - n_tokens,
+                      COMPLETION_BASE_TOKENS + int(n_tokens * COMPLETION_TOKENS_PER_PROMPT_TOKEN)))
+
+
+def read_table_stream(events, on_row=None):
+    """
+    Arguments:
+        events - streamed completion events, dictionaries with the
+            'text' and 'finish_reason' of choices[0].
+        on_row - optional function called with each table line
+            (header, separator and rows) as soon as it is complete.
+    Returns:
+        (completion, complete): the completion text up to the end of
+        the table, and whether the table ended, either followed by
+        another line or by the end of a completion that stopped by
+        itself. complete is False when the completion was cut off by
+        max_tokens, so its last row may be partial.
+    """
+    text = ''
+    lines = []
+    in_table = False
+    finish_reason = None
+    for event in events:
+        choice = event['choices'][0]
+        text += choice['text'] or ''
+        finish_reason = choice.get('finish_reason') or finish_reason
+        *complete_lines, text = text.split('\n')
+        for line in complete_lines:
+            is_row = line.strip().startswith('|')
+            if in_table and not is_row:
+                # The table closed, stop reading the stream
+                if hasattr(events, 'close'):
+                    events.close()
+                return '\n'.join(lines) + '\n', True
+            in_table = in_table or is_row
+            lines.append(line)
+            if is_row and on_row is not None:
+                on_row(line)
+    if text:
+        lines.append(text)
+        if text.strip().startswith('|') and on_row is not None:
+            on_row(text)
+    return '\n'.join(lines), finish_reason != 'length'
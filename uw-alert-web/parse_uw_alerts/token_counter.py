@@ -0,0 +1,172 @@
+"""
+Counts GPT-2 tokens of prompts without importing transformers.
+Uses the GPT-2 byte pair merges (merges.txt) when a copy is found,
+e.g. in the Hugging Face cache, and otherwise a cheap approximation
+that overestimates, so prompts never exceed the model context.
+"""
+from functools import lru_cache
+import glob
+import math
+import os
+import re
+try:
+    import regex
+except ImportError:  # pragma: no cover - regex ships with transformers
+    regex = None
+
+# Pre-tokenization pattern of the GPT-2 tokenizer
+if regex is not None:
+    GPT2_PATTERN = regex.compile(
+        r"""'s|'t|'re|'ve|'m|'ll|'d| ?\p{L}+| ?\p{N}+| ?[^\s\p{L}\p{N}]+|\s+(?!\S)|\s+""")
+else:
+    GPT2_PATTERN = re.compile(
+        r"""'s|'t|'re|'ve|'m|'ll|'d| ?[^\W\d_]+| ?\d+| ?[^\s\w]+| ?_+|\s+(?!\S)|\s+""")
+
+# The approximation assumes at most this many characters per token.
+# English text averages about 4 characters per GPT-2 token.
+APPROX_CHARS_PER_TOKEN = 3
+
+
+@lru_cache(maxsize=1)
+def bytes_to_unicode():
+    """
+    Returns:
+        The GPT-2 mapping of bytes to printable unicode characters,
+        which merges.txt is written in.
+    """
+    byte_values = list(range(ord('!'), ord('~') + 1)) + \
+        list(range(ord('\xa1'), ord('\xac') + 1)) + list(range(ord('\xae'), ord('\xff') + 1))
+    characters = byte_values[:]
+    n_extra = 0
+    for byte in range(256):
+        if byte not in byte_values:
+            byte_values.append(byte)
+            characters.append(256 + n_extra)
+            n_extra += 1
+    return dict(zip(byte_values, map(chr, characters)))
+
+
+class GPT2TokenCounter:
+    """
+    Counts GPT-2 tokens with the byte pair encoding of merges.txt.
+    Every word piece left after merging is a vocabulary token, so
+    the vocabulary itself is not needed to count.
+
+    Arguments:
+        merges_path - path to the GPT-2 merges.txt file.
+        max_cached_words - number of word counts kept in memory.
+    """
+    def __init__(self, merges_path, max_cached_words=65536):
+        if not isinstance(merges_path, str) or not os.path.isfile(merges_path):
+            raise ValueError("merges_path must be the path of a merges.txt file")
+        with open(merges_path, encoding='utf8') as merges_file:
+            merges = [tuple(line.split()) for line in merges_file
+                      if line.strip() and not line.startswith('#version')]
+        self.ranks = {merge: rank for rank, merge in enumerate(merges)}
+        self.byte_encoder = bytes_to_unicode()
+        self.max_cached_words = max_cached_words
+        self._word_counts = {}
+
+    def count_word(self, word):
+        """
+        Arguments:
+            word - one pre-tokenized word piece.
+        Returns:
+            The number of tokens of the word.
+        """
+        n_tokens = self._word_counts.get(word)
+        if n_tokens is not None:
+            return n_tokens
+        pieces = [self.byte_encoder[byte] for byte in word.encode('utf8')]
+        while len(pieces) > 1:
+            pairs = set(zip(pieces, pieces[1:]))
+            bigram = min(pairs, key=lambda pair: self.ranks.get(pair, math.inf))
+            if bigram not in self.ranks:
+                break
+            merged = []
+            i = 0
+            while i < len(pieces):
+                if i < len(pieces) - 1 and (pieces[i], pieces[i + 1]) == bigram:
+                    merged.append(pieces[i] + pieces[i + 1])
+                    i += 2
+                else:
+                    merged.append(pieces[i])
+                    i += 1
+            pieces = merged
+        n_tokens = len(pieces)
+        if len(self._word_counts) < self.max_cached_words:
+            self._word_counts[word] = n_tokens
+        return n_tokens
+
+    def count(self, text):
+        """
+        Arguments:
+            text - string to count.
+        Returns:
+            The number of GPT-2 tokens of text.
+        """
+        return sum(self.count_word(word) for word in GPT2_PATTERN.findall(text))
+
+
+def find_gpt2_merges():
+    """
+    Returns:
+        The path of a GPT-2 merges.txt file from the GPT2_TOKENIZER_DIR
+        environment variable or the Hugging Face cache, or None.
+    """
+    candidates = []
+    if os.getenv('GPT2_TOKENIZER_DIR'):
+        candidates.append(os.path.join(os.getenv('GPT2_TOKENIZER_DIR'), 'merges.txt'))
+    hf_home = os.getenv('HF_HOME', os.path.join(os.path.expanduser('~'), '.cache', 'huggingface'))
+    candidates += sorted(glob.glob(
+        os.path.join(hf_home, 'hub', 'models--gpt2', 'snapshots', '*', 'merges.txt')))
+    for candidate in candidates:
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+@lru_cache(maxsize=1)
+def load_token_counter():
+    """
+    Returns:
+        The process-wide GPT2TokenCounter, or None if no merges.txt
+        is available.
+    """
+    merges_path = find_gpt2_merges()
+    if merges_path is None:
+        return None
+    return GPT2TokenCounter(merges_path)
+
+
+def approximate_token_count(text):
+    """
+    Arguments:
+        text - string to count.
+    Returns:
+        An estimate of the number of GPT-2 tokens of text that is
+        at least the number of pre-tokenized words and assumes
+        APPROX_CHARS_PER_TOKEN characters per token.
+    """
+    if not isinstance(text, str):
+        raise ValueError("text must be a string")
+    return max(len(GPT2_PATTERN.findall(text)),
+               math.ceil(len(text) / APPROX_CHARS_PER_TOKEN))
+
+
+def count_tokens(text):
+    """
+    Arguments:
+        text - string to count.
+    Returns:
+        The number of GPT-2 tokens of text, approximated when
+        no merges.txt is available.
+    Exceptions:
+        text must be a string.
+    """
+    if not isinstance(text, str):
+        raise ValueError("text must be a string")
+    counter = load_token_counter()
+    if counter is None:
+        return approximate_token_count(text)
+    return counter.count(text)
@@ -0,0 +1,167 @@
+"""
+Tests for alert_store.py
+"""
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from multiprocessing import Pool
+import pandas as pd
+#pylint: disable=import-error
+from alert_store.alert_store import AlertStore, parse_alert_frame
+
+class TestParseAlertFrame(unittest.TestCase):
+    """
+    Test methods for parse_alert_frame function.
+    """
+    def test_typed_columns(self):
+        """Test for parsed geometry, coordinates and datetimes"""
+        alerts_df = pd.DataFrame({
+            'Date': ['3/9/23', '3/8/23'],
+            'Report Time': ['20:47:00', None],
+            'geometry': ["{'location': {'lat': 47.65, 'lng': -122.30}}",
+                         "{'location': {'lat': 47.66, 'lng': -122.31}}"]
+        })
+        parsed = parse_alert_frame(alerts_df)
+        self.assertEqual(parsed['geometry'].iloc[0]['location']['lat'], 47.65)
+        self.assertEqual(parsed['lat'].to_list(), [47.65, 47.66])
+        self.assertEqual(parsed['lng'].to_list(), [-122.30, -122.31])
+        self.assertEqual(parsed['report_datetime'].iloc[0],
+                         pd.Timestamp('2023-03-09 20:47:00'))
+        self.assertTrue(pd.isna(parsed['report_datetime'].iloc[1]))
+        self.assertEqual(parsed['date'].iloc[1], pd.Timestamp('2023-03-08'))
+        # Input is not modified
+        self.assertIsInstance(alerts_df['geometry'].iloc[0], str)
+
+    def test_dataframe_input(self):
+        """Test for requiring a Pandas DataFrame"""
+        with self.assertRaises(TypeError):
+            parse_alert_frame([])
+
+class TestAlertStore(unittest.TestCase):
+    """
+    Test methods for AlertStore class.
+    """
+    def setUp(self):
+        dirname = os.path.dirname(__file__)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.tmp_dir, 'uw_alerts_clean.csv')
+        shutil.copy(os.path.join(dirname, "../../data/uw_alerts_clean_TEST.csv"),
+                    self.file_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_filepath_csv(self):
+        """Test for requiring a .csv filepath"""
+        with self.assertRaises(ValueError):
+            AlertStore('uw_alerts_clean.txt')
+        with self.assertRaises(ValueError):
+            AlertStore(1)
+
+    def test_loads_once(self):
+        """Test that an unchanged file is not parsed again"""
+        store = AlertStore(self.file_path)
+        first = store.get_alerts()
+        self.assertIs(store.get_alerts(), first)
+        self.assertIsInstance(first['geometry'].iloc[0], dict)
+
+    def test_reloads_on_change(self):
+        """Test that writing the csv publishes a new version"""
+        store = AlertStore(self.file_path)
+        first = store.get_alerts()
+        version = store.version
+        raw_alerts = store.get_raw_alerts()
+        self.assertEqual(raw_alerts.columns.to_list(), store.columns)
+        pd.concat([raw_alerts, raw_alerts], ignore_index=True).to_csv(
+            self.file_path, index=False)
+        second = store.get_alerts()
+        self.assertNotEqual(store.version, version)
+        self.assertEqual(len(second), 2 * len(first))
+
+def append_alert(args):
+    """Appends one alert from a separate process"""
+    file_path, alert_id = args
+    store = AlertStore(file_path, compact_bytes=2000)
+    new_alert = store.get_raw_alerts().head(1)
+    new_alert['Alert ID'] = alert_id
+    store.append_alerts(new_alert)
+
+class TestAlertStoreJournal(unittest.TestCase):
+    """
+    Test methods for the AlertStore journal and compaction.
+    """
+    def setUp(self):
+        dirname = os.path.dirname(__file__)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.tmp_dir, 'uw_alerts_clean.csv')
+        shutil.copy(os.path.join(dirname, "../../data/uw_alerts_clean_TEST.csv"),
+                    self.file_path)
+        self.store = AlertStore(self.file_path)
+        self.new_alert = self.store.get_raw_alerts().head(1)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_append_does_not_rewrite_csv(self):
+        """Test that appended alerts go to the journal, newest first"""
+        csv_version = os.stat(self.file_path).st_mtime_ns
+        n_alerts = len(self.store.get_alerts())
+        for alert_id in [1000, 1001]:
+            self.new_alert['Alert ID'] = alert_id
+            self.store.append_alerts(self.new_alert)
+        self.assertEqual(os.stat(self.file_path).st_mtime_ns, csv_version)
+        alerts = AlertStore(self.file_path).get_alerts()
+        self.assertEqual(len(alerts), n_alerts + 2)
+        self.assertEqual(alerts['Alert ID'].to_list()[:2], [1001, 1000])
+        self.assertIsInstance(alerts['geometry'].iloc[0], dict)
+        self.assertEqual(len(self.store.get_alerts()), n_alerts + 2)
+
+    def test_compact(self):
+        """Test that compaction folds the journal into the csv"""
+        self.new_alert['Alert ID'] = 1000
+        self.store.append_alerts(self.new_alert)
+        expected = self.store.get_raw_alerts()
+        self.store.compact()
+        self.assertEqual(os.path.getsize(self.store.journal_path), 0)
+        compacted = pd.read_csv(self.file_path)
+        self.assertEqual(compacted['Alert ID'].to_list(), expected['Alert ID'].to_list())
+        self.assertEqual(len(AlertStore(self.file_path).get_alerts()), len(expected))
+
+    def test_compaction_marker(self):
+        """
+        Test that journal batches already in a renamed snapshot
+        are skipped if compaction stopped before the truncate
+        """
+        self.new_alert['Alert ID'] = 1000
+        self.store.append_alerts(self.new_alert)
+        expected = self.store.get_raw_alerts()
+        expected.to_csv(self.file_path + '.new', index=False)
+        with open(self.store.journal_path, 'a', encoding='utf8') as journal:
+            journal.write(json.dumps(
+                {'compacted_inode': os.stat(self.file_path + '.new').st_ino}) + '\n')
+        os.replace(self.file_path + '.new', self.file_path)
+        self.assertEqual(len(AlertStore(self.file_path).get_alerts()), len(expected))
+
+    def test_torn_journal_line(self):
+        """Test that an incomplete last journal line is ignored"""
+        n_alerts = len(self.store.get_alerts())
+        with open(self.store.journal_path, 'a', encoding='utf8') as journal:
+            journal.write('{"rows": [{"Alert ID"')
+        self.assertEqual(len(AlertStore(self.file_path).get_alerts()), n_alerts)
+        self.store.append_alerts(self.new_alert)
+        self.assertEqual(len(AlertStore(self.file_path).get_alerts()), n_alerts + 1)
+
+    def test_concurrent_appends(self):
+        """Test that appends from several processes are not lost"""
+        n_alerts = len(self.store.get_alerts())
+        with Pool(4) as pool:
+            pool.map(append_alert, [(self.file_path, 1000 + i) for i in range(20)])
+        alerts = AlertStore(self.file_path).get_alerts()
+        self.assertEqual(len(alerts), n_alerts + 20)
+        self.assertEqual(set(alerts['Alert ID'].to_list()[:20]),
+                         set(range(1000, 1020)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+"""
+Tests for backfill.py
+"""
+import os
+import re
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+import pandas as pd
+import pandas.testing as pdt
+#pylint: disable=import-error
+from parse_uw_alerts.parse_uw_alerts import parse_txt_data
+from parse_uw_alerts.backfill import assign_ids, backfill_txt_data, ChunkCheckpoint
+
+def fake_prompt_gpt(lines, return_alert_type=False):
+    """
+    Stand-in for prompt_gpt returning a table derived from the chunk:
+    one or two rows and the alert type prompt_gpt would report.
+    """
+    alert_type = 'Original'
+    for line in lines:
+        if re.match(r'(\[)?update(d)?(:|\s+)', line, re.IGNORECASE):
+            alert_type = 'Update'
+    n_rows = 1 + len(lines) % 2
+    gpt_table = pd.DataFrame({
+        'Date': [lines[0].strip()] * n_rows,
+        'Report Time': ['9:02 PM'] * n_rows,
+        'Incident Time': ['nan'] * n_rows,
+        'Nearest Address to Incident': ['1400 NE 42nd'] * n_rows,
+        'Incident Category': ['Robbery'] * n_rows,
+        'Incident Summary': [lines[1][:40].strip()] * n_rows,
+        'Incident Alert': [''.join(lines[1:]).strip()] * n_rows,
+        'Alert Type': [alert_type] * n_rows,
+    })
+    if return_alert_type:
+        return (gpt_table, alert_type)
+    return gpt_table
+
+PATCH_TARGET = 'parse_uw_alerts.parse_uw_alerts.prompt_gpt'
+
+class TestAssignIds(unittest.TestCase):
+    """
+    Test methods for assign_ids function.
+    """
+    def test_incidents(self):
+        """Test that an incident ends with its Original post"""
+        empty = pd.DataFrame({'Alert ID': [], 'Incident ID': [], 'Alert Type': []})
+        table = pd.DataFrame({'Date': ['3/9/23']})
+        tables = assign_ids(empty, [(table, 'Update'), (table, 'Original'),
+                                    (table, 'Original'), (table, 'Update')])
+        self.assertEqual([t['Alert ID'].iloc[0] for t in tables], [1, 2, 3, 4])
+        self.assertEqual([t['Incident ID'].iloc[0] for t in tables], [1, 1, 2, 3])
+        self.assertNotIn('Alert ID', table.columns)
+
+class TestChunkCheckpoint(unittest.TestCase):
+    """
+    Test methods for ChunkCheckpoint class.
+    """
+    def test_partial_line(self):
+        """Test that a partly written entry is ignored and not appended to"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'checkpoint.jsonl')
+            table = pd.DataFrame({'Date': ['3/9/23'], 'Incident Time': [float('nan')]})
+            ChunkCheckpoint(path).append('0:a', (table, 'Original'))
+            with open(path, 'a', encoding='UTF-8') as checkpoint_file:
+                checkpoint_file.write('{"key": "5:b", "alert_ty')
+            checkpoint = ChunkCheckpoint(path)
+            self.assertNotIn('5:b', checkpoint)
+            checkpoint.append('5:b', (table, 'Update'))
+            checkpoint = ChunkCheckpoint(path)
+            self.assertEqual(checkpoint.get('5:b')[1], 'Update')
+            pdt.assert_frame_equal(checkpoint.get('0:a')[0], table)
+
+class TestBackfillTxtData(unittest.TestCase):
+    """
+    Test methods for backfill_txt_data function.
+    """
+    def setUp(self):
+        dirname = os.path.dirname(__file__)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.txt_path = os.path.join(self.tmp_dir, 'alerts.txt')
+        with open(os.path.join(dirname, '../../data/UW_Alerts_2018_2022.txt'),
+                  encoding='UTF-8') as archive:
+            lines = archive.readlines()[:300]
+        with open(self.txt_path, 'w', encoding='UTF-8') as txt_file:
+            txt_file.writelines(lines)
+        self.sequential_path = os.path.join(self.tmp_dir, 'sequential.csv')
+        self.parallel_path = os.path.join(self.tmp_dir, 'parallel.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_same_ids_as_sequential(self):
+        """Test that the parallel backfill writes the sequential output"""
+        with mock.patch(PATCH_TARGET, side_effect=fake_prompt_gpt):
+            parse_txt_data(self.txt_path, self.sequential_path)
+            stats = backfill_txt_data(self.txt_path, self.parallel_path, max_workers=4)
+        sequential = pd.read_csv(self.sequential_path)
+        parallel = pd.read_csv(self.parallel_path)
+        pdt.assert_frame_equal(parallel, sequential)
+        self.assertGreater(sequential['Incident ID'].max(), 1)
+        self.assertEqual(stats['rows'], len(parallel))
+        self.assertEqual(stats['chunks'], parallel['Alert ID'].nunique())
+        self.assertGreater(stats['tokens_per_sec'], 0)
+
+    def test_resume_from_file_start(self):
+        """Test that a resumed backfill continues the IDs of the output file"""
+        with mock.patch(PATCH_TARGET, side_effect=fake_prompt_gpt):
+            parse_txt_data(self.txt_path, self.sequential_path)
+            shutil.copy(self.sequential_path, self.parallel_path)
+            parse_txt_data(self.txt_path, self.sequential_path, file_start=150)
+            backfill_txt_data(self.txt_path, self.parallel_path, file_start=150,
+                              max_workers=3)
+        pdt.assert_frame_equal(pd.read_csv(self.parallel_path),
+                               pd.read_csv(self.sequential_path))
+
+    def test_restart_skips_completed_chunks(self):
+        """Test that a restarted backfill extracts only the missing chunks"""
+        extracted = []
+        network_down = [True]
+        def failing_prompt_gpt(lines, return_alert_type=False):
+            if network_down[0] and len(extracted) >= 10:
+                raise ConnectionError('network down')
+            extracted.append(lines)
+            return fake_prompt_gpt(lines, return_alert_type)
+        with mock.patch(PATCH_TARGET, side_effect=failing_prompt_gpt):
+            with self.assertRaises(ConnectionError):
+                backfill_txt_data(self.txt_path, self.parallel_path, max_workers=1)
+            self.assertFalse(os.path.exists(self.parallel_path))
+            extracted.clear()
+            network_down[0] = False
+            first = backfill_txt_data(self.txt_path, self.parallel_path)
+            self.assertEqual(first['resumed'], 10)
+            self.assertEqual(len(extracted), first['chunks'] - 10)
+            parse_txt_data(self.txt_path, self.sequential_path)
+            pdt.assert_frame_equal(pd.read_csv(self.parallel_path),
+                                   pd.read_csv(self.sequential_path))
+            second = backfill_txt_data(self.txt_path, self.parallel_path)
+        self.assertEqual(second['resumed'], second['chunks'])
+        self.assertEqual(second['tokens'], 0)
+
+    def test_bounded_workers(self):
+        """Test that at most max_workers chunks are extracted at once"""
+        running = []
+        peak = []
+        lock = threading.Lock()
+        def extract(chunk_lines):
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            threading.Event().wait(0.005)
+            with lock:
+                running.pop()
+            return fake_prompt_gpt(chunk_lines, return_alert_type=True)
+        backfill_txt_data(self.txt_path, self.parallel_path, max_workers=2, extract=extract)
+        self.assertEqual(max(peak), 2)
+
+    def test_batches(self):
+        """Test that batched extraction writes the sequential output"""
+        batch_sizes = []
+        def extract_batch(chunks):
+            batch_sizes.append(len(chunks))
+            return [fake_prompt_gpt(chunk_lines[1:] if chunk_lines[0] == chunk_lines[1]
+                                    else chunk_lines, return_alert_type=True)
+                    for chunk_lines in chunks]
+        with mock.patch(PATCH_TARGET, side_effect=fake_prompt_gpt):
+            parse_txt_data(self.txt_path, self.sequential_path)
+            stats = backfill_txt_data(self.txt_path, self.parallel_path, batch_size=4,
+                                      extract_batch=extract_batch)
+        pdt.assert_frame_equal(pd.read_csv(self.parallel_path),
+                               pd.read_csv(self.sequential_path))
+        self.assertEqual(sorted(batch_sizes), [4] * (stats['chunks'] // 4))
+
+    def test_max_workers(self):
+        """Test for requiring a positive number of workers"""
+        with self.assertRaises(ValueError):
+            backfill_txt_data(self.txt_path, self.parallel_path, max_workers=0)
+
+if __name__ == '__main__':
+    unittest.main()
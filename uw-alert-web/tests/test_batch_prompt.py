@@ -0,0 +1,122 @@
+"""
+Tests for batch_prompt.py
+"""
+import tempfile
+import unittest
+from unittest import mock
+#pylint: disable=import-error
+from parse_uw_alerts.batch_prompt import pack_batches, parse_batch_completion, \
+    prompt_gpt_batch, BATCH_TASK
+from parse_uw_alerts.llm_cache import LLMCache, cache_key
+from parse_uw_alerts.parse_uw_alerts import GPT_MODEL, GPT_TASK, format_alert_chunk, \
+    parse_completion
+from parse_uw_alerts.rule_extractor import GPT_COLUMNS
+
+HEADER = ('| Alert | Date | Report Time | Incident Time | Nearest Address to Incident |'
+          ' Incident Category | Incident Summary |\n|---|---|---|---|---|---|---|\n')
+SINGLE = ('\n| Date | Report Time | Incident Time | Nearest Address to Incident |'
+          ' Incident Category | Incident Summary |\n|---|---|---|---|---|---|\n'
+          '| 03/09/2023 | 8:00 PM | | | Fire | Single |\n')
+CHUNKS = [['March 9, 2023\n', f'UPDATE at {hour}:00 p.m.: Crews are on scene.\n']
+          for hour in [8, 9, 10]]
+
+def batch_row(alert, hour):
+    """Returns a row of a batch completion"""
+    return f'| {alert} | 03/09/2023 | {hour}:00 PM | | | Fire | Batch |\n'
+
+class TestPackBatches(unittest.TestCase):
+    """
+    Test methods for pack_batches function.
+    """
+    def test_batch_size(self):
+        """Test that batches keep the chunk order and size limit"""
+        self.assertEqual(pack_batches(['a', 'b', 'c', 'd', 'e'], max_batch_size=2),
+                         [[0, 1], [2, 3], [4]])
+
+    def test_token_budget(self):
+        """Test that long chunks do not share a prompt"""
+        long_chunk = 'word ' * 2000
+        self.assertEqual(pack_batches(['a', long_chunk, long_chunk, 'b']),
+                         [[0, 1], [2, 3]])
+
+class TestParseBatchCompletion(unittest.TestCase):
+    """
+    Test methods for parse_batch_completion function.
+    """
+    def test_split(self):
+        """Test that rows are split by alert id"""
+        tables = parse_batch_completion(
+            '\n' + HEADER + batch_row('A2', 9) + batch_row('A1', 8) + batch_row('A2', 10), 3)
+        self.assertEqual(sorted(tables), [0, 1])
+        self.assertEqual(tables[1]['Report Time'].tolist(), ['9:00 PM', '10:00 PM'])
+        self.assertEqual(tables[0]['Incident Time'].values[0], 'nan')
+
+    def test_malformed(self):
+        """Test for rejecting tables without the batch columns or ids"""
+        for completion in ['I cannot help with that.',
+                           SINGLE,
+                           HEADER + batch_row('A4', 8)]:
+            with self.assertRaises(ValueError):
+                parse_batch_completion(completion, 3)
+
+class TestPromptGPTBatch(unittest.TestCase):
+    """
+    Test methods for prompt_gpt_batch function.
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory() #pylint: disable=consider-using-with
+        self.cache = LLMCache(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_one_request(self):
+        """Test that a batch is one request and fills the cache"""
+        completion = HEADER + ''.join(batch_row(f'A{i + 1}', 8 + i) for i in range(3))
+        with mock.patch('parse_uw_alerts.parse_uw_alerts.request_completion',
+                        return_value=completion) as request:
+            results = prompt_gpt_batch(CHUNKS, llm_cache=self.cache, fast_path=False)
+            self.assertEqual(request.call_count, 1)
+            self.assertTrue(request.call_args[0][0].startswith(BATCH_TASK))
+            self.assertEqual([table['Report Time'].values[0] for table, _ in results],
+                             ['8:00 PM', '9:00 PM', '10:00 PM'])
+            self.assertEqual([alert_type for _, alert_type in results], ['Update'] * 3)
+            self.assertEqual(results[2][0]['Incident Alert'].values[0],
+                             'UPDATE at 10:00 p.m.: Crews are on scene.')
+            cached = prompt_gpt_batch(CHUNKS, llm_cache=self.cache, fast_path=False)
+            self.assertEqual(request.call_count, 1)
+        self.assertEqual(cached[1][0]['Report Time'].values[0], '9:00 PM')
+
+    def test_cached_completion(self):
+        """Test that the cache holds single-alert completions of the batch rows"""
+        completion = HEADER + ''.join(batch_row(f'A{i + 1}', 8 + i) for i in range(3))
+        with mock.patch('parse_uw_alerts.parse_uw_alerts.request_completion',
+                        return_value=completion):
+            prompt_gpt_batch(CHUNKS, llm_cache=self.cache, fast_path=False)
+        entry = self.cache.get(cache_key(GPT_MODEL, GPT_TASK, format_alert_chunk(CHUNKS[1])))
+        table = parse_completion(entry['completion'])
+        self.assertEqual(list(table.columns), GPT_COLUMNS)
+        self.assertTrue(table.equals(entry['table']))
+        self.assertEqual(table['Report Time'].tolist(), ['9:00 PM'])
+
+    def test_retry_singly(self):
+        """Test that alerts missing from the response are extracted alone"""
+        def request_completion(prompt, *_, **__):
+            if prompt.startswith(BATCH_TASK):
+                return HEADER + batch_row('A2', 9)
+            return SINGLE
+        with mock.patch('parse_uw_alerts.parse_uw_alerts.request_completion',
+                        side_effect=request_completion) as request:
+            results = prompt_gpt_batch(CHUNKS, llm_cache=self.cache, fast_path=False)
+        self.assertEqual(request.call_count, 3)
+        self.assertEqual([table['Incident Summary'].values[0] for table, _ in results],
+                         ['Single', 'Batch', 'Single'])
+        self.assertEqual(results[1][0].attrs['extraction']['method'], 'batch')
+
+    def test_batch_size(self):
+        """Test for requiring a positive batch size"""
+        with self.assertRaises(ValueError):
+            prompt_gpt_batch(CHUNKS, max_batch_size=0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+"""
+Tests for benchmark.py
+"""
+import tempfile
+import unittest
+from unittest import mock
+#pylint: disable=import-error
+from parse_uw_alerts.benchmark import benchmark_parse_txt_data, blog_page, read_alerts, \
+    throughput, DEFAULT_TXT_PATH
+from parse_uw_alerts.rate_limiter import RateLimiter
+from parse_uw_alerts.standin_services import StandInServer, load_completions, load_geocodes
+
+class TestReadAlerts(unittest.TestCase):
+    """
+    Test methods for read_alerts and blog_page functions.
+    """
+    def test_read_alerts(self):
+        """Test that alerts start with their date line"""
+        alerts = read_alerts(DEFAULT_TXT_PATH, 3)
+        self.assertEqual(len(alerts), 3)
+        self.assertEqual([lines[0] for lines in alerts], ['March 9, 2023\n'] * 3)
+
+    def test_blog_page(self):
+        """Test that the alert is the second paragraph of the page"""
+        page = blog_page(['October 27, 2022\n', '\n', 'UPDATE at 9:02 p.m. A & B\n'])
+        self.assertIn(b'<p>October 27, 2022</p><p>UPDATE at 9:02 p.m. A &amp; B</p>', page)
+
+    def test_throughput(self):
+        """Test the alerts per second"""
+        self.assertEqual(throughput(4, 2.0, stored=4),
+                         {'alerts': 4, 'seconds': 2.0, 'alerts_per_second': 2.0, 'stored': 4})
+
+class TestBenchmarkParseTxtData(unittest.TestCase):
+    """
+    Test methods for benchmark_parse_txt_data function.
+    """
+    @mock.patch('parse_uw_alerts.parse_uw_alerts.get_geocode_cache', return_value=None)
+    @mock.patch('parse_uw_alerts.parse_uw_alerts.get_llm_cache', return_value=None)
+    @mock.patch('parse_uw_alerts.parse_uw_alerts.get_rate_limiter', return_value=RateLimiter())
+    def test_benchmark(self, *_):
+        """Test that every alert goes through the stand-in servers"""
+        alerts = read_alerts(DEFAULT_TXT_PATH, 4)
+        with StandInServer(load_completions(), load_geocodes()) as server, \
+                tempfile.TemporaryDirectory() as work_dir, \
+                mock.patch('openai.api_base', server.openai_api_base), \
+                mock.patch('openai.api_key', 'sk-standin'), \
+                mock.patch.dict('os.environ', {'GOOGLE_MAPS_BASE_URL': server.url}):
+            result = benchmark_parse_txt_data(alerts, work_dir)
+        self.assertEqual(result['alerts'], 4)
+        self.assertGreater(result['alerts_per_second'], 0)
+        self.assertGreater(server.stats['completions'] + server.stats['geocodes'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
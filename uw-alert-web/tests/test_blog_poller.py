@@ -0,0 +1,141 @@
+"""
+Tests for blog_poller.py
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+#pylint: disable=import-error
+from parse_uw_alerts.blog_poller import BlogPoller, fetch_blog_page
+import requests
+
+class BlogHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in for emergency.uw.edu answering conditional GET requests.
+    """
+    def do_GET(self):
+        """Serves server.page with an ETag, or 304 if it matches"""
+        self.server.requests.append(dict(self.headers))
+        page = self.server.page
+        etag = '"' + hashlib.md5(page).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(page)))
+        self.end_headers()
+        self.wfile.write(page)
+
+    def log_message(self, format, *args): #pylint: disable=redefined-builtin
+        """Keeps the test output quiet"""
+
+class BlogServerTestCase(unittest.TestCase):
+    """
+    Runs the stand-in blog server on a free local port.
+    """
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), BlogHandler)
+        self.server.page = b'<html>alert 1</html>'
+        self.server.requests = []
+        self.url = f'http://127.0.0.1:{self.server.server_port}/'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.ingested = []
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def ingest(self, content):
+        """Records the ingested pages"""
+        self.ingested.append(content)
+        return content
+
+class TestFetchBlogPage(BlogServerTestCase):
+    """
+    Test methods for fetch_blog_page function.
+    """
+    def test_conditional_get(self):
+        """Test for a 304 answer when the ETag matches"""
+        session = requests.Session()
+        content, etag, _ = fetch_blog_page(self.url, session)
+        self.assertEqual(content, self.server.page)
+        self.assertIsNotNone(etag)
+        content, etag_again, _ = fetch_blog_page(self.url, session, etag=etag)
+        self.assertIsNone(content)
+        self.assertEqual(etag_again, etag)
+        self.assertEqual(self.server.requests[-1]['If-None-Match'], etag)
+
+class TestBlogPoller(BlogServerTestCase):
+    """
+    Test methods for BlogPoller class.
+    """
+    def test_ingests_only_changes(self):
+        """Test that an unchanged page is not ingested again"""
+        updates = []
+        poller = BlogPoller(self.ingest, url=self.url,
+                            on_update=lambda: updates.append(1))
+        self.assertTrue(poller.poll_once())
+        self.assertFalse(poller.poll_once())
+        self.server.page = b'<html>alert 2</html>'
+        self.assertTrue(poller.poll_once())
+        self.assertEqual(self.ingested, [b'<html>alert 1</html>', b'<html>alert 2</html>'])
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(poller.stats['not_modified'], 1)
+
+    def test_failed_ingest_is_retried(self):
+        """Test that a page is fetched again after ingest failed"""
+        def failing_ingest(content):
+            raise RuntimeError(content)
+        poller = BlogPoller(failing_ingest, url=self.url)
+        with self.assertRaises(RuntimeError):
+            poller.poll_once()
+        poller.ingest = self.ingest
+        self.assertTrue(poller.poll_once())
+        self.assertNotIn('If-None-Match', self.server.requests[-1])
+
+    def test_background_thread(self):
+        """Test that a started poller ingests without a request"""
+        poller = BlogPoller(self.ingest, url=self.url, interval=0.05)
+        poller.start()
+        try:
+            self.server.page = b'<html>alert 2</html>'
+            for _ in range(100):
+                if len(self.ingested) == 2:
+                    break
+                poller.wake()
+                threading.Event().wait(0.05)
+        finally:
+            poller.stop(timeout=5)
+        self.assertEqual(self.ingested[-1], b'<html>alert 2</html>')
+
+    def test_single_leader(self):
+        """Test that only the poller holding the lock file polls"""
+        tmp_dir = tempfile.mkdtemp()
+        lock_path = os.path.join(tmp_dir, 'poller.lock')
+        try:
+            leader = BlogPoller(self.ingest, url=self.url, lock_path=lock_path)
+            follower = BlogPoller(self.ingest, url=self.url, lock_path=lock_path)
+            self.assertTrue(leader.poll_once())
+            self.assertFalse(follower.poll_once())
+            self.assertEqual(len(self.server.requests), 1)
+            leader.stop()
+            self.assertTrue(follower.poll_once())
+            follower.stop()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_interval(self):
+        """Test for requiring a positive interval and callable ingest"""
+        with self.assertRaises(ValueError):
+            BlogPoller(self.ingest, interval=0)
+        with self.assertRaises(ValueError):
+            BlogPoller(None)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+"""
+Tests for clusters.py
+"""
+import ast
+import os
+import unittest
+import numpy as np
+import pandas as pd
+#pylint: disable=import-error
+from visualization_manager.clusters import build_zoom_clusters, get_clustered_map, \
+    latlng_to_pixels
+from visualization_manager.visualization_manager import get_urgent_incidents
+
+class TestLatLngToPixels(unittest.TestCase):
+    """
+    Test methods for latlng_to_pixels function.
+    """
+    def test_world_corners(self):
+        """Test that the map origin and center project as in leaflet"""
+        x, y = latlng_to_pixels([0, 85.0511], [0, -180], 0)
+        self.assertAlmostEqual(x[0], 128)
+        self.assertAlmostEqual(y[0], 128)
+        self.assertAlmostEqual(x[1], 0)
+        self.assertAlmostEqual(y[1], 0, places=2)
+
+class TestBuildZoomClusters(unittest.TestCase):
+    """
+    Test methods for build_zoom_clusters function.
+    """
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.lats = 47.66 + rng.normal(0, 0.01, 200)
+        self.lngs = -122.31 + rng.normal(0, 0.01, 200)
+
+    def test_counts(self):
+        """Test that every point is in one cluster per zoom level"""
+        zoom_clusters = build_zoom_clusters(self.lats, self.lngs, min_zoom=10, max_zoom=16)
+        self.assertEqual(sorted(zoom_clusters), list(range(10, 17)))
+        for clusters in zoom_clusters.values():
+            members = sorted(i for cluster in clusters for i in cluster['members'])
+            self.assertEqual(members, list(range(200)))
+            self.assertEqual(sum(cluster['count'] for cluster in clusters), 200)
+        # Zooming in splits clusters
+        self.assertLess(len(zoom_clusters[10]), len(zoom_clusters[16]))
+
+    def test_quadtree_nesting(self):
+        """Test that each cluster lies within one cluster of the lower zoom level"""
+        zoom_clusters = build_zoom_clusters(self.lats, self.lngs, min_zoom=12, max_zoom=15)
+        for zoom in range(13, 16):
+            parents = {i: n for n, cluster in enumerate(zoom_clusters[zoom - 1])
+                       for i in cluster['members']}
+            for cluster in zoom_clusters[zoom]:
+                self.assertEqual(len({parents[i] for i in cluster['members']}), 1)
+
+    def test_centroid_and_bounds(self):
+        """Test cluster summaries of two nearby points"""
+        clusters = build_zoom_clusters([47.66, 47.6601, np.nan], [-122.31, -122.3101, 0],
+                                       min_zoom=10, max_zoom=10)[10]
+        self.assertEqual(len(clusters), 1)
+        self.assertEqual(clusters[0]['count'], 2)
+        self.assertEqual(clusters[0]['members'], [0, 1])
+        self.assertAlmostEqual(clusters[0]['lat'], 47.66005)
+        self.assertEqual(clusters[0]['bounds'], [[47.66, -122.3101], [47.6601, -122.31]])
+
+    def test_invalid_arguments(self):
+        """Test for rejecting invalid cell sizes and zoom ranges"""
+        with self.assertRaises(ValueError):
+            build_zoom_clusters(self.lats, self.lngs, cell_pixels=0)
+        with self.assertRaises(ValueError):
+            build_zoom_clusters(self.lats, self.lngs, min_zoom=15, max_zoom=10)
+
+class TestGetClusteredMap(unittest.TestCase):
+    """
+    Test methods for get_clustered_map function.
+    """
+    def setUp(self):
+        dirname = os.path.dirname(__file__)
+        file_path = os.path.join(dirname, "../../data/uw_alerts_clean.csv")
+        alerts_df = pd.read_csv(file_path, converters={'geometry': ast.literal_eval})
+        self.alert_df = get_urgent_incidents(alerts_df, time_frame=500000)
+
+    def test_clustered_map(self):
+        """Test for the map script and the side panel metadata"""
+        m_html, alert_dict = get_clustered_map(self.alert_df)
+        self.assertIsInstance(m_html, str)
+        self.assertIn('zoomClusters', m_html)
+        # No per alert popups
+        self.assertNotIn('iframe', m_html.lower())
+        self.assertEqual(len(alert_dict), len(self.alert_df))
+        category, _, messages, _ = alert_dict['0']
+        self.assertEqual(category, self.alert_df['Incident Category'].iloc[0])
+        self.assertIsInstance(messages, tuple)
+
+    def test_input_checks(self):
+        """Test for rejecting invalid inputs"""
+        with self.assertRaises(TypeError):
+            get_clustered_map([])
+        with self.assertRaises(ValueError):
+            get_clustered_map(pd.DataFrame({'geometry': []}))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+"""
+Tests for geocode_cache.py
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import googlemaps
+import pandas as pd
+#pylint: disable=import-error
+from parse_uw_alerts.geocode_cache import normalize_address, GeocodeCache, \
+    geocode_addresses, geocode_batch, make_gmaps_client
+from parse_uw_alerts.parse_uw_alerts import clean_gpt_output
+from parse_uw_alerts.rate_limiter import RateLimiter
+
+def make_geocoder(calls):
+    """Returns a geocode function recording the addresses in `calls`"""
+    def geocode(address):
+        calls.append(address)
+        return [{'formatted_address': address.upper(),
+                 'geometry': {'location': {'lat': 47.66, 'lng': -122.31}}}]
+    return geocode
+
+class TestNormalizeAddress(unittest.TestCase):
+    """
+    Test methods for normalize_address function.
+    """
+    def test_variants(self):
+        """Test that formatting variants of an address share a key"""
+        self.assertEqual(normalize_address('1400 NE 42nd Street.'),
+                         normalize_address(' 1400  northeast 42nd st'))
+        self.assertEqual(normalize_address('NE 45th St and University Way'),
+                         normalize_address('ne 45th st. & university way'))
+        self.assertEqual(normalize_address("Denny Hall's lawn"), "denny hall's lawn")
+        self.assertNotEqual(normalize_address('1400 NE 42nd St'),
+                            normalize_address('1400 NE 41st St'))
+
+class TestGeocodeAddresses(unittest.TestCase):
+    """
+    Test methods for geocode_addresses function and GeocodeCache class.
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.now = [1000.0]
+        self.cache = GeocodeCache(os.path.join(self.tmp_dir, 'geocodes.sqlite'),
+                                  ttl=60, clock=lambda: self.now[0])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_batch_deduplication(self):
+        """Test that each unique address is geocoded once per batch"""
+        calls = []
+        addresses = ['Padelford Garage', 'The Ave', 'padelford garage.', 'The Ave']
+        results = geocode_addresses(addresses, make_geocoder(calls))
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(calls[0], 'Padelford Garage, University District, Seattle WA')
+        self.assertEqual(results[0], results[2])
+        self.assertEqual(len(results), 4)
+
+    def test_persistent(self):
+        """Test that cached addresses are not geocoded again until they expire"""
+        calls = []
+        geocode = make_geocoder(calls)
+        geocode_addresses(['Padelford Garage', 'The Ave'], geocode, self.cache)
+        cache = GeocodeCache(self.cache.db_path, ttl=60, clock=lambda: self.now[0])
+        results = geocode_addresses(['The Ave', 'Suzzallo Library', 'Padelford Garage'],
+                                    geocode, cache)
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(results[0][0]['formatted_address'],
+                         'THE AVE, UNIVERSITY DISTRICT, SEATTLE WA')
+        self.assertEqual(cache.stats, {'hits': 2, 'misses': 1})
+        self.now[0] += 61
+        geocode_addresses(['The Ave'], geocode, cache)
+        self.assertEqual(len(calls), 4)
+        self.now[0] += 30
+        self.assertEqual(cache.purge_expired(), 2)
+
+    def test_empty_results_not_cached(self):
+        """Test that addresses without a match are geocoded again"""
+        calls = []
+        def no_match(address):
+            calls.append(address)
+            return []
+        geocode_addresses(['Nowhere'], no_match, self.cache)
+        geocode_addresses(['Nowhere'], no_match, self.cache)
+        self.assertEqual(len(calls), 2)
+
+    def test_clean_gpt_output(self):
+        """Test that cleaning the alerts again makes no geocode requests"""
+        client = googlemaps.Client(key='AIzaTestKey')
+        calls = []
+        client.geocode = make_geocoder(calls)
+        gpt_data = pd.DataFrame({
+            'Date': ['03/09/2023', '03/09/2023', '03/08/2023'],
+            'Report Time': ['9:02 PM', '8:47 PM', '1:15 AM'],
+            'Incident Time': ['nan', '8:30 PM', 'nan'],
+            'Nearest Address to Incident': ['The Ave', 'The Ave', 'Padelford Garage'],
+            'Incident Alert': ['UPDATE: suspect left', 'Robbery', 'Car prowl'],
+            'Incident ID': [2, 2, 1],
+        })
+        clean = clean_gpt_output(gpt_data, gmaps_client=client,
+                                 rate_limiter=RateLimiter(), geocode_cache=self.cache)
+        clean_gpt_output(gpt_data, gmaps_client=client,
+                         rate_limiter=RateLimiter(), geocode_cache=self.cache)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(clean.attrs['geocode_stats']['geocoded'], 2)
+        self.assertEqual(clean['Google Address'].values[2],
+                         'PADELFORD GARAGE, UNIVERSITY DISTRICT, SEATTLE WA')
+
+    def test_concurrent_batch(self):
+        """Test that a batch of misses takes about one round trip"""
+        running = []
+        peak = []
+        lock = threading.Lock()
+        def slow_geocode(address):
+            with lock:
+                running.append(address)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.remove(address)
+            return [{'formatted_address': address, 'geometry': {}}]
+        addresses = [f'{1000 + 100 * i} NE 42nd St' for i in range(50)] * 2
+        start = time.perf_counter()
+        results, stats = geocode_batch(addresses, slow_geocode, self.cache, max_workers=50)
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual(max(peak), 50)
+        self.assertEqual(results[0], results[50])
+        self.assertEqual(results[1][0]['formatted_address'],
+                         '1100 NE 42nd St, University District, Seattle WA')
+        self.assertEqual((stats['addresses'], stats['unique'], stats['geocoded']),
+                         (100, 50, 50))
+        self.assertGreaterEqual(stats['max_latency'], 0.05)
+        _, stats = geocode_batch(addresses, slow_geocode, self.cache, max_workers=4)
+        self.assertEqual((stats['cached'], stats['geocoded']), (50, 0))
+
+    def test_gmaps_client(self):
+        """Test that the client shares a pooled session"""
+        client = make_gmaps_client('AIzaTestKey', pool_size=16)
+        adapter = client.session.get_adapter('https://maps.googleapis.com')
+        self.assertEqual(adapter.poolmanager.connection_pool_kw['maxsize'], 16)
+
+    def test_ttl(self):
+        """Test for requiring a positive time to live"""
+        with self.assertRaises(ValueError):
+            GeocodeCache(self.cache.db_path, ttl=0)
+
+if __name__ == '__main__':
+    unittest.main()
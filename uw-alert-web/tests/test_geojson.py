@@ -0,0 +1,133 @@
+"""
+Tests for geojson.py
+"""
+import json
+import unittest
+import pandas as pd
+#pylint: disable=import-error
+from alert_store.alert_store import parse_alert_frame
+from alert_store.geojson import parse_alert_query, query_etag, filter_alerts, \
+    to_feature_collection
+
+def make_alerts():
+    """Returns three typed alerts"""
+    return parse_alert_frame(pd.DataFrame({
+        'Date': ['3/9/23', '3/8/23', '3/1/23'],
+        'Report Time': ['20:47:00', None, '08:00:00'],
+        'Incident Category': ['Stabbing', 'Robbery', 'Stabbing'],
+        'Alert ID': [3, 2, 1],
+        'Incident ID': [2, 1, 1],
+        'geometry': ["{'location': {'lat': 47.65, 'lng': -122.30}}",
+                     "{'location': {'lat': 47.70, 'lng': -122.40}}",
+                     None]
+    }))
+
+class TestParseAlertQuery(unittest.TestCase):
+    """
+    Test methods for parse_alert_query function.
+    """
+    def test_parse(self):
+        """Test for parsed times, bbox and categories"""
+        query = parse_alert_query({'since': '2023-03-08', 'bbox': '-122.4,47.6,-122.2,47.7',
+                                   'category': 'Stabbing, robbery'})
+        self.assertEqual(query['since'], pd.Timestamp('2023-03-08'))
+        self.assertIsNone(query['until'])
+        self.assertEqual(query['bbox'], (-122.4, 47.6, -122.2, 47.7))
+        self.assertEqual(query['categories'], frozenset(['stabbing', 'robbery']))
+
+    def test_time_zone(self):
+        """Test that datetimes with a time zone become local times"""
+        query = parse_alert_query({'since': '2023-03-09T04:00:00Z',
+                                   'until': '2023-03-09T12:00:00+00:00'})
+        self.assertEqual(query['since'], pd.Timestamp('2023-03-08 20:00'))
+        self.assertEqual(query['until'], pd.Timestamp('2023-03-09 04:00'))
+
+    def test_until_date(self):
+        """Test that a date-only until includes its whole day"""
+        query = parse_alert_query({'until': '2023-03-09'})
+        self.assertEqual(query['until'], pd.Timestamp('2023-03-09 23:59:59.999999999'))
+        query = parse_alert_query({'until': '2023-03-09T12:00'})
+        self.assertEqual(query['until'], pd.Timestamp('2023-03-09 12:00'))
+
+    def test_invalid(self):
+        """Test for rejecting malformed parameters"""
+        for args in [{'since': 'yesterday-ish'}, {'bbox': '1,2,3'},
+                     {'bbox': 'a,b,c,d'}, {'bbox': '1,2,0,3'}]:
+            with self.assertRaises(ValueError):
+                parse_alert_query(args)
+
+class TestQueryEtag(unittest.TestCase):
+    """
+    Test methods for query_etag function.
+    """
+    def test_changes_with_version_and_query(self):
+        """Test that the tag depends on the data version and the query"""
+        query = parse_alert_query({'category': 'Stabbing,Robbery'})
+        same_query = parse_alert_query({'category': 'Robbery,Stabbing'})
+        self.assertEqual(query_etag(1, query), query_etag(1, same_query))
+        self.assertNotEqual(query_etag(1, query), query_etag(2, query))
+        self.assertNotEqual(query_etag(1, query), query_etag(1, parse_alert_query({})))
+
+class TestFilterAlerts(unittest.TestCase):
+    """
+    Test methods for filter_alerts function.
+    """
+    def test_time_range(self):
+        """Test that alerts without a report time match by date"""
+        alerts = make_alerts()
+        filtered = filter_alerts(alerts, since=pd.Timestamp('2023-03-08 12:00'))
+        self.assertEqual(filtered['Alert ID'].to_list(), [3, 2])
+        filtered = filter_alerts(alerts, until=pd.Timestamp('2023-03-08'))
+        self.assertEqual(filtered['Alert ID'].to_list(), [2, 1])
+
+    def test_time_zone(self):
+        """Test that since and until with a time zone are compared in local time"""
+        alerts = make_alerts()
+        # 2023-03-08 16:00 local, alert 2 has no report time and matches its day
+        since = parse_alert_query({'since': '2023-03-09T00:00:00Z'})['since']
+        self.assertEqual(filter_alerts(alerts, since=since)['Alert ID'].to_list(), [3, 2])
+        until = parse_alert_query({'until': '2023-03-09T00:00:00+00:00'})['until']
+        self.assertEqual(filter_alerts(alerts, until=until)['Alert ID'].to_list(), [2, 1])
+        aware = pd.Timestamp('2023-03-09T00:00:00Z')
+        self.assertEqual(filter_alerts(alerts, since=aware)['Alert ID'].to_list(), [3, 2])
+        self.assertEqual(filter_alerts(alerts, until=aware)['Alert ID'].to_list(), [2, 1])
+
+    def test_until_date(self):
+        """Test that a date-only until keeps the alerts reported later that day"""
+        alerts = make_alerts()
+        until = parse_alert_query({'until': '2023-03-09'})['until']
+        self.assertEqual(filter_alerts(alerts, until=until)['Alert ID'].to_list(), [3, 2, 1])
+        until = parse_alert_query({'until': '2023-03-08'})['until']
+        self.assertEqual(filter_alerts(alerts, until=until)['Alert ID'].to_list(), [2, 1])
+
+    def test_bbox_and_category(self):
+        """Test for spatial and category filters"""
+        alerts = make_alerts()
+        filtered = filter_alerts(alerts, bbox=(-122.35, 47.6, -122.2, 47.7))
+        self.assertEqual(filtered['Alert ID'].to_list(), [3])
+        filtered = filter_alerts(alerts, categories={'stabbing'})
+        self.assertEqual(filtered['Alert ID'].to_list(), [3, 1])
+
+    def test_dataframe_input(self):
+        """Test for requiring a Pandas DataFrame"""
+        with self.assertRaises(TypeError):
+            filter_alerts([])
+
+class TestToFeatureCollection(unittest.TestCase):
+    """
+    Test methods for to_feature_collection function.
+    """
+    def test_features(self):
+        """Test for one JSON serializable Point feature per alert"""
+        collection = to_feature_collection(make_alerts())
+        self.assertEqual(collection['type'], 'FeatureCollection')
+        self.assertEqual(len(collection['features']), 3)
+        first = collection['features'][0]
+        self.assertEqual(first['geometry'], {'type': 'Point', 'coordinates': [-122.30, 47.65]})
+        self.assertEqual(first['properties']['Alert ID'], 3)
+        self.assertIsNone(collection['features'][1]['properties']['Report Time'])
+        self.assertIsNone(collection['features'][2]['geometry'])
+        json.dumps(collection)
+
+if __name__ == '__main__':
+    unittest.main()
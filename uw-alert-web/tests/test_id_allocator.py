@@ -0,0 +1,146 @@
+"""
+Tests for id_allocator.py
+"""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import os
+import tempfile
+import unittest
+from unittest import mock
+import pandas as pd
+#pylint: disable=import-error
+from parse_uw_alerts.id_allocator import IdAllocator, get_id_allocator, next_ids, \
+    state_from_alerts
+
+# Stored alerts, newest first
+ALERTS = pd.DataFrame({'Alert Type': ['Update', 'Original', 'Original'],
+                       'Incident ID': [7, 7, 6],
+                       'Alert ID': [12, 11, 10]})
+
+def allocate_many(state_path, n_alerts):
+    """Allocates IDs for n_alerts originals from a separate process"""
+    allocator = IdAllocator(state_path)
+    return [allocator.allocate('Original') for _ in range(n_alerts)]
+
+class TestNextIds(unittest.TestCase):
+    """
+    Test methods for next_ids and state_from_alerts functions.
+    """
+    def test_posted_order(self):
+        """Test that originals start incidents and updates follow the last one"""
+        state = state_from_alerts(ALERTS)
+        self.assertEqual(state, {'next_alert_id': 13, 'next_incident_id': 8,
+                                 'last_incident_id': 7, 'last_alert_type': 'Update'})
+        incident_id, alert_id, state = next_ids(state, 'Update')
+        self.assertEqual((incident_id, alert_id), (7, 13))
+        incident_id, alert_id, state = next_ids(state, 'Original')
+        self.assertEqual((incident_id, alert_id), (8, 14))
+        self.assertEqual(next_ids(state, 'Update')[:2], (8, 15))
+
+    def test_archive_order(self):
+        """Test that an original ends its incident in archive order"""
+        state = state_from_alerts(ALERTS.iloc[::-1], archive_order=True)
+        incident_id, alert_id, state = next_ids(state, 'Update', archive_order=True)
+        self.assertEqual((incident_id, alert_id), (7, 13))
+        incident_id, alert_id, state = next_ids(state, 'Original', archive_order=True)
+        self.assertEqual((incident_id, alert_id), (7, 14))
+        self.assertEqual(next_ids(state, 'Update', archive_order=True)[:2], (8, 15))
+
+    def test_empty(self):
+        """Test that the first alert gets IDs 1"""
+        for archive_order in [False, True]:
+            state = state_from_alerts(ALERTS.iloc[:0], archive_order)
+            self.assertEqual(next_ids(state, 'Update', archive_order)[:2], (1, 1))
+
+    def test_alert_type(self):
+        """Test for requiring 'Update' or 'Original'"""
+        with self.assertRaises(ValueError):
+            next_ids(state_from_alerts(ALERTS), 'Random')
+
+class TestIdAllocator(unittest.TestCase):
+    """
+    Test methods for the IdAllocator class.
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.state_path = os.path.join(self.tmp_dir.name, 'alerts.csv.ids.json')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_seeded_once(self):
+        """Test that the alerts are only read for the first allocation"""
+        load_alerts = mock.Mock(return_value=ALERTS)
+        allocator = IdAllocator(self.state_path)
+        self.assertEqual(allocator.allocate('Update', load_alerts=load_alerts), (7, 13))
+        self.assertEqual(IdAllocator(self.state_path).allocate(
+            'Original', load_alerts=load_alerts), (8, 14))
+        load_alerts.assert_called_once()
+        self.assertEqual(allocator.state()['next_alert_id'], 15)
+
+    def test_data_rewritten(self):
+        """Test that rewritten data seeds the state again without moving it back"""
+        data_path = os.path.join(self.tmp_dir.name, 'alerts.csv')
+        ALERTS.to_csv(data_path, index=False)
+        allocator = get_id_allocator(data_path)
+        load_alerts = mock.Mock(side_effect=lambda: pd.read_csv(data_path))
+        self.assertEqual(allocator.allocate('Update', load_alerts=load_alerts), (7, 13))
+        self.assertEqual(allocator.allocate('Update', load_alerts=load_alerts), (7, 14))
+        load_alerts.assert_called_once()
+        # A newer csv with more alerts, e.g. pulled with git
+        newer = pd.concat([pd.DataFrame({'Alert Type': ['Original'], 'Incident ID': [9],
+                                         'Alert ID': [20]}), ALERTS], ignore_index=True)
+        newer.to_csv(data_path, index=False)
+        self.assertEqual(allocator.allocate('Update', load_alerts=load_alerts), (9, 21))
+        # An older csv does not give out IDs again
+        ALERTS.to_csv(data_path, index=False)
+        os.utime(data_path, ns=(0, 0))
+        self.assertEqual(allocator.allocate('Original', load_alerts=load_alerts), (10, 22))
+        self.assertEqual(load_alerts.call_count, 3)
+
+    def test_sync(self):
+        """Test that writes recorded with sync do not seed the state again"""
+        version = [1]
+        load_alerts = mock.Mock(return_value=ALERTS)
+        allocator = IdAllocator(self.state_path, fingerprint=lambda: version[0])
+        allocator.allocate('Update', load_alerts=load_alerts)
+        version[0] += 1
+        allocator.sync()
+        self.assertEqual(allocator.allocate('Update', load_alerts=load_alerts), (7, 14))
+        load_alerts.assert_called_once()
+
+    def test_reset(self):
+        """Test that a reset state is seeded again"""
+        allocator = IdAllocator(self.state_path)
+        allocator.allocate('Original')
+        allocator.reset()
+        self.assertIsNone(allocator.state())
+        self.assertEqual(allocator.allocate('Update', load_alerts=lambda: ALERTS), (7, 13))
+        allocator.reset(state_from_alerts(ALERTS.iloc[:0]))
+        self.assertEqual(allocator.allocate('Update'), (1, 1))
+
+    def test_threads(self):
+        """Test that concurrent allocations get unique IDs"""
+        allocators = [IdAllocator(self.state_path) for _ in range(4)]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            ids = list(executor.map(lambda index: allocators[index % 4].allocate('Original'),
+                                    range(40)))
+        self.assertEqual(sorted(alert_id for _, alert_id in ids), list(range(1, 41)))
+        self.assertEqual(len(set(incident_id for incident_id, _ in ids)), 40)
+
+    def test_processes(self):
+        """Test that allocations from several processes get unique IDs"""
+        with ProcessPoolExecutor(max_workers=3) as executor:
+            ids = sum(executor.map(allocate_many, [self.state_path] * 3, [10] * 3), [])
+        self.assertEqual(sorted(alert_id for _, alert_id in ids), list(range(1, 31)))
+
+    def test_get_id_allocator(self):
+        """Test that one allocator is shared per data path"""
+        data_path = os.path.join(self.tmp_dir.name, 'alerts.csv')
+        self.assertIs(get_id_allocator(data_path),
+                      get_id_allocator(os.path.relpath(data_path)))
+        self.assertEqual(get_id_allocator(data_path).state_path, self.state_path)
+        with self.assertRaises(ValueError):
+            get_id_allocator(1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+"""
+Tests for ingest_jobs.py
+"""
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+#pylint: disable=import-error
+from parse_uw_alerts.ingest_jobs import IngestJobQueue
+
+def wait_for(queue, job_id, timeout=5):
+    """Waits until a job finished and returns its status"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.status(job_id)
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+class TestIngestJobQueue(unittest.TestCase):
+    """
+    Test methods for IngestJobQueue class.
+    """
+    def setUp(self):
+        self.state_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.state_dir)
+
+    def test_job_result(self):
+        """Test that a job runs in the background and reports its result"""
+        queue = IngestJobQueue(lambda text: {'alerts': len(text)}, state_dir=self.state_dir)
+        job_id = queue.submit('abc')
+        job = wait_for(queue, job_id)
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['result'], {'alerts': 3})
+        self.assertIsNone(job['error'])
+        queue.shutdown()
+
+    def test_failed_job(self):
+        """Test that exceptions are reported as failed jobs"""
+        def run_job(text):
+            raise ValueError(text)
+        queue = IngestJobQueue(run_job)
+        job = wait_for(queue, queue.submit('bad alert'))
+        self.assertEqual(job['status'], 'failed')
+        self.assertEqual(job['error'], 'ValueError: bad alert')
+        queue.shutdown()
+
+    def test_bounded_concurrency(self):
+        """Test that at most max_workers jobs run and max_pending are accepted"""
+        release = threading.Event()
+        running = []
+        max_running = []
+        lock = threading.Lock()
+        def run_job(_):
+            with lock:
+                running.append(1)
+                max_running.append(len(running))
+            release.wait(5)
+            with lock:
+                running.pop()
+        queue = IngestJobQueue(run_job, max_workers=2, max_pending=3)
+        job_ids = [queue.submit(i) for i in range(3)]
+        self.assertIsNone(queue.submit(3))
+        time.sleep(0.1)
+        statuses = sorted(queue.status(job_id)['status'] for job_id in job_ids)
+        self.assertEqual(statuses, ['queued', 'running', 'running'])
+        release.set()
+        for job_id in job_ids:
+            wait_for(queue, job_id)
+        self.assertEqual(max(max_running), 2)
+        self.assertIsNotNone(queue.submit(4))
+        queue.shutdown()
+
+    def test_status_from_other_process(self):
+        """Test that job states are readable from the state directory"""
+        queue = IngestJobQueue(lambda text: text, state_dir=self.state_dir)
+        job_id = queue.submit('alert')
+        wait_for(queue, job_id)
+        other_worker = IngestJobQueue(lambda text: text, state_dir=self.state_dir)
+        self.assertEqual(other_worker.status(job_id)['result'], 'alert')
+        self.assertIsNone(other_worker.status('../secret'))
+        self.assertIsNone(other_worker.status('missing'))
+        queue.shutdown()
+        other_worker.shutdown()
+
+    def test_history_limit(self):
+        """Test that only max_history finished jobs are kept"""
+        queue = IngestJobQueue(lambda text: text, max_workers=1, max_history=2,
+                               state_dir=self.state_dir)
+        job_ids = [queue.submit(i) for i in range(4)]
+        wait_for(queue, job_ids[-1])
+        queue.shutdown()
+        self.assertIsNone(queue.status(job_ids[0]))
+        self.assertEqual(queue.status(job_ids[-1])['result'], 3)
+
+    def test_invalid_arguments(self):
+        """Test for rejecting invalid arguments"""
+        with self.assertRaises(ValueError):
+            IngestJobQueue(None)
+        with self.assertRaises(ValueError):
+            IngestJobQueue(len, max_workers=0)
+
+if __name__ == '__main__':
+    unittest.main()
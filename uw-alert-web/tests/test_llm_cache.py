@@ -0,0 +1,106 @@
+"""
+Tests for llm_cache.py
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import pandas as pd
+import pandas.testing as pdt
+#pylint: disable=import-error
+from parse_uw_alerts.llm_cache import LLMCache, cache_key
+from parse_uw_alerts.parse_uw_alerts import prompt_gpt
+from parse_uw_alerts.rate_limiter import RateLimiter
+
+COMPLETION = ('\n| Date | Report Time | Incident Time | Nearest Address to Incident |'
+              ' Incident Category | Incident Summary |\n'
+              '|---|---|---|---|---|---|\n'
+              '| 03/09/2023 | 8:47 PM | 8:30 PM | 4500 University Way NE |'
+              ' Robbery | Suspect displayed a knife |\n')
+
+def make_table(summary='Suspect displayed a knife'):
+    """Returns a one row extraction table"""
+    return pd.DataFrame({'Date': ['03/09/2023'], 'Incident Summary': [summary]})
+
+class TestCacheKey(unittest.TestCase):
+    """
+    Test methods for cache_key function.
+    """
+    def test_normalized(self):
+        """Test that whitespace does not change the key but content does"""
+        key = cache_key('davinci', 'Extract', 'March 9, 2023\nRobbery  at  the Ave')
+        self.assertEqual(key, cache_key('davinci', 'Extract',
+                                        'March 9, 2023\n\n Robbery at the Ave \n'))
+        self.assertNotEqual(key, cache_key('davinci', 'Extract', 'March 9, 2023\nTheft'))
+        self.assertNotEqual(key, cache_key('curie', 'Extract',
+                                           'March 9, 2023\nRobbery at the Ave'))
+        self.assertNotEqual(key, cache_key('davinci', 'Summarize',
+                                           'March 9, 2023\nRobbery at the Ave'))
+
+class TestLLMCache(unittest.TestCase):
+    """
+    Test methods for LLMCache class.
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_round_trip(self):
+        """Test that stored entries are returned and counted as hits"""
+        cache = LLMCache(self.tmp_dir)
+        self.assertIsNone(cache.get('a'))
+        cache.put('a', COMPLETION, make_table())
+        entry = LLMCache(self.tmp_dir).get('a')
+        self.assertEqual(entry['completion'], COMPLETION)
+        pdt.assert_frame_equal(entry['table'], make_table())
+        cache.get('a')
+        self.assertEqual(cache.stats, {'hits': 1, 'misses': 1, 'evictions': 0})
+
+    def test_eviction(self):
+        """Test that the least recently used entries are evicted"""
+        cache = LLMCache(self.tmp_dir, max_bytes=10 ** 6)
+        cache.put('a', COMPLETION, make_table())
+        entry_size = os.path.getsize(os.path.join(self.tmp_dir, 'a.json'))
+        cache = LLMCache(self.tmp_dir, max_bytes=entry_size * 2)
+        os.utime(os.path.join(self.tmp_dir, 'a.json'), (1, 1))
+        cache.put('b', COMPLETION, make_table())
+        os.utime(os.path.join(self.tmp_dir, 'b.json'), (2, 2))
+        cache.get('a')
+        cache.put('c', COMPLETION, make_table())
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+        self.assertEqual(cache.stats['evictions'], 1)
+
+    def test_max_bytes(self):
+        """Test for requiring a positive size"""
+        with self.assertRaises(ValueError):
+            LLMCache(self.tmp_dir, max_bytes=0)
+
+class TestPromptGPTCache(unittest.TestCase):
+    """
+    Test methods for prompt_gpt with an LLMCache.
+    """
+    def test_cached_extraction(self):
+        """Test that a repeated alert does not call OpenAI again"""
+        lines = ['March 9, 2023\n', 'UPDATE at 8:47pm: Robbery on the Ave.\n']
+        with tempfile.TemporaryDirectory() as tmp_dir, mock.patch(
+                'parse_uw_alerts.parse_uw_alerts.openai.Completion.create',
+                return_value=[{'choices': [{'text': COMPLETION,
+                                            'finish_reason': 'stop'}]}]) as create:
+            cache = LLMCache(tmp_dir)
+            first = prompt_gpt(lines, rate_limiter=RateLimiter(), llm_cache=cache,
+                               fast_path=False)
+            second = prompt_gpt(lines + ['\n'], rate_limiter=RateLimiter(), llm_cache=cache,
+                                fast_path=False)
+        self.assertEqual(create.call_count, 1)
+        pdt.assert_frame_equal(first, second)
+        self.assertEqual(first['Incident Category'].values[0], 'Robbery')
+        self.assertEqual(first['Alert Type'].values[0], 'Update')
+        self.assertEqual(cache.stats['hits'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+"""
+Tests for map_cache.py
+"""
+import unittest
+from datetime import datetime, timedelta
+#pylint: disable=import-error
+from visualization_manager.map_cache import MapCache
+
+class TestMapCache(unittest.TestCase):
+    """
+    Tests methods for MapCache class
+    in map_cache.py
+    """
+    # One shot tests
+    def test_get_put(self):
+        """
+        A stored value is returned for its key only
+        """
+        cache = MapCache()
+        cache.put(('home.html', 168, 1), ('<html>', '{}'))
+        self.assertEqual(cache.get(('home.html', 168, 1)), ('<html>', '{}'))
+        self.assertIsNone(cache.get(('home.html', 168, 2)))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_lru_eviction(self):
+        """
+        The least recently used entry is evicted
+        once the cache is full
+        """
+        cache = MapCache(max_size=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_expiry(self):
+        """
+        Entries are dropped once their expiry time has passed
+        """
+        cache = MapCache()
+        cache.put('past', 1, expires_at=datetime.now() - timedelta(seconds=1))
+        cache.put('future', 2, expires_at=datetime.now() + timedelta(hours=1))
+        self.assertIsNone(cache.get('past'))
+        self.assertEqual(cache.get('future'), 2)
+
+    def test_invalidate(self):
+        """
+        invalidate drops every entry
+        """
+        cache = MapCache()
+        cache.put('a', 1)
+        cache.invalidate()
+        self.assertEqual(len(cache), 0)
+        self.assertIsNone(cache.get('a'))
+
+    # Edge case tests
+    def test_max_size(self):
+        """
+        max_size must be a positive integer
+        """
+        for max_size in [0, -1, 1.5, '2']:
+            with self.assertRaises(ValueError):
+                MapCache(max_size=max_size)
+
+if __name__ == '__main__':
+    unittest.main()
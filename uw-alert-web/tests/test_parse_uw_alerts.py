@@ -1,9 +1,16 @@
 """
 Tests for parse_uw_alerts.py
 """
+import contextlib
 import os
+import shutil
+import tempfile
 import unittest
+from unittest import mock
+import googlemaps
+import openai
 import pandas as pd
+import pandas.testing as pdt
 #pylint: disable=import-error
 #pylint: disable=no-name-in-module
 #pylint: disable=pointless-string-statement
@@ -12,9 +19,27 @@ from parse_uw_alerts.parse_uw_alerts import (
     generate_ids,
     parse_txt_data,
     clean_gpt_output,
+    clean_new_alerts,
     generate_csv,
     scrape_uw_alerts
 )
+from parse_uw_alerts.geocode_cache import GeocodeCache, make_gmaps_client
+from parse_uw_alerts.rate_limiter import RateLimiter
+from parse_uw_alerts.standin_services import StandInServer, load_completions, \
+    load_geocodes
+
+@contextlib.contextmanager
+def standin_openai(geocodes=None):
+    """
+    Points openai at a stand-in server answering with the canned
+    completions, and geocodes if given, with the caches off.
+    """
+    with StandInServer(load_completions(), geocodes or {}) as server, \
+            mock.patch.object(openai, 'api_base', server.openai_api_base), \
+            mock.patch.object(openai, 'api_key', 'sk-standin'), \
+            mock.patch('parse_uw_alerts.parse_uw_alerts.get_llm_cache', return_value=None), \
+            mock.patch('parse_uw_alerts.parse_uw_alerts.get_geocode_cache', return_value=None):
+        yield server
 
 class TestParseUWAlertsPromptGPT(unittest.TestCase):
     """
@@ -46,25 +71,18 @@ class TestParseUWAlertsPromptGPT(unittest.TestCase):
         """Test for first item in lines containing a date"""
         with self.assertRaises(ValueError):
             prompt_gpt(['not a date\n', 'alert'])
-    """
-    The test below is commented out because it requires
-    API keys. Github's build tests fail because our project
-    gitignores the .env containing the API keys.
-    When running coverage locally with the following test
-    included, we obtain an overall coverage of 92%.
-    """
-    # def test_prompt_gpt_test_output(self):
-    #     """Test GPT output"""
-    #     load_dotenv('../.env')
-    #     openai.api_key = os.getenv('OPENAI_API_KEY')
-    #     test_prompt = ['March 9, 2023\n', 'UPDATE at 8:47pm: Random alert.']
-    #     expected_result = pd.DataFrame({
-    #         'Date': ['03/09/2023'],
-    #         'Alert Type': ['Update']
-    #     })
-    #     gpt_table = prompt_gpt(test_prompt)
-    #     pdt.assert_frame_equal(gpt_table[['Date', 'Alert Type']],
-    #                            expected_result)
+    def test_prompt_gpt_test_output(self):
+        """Test GPT output from the stand-in OpenAI server"""
+        test_prompt = ['March 9, 2023\n', 'UPDATE at 8:47pm: Random alert.']
+        expected_result = pd.DataFrame({
+            'Date': ['03/09/2023'],
+            'Alert Type': ['Update']
+        })
+        with standin_openai() as server:
+            gpt_table = prompt_gpt(test_prompt)
+        pdt.assert_frame_equal(gpt_table[['Date', 'Alert Type']],
+                               expected_result)
+        self.assertEqual(server.stats['completions'], 1)
 
 class TestParseUWAlertsGenerateIds(unittest.TestCase):
     """
@@ -117,36 +135,43 @@ class TestParseUWAlertsGenerateIds(unittest.TestCase):
                          gpt_table=pd.DataFrame({'Test': [1]}),
                          alert_type='Update',
                          parsing='yes')
-    """
-    The test below is commented out because it requires
-    API keys. Github's build tests fail because our project
-    gitignores the .env containing the API keys.
-    When running coverage locally with the following test
-    included, we obtain an overall coverage of 92%.
-    """
-    # def test_gen_id_output(self):
-    #     """Test for generate_ids output"""
-    #     dirname = os.path.dirname(__file__)
-    #     file_path = os.path.join(dirname, "../../data/uw_alerts_gpt.csv")
-    #     gpt_table = pd.DataFrame({
-    #         'Alert Type': ['Original']
-    #     })
-    #     clean_file = pd.read_csv(file_path, index_col=False)
-    #     max_alert_id = max(clean_file['Alert ID'].values)
-    #     max_incident_id = max(clean_file['Incident ID'].values)
-    #     expected_output = pd.DataFrame({
-    #         'Alert ID': [max_alert_id+1],
-    #         'Incident ID': [max_incident_id+1]
-    #     })
-    #     gen_id_output = generate_ids(uw_alert_file=file_path,
-    #                                  gpt_table=gpt_table,
-    #                                  alert_type=gpt_table[
-    #         'Alert Type'].values[0],
-    #                                  parsing=False)
-    #     gen_id_output = gen_id_output[['Alert ID',
-    #                                    'Incident ID']]
-    #     pdt.assert_frame_equal(gen_id_output.reset_index(drop=True),
-    #                            expected_output.reset_index(drop=True))
+    def test_gen_id_output(self):
+        """Test for generate_ids output"""
+        dirname = os.path.dirname(__file__)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'uw_alerts_gpt.csv')
+            shutil.copyfile(os.path.join(dirname, "../../data/uw_alerts_gpt.csv"), file_path)
+            clean_file = pd.read_csv(file_path, index_col=False)
+            max_alert_id = max(clean_file['Alert ID'].values)
+            max_incident_id = max(clean_file['Incident ID'].values)
+            gen_id_output = generate_ids(uw_alert_file=file_path,
+                                         gpt_table=pd.DataFrame({'Alert Type': ['Original']}),
+                                         alert_type='Original')
+            # Later allocations only read the persisted counters
+            with mock.patch('parse_uw_alerts.parse_uw_alerts.pd.read_csv',
+                            side_effect=AssertionError('read the data')):
+                update_output = generate_ids(uw_alert_file=file_path,
+                                             gpt_table=pd.DataFrame({'Alert Type': ['Update']}),
+                                             alert_type='Update')
+            # Data rewritten by something else seeds the counters again
+            clean_file.assign(**{'Alert ID': clean_file['Alert ID'] + 100}).to_csv(
+                file_path, index=False)
+            rewritten_output = generate_ids(uw_alert_file=file_path,
+                                            gpt_table=pd.DataFrame({'Alert Type': ['Update']}),
+                                            alert_type='Update')
+        self.assertEqual(gen_id_output[['Alert ID', 'Incident ID']].values.tolist(),
+                         [[max_alert_id + 1, max_incident_id + 1]])
+        self.assertEqual(update_output[['Alert ID', 'Incident ID']].values.tolist(),
+                         [[max_alert_id + 2, max_incident_id + 1]])
+        self.assertEqual(rewritten_output['Alert ID'].values[0], max_alert_id + 101)
+    def test_gen_id_dataframe_output(self):
+        """Test for generate_ids output from a DataFrame without an allocator"""
+        uw_alerts = pd.DataFrame({'Alert Type': ['Update', 'Original'],
+                                  'Incident ID': [4, 4], 'Alert ID': [9, 8]})
+        gen_id_output = generate_ids(uw_alerts, pd.DataFrame({'Alert Type': ['Update']}),
+                                     alert_type='Update')
+        self.assertEqual(gen_id_output[['Alert ID', 'Incident ID']].values.tolist(),
+                         [[10, 4]])
 
 class TestParseUWAlertsGenerateCSV(unittest.TestCase):
     """
@@ -172,24 +197,19 @@ class TestParseUWAlertsGenerateCSV(unittest.TestCase):
         with self.assertRaises(ValueError):
             generate_csv(out_filepath='../data/uw_alerts_gpt.csv',
                          lines=[])
-    """
-    The test below is commented out because it requires
-    API keys. Github's build tests fail because our project
-    gitignores the .env containing the API keys.
-    When running coverage locally with the following test
-    included, we obtain an overall coverage of 92%.
-    """
-    # def test_gen_csv_list_length(self):
-    #     """Test for generate_csv output"""
-    #     load_dotenv('../.env')
-    #     openai.api_key = os.getenv('OPENAI_API_KEY')
-    #     text_txt = '../data/UW_Alerts_TEST.txt'
-    #     out_filepath = '../data/uw_alerts_gpt_TEST.csv'
-    #     with open(text_txt, encoding='UTF-8') as file:
-    #         lines = file.readlines()
-    #     test_output = generate_csv(out_filepath=out_filepath,
-    #                                lines=lines)
-    #     self.assertEqual(test_output, 'CSV generated')
+    def test_gen_csv_output(self):
+        """Test for generate_csv output from the stand-in OpenAI server"""
+        with open('../data/UW_Alerts_TEST.txt', encoding='UTF-8') as file:
+            lines = file.readlines()
+        with tempfile.TemporaryDirectory() as tmp_dir, standin_openai():
+            out_filepath = os.path.join(tmp_dir, 'uw_alerts_gpt_TEST.csv')
+            shutil.copyfile('../data/uw_alerts_gpt_TEST.csv', out_filepath)
+            test_output = generate_csv(out_filepath=out_filepath,
+                                       lines=lines)
+            gpt_data = pd.read_csv(out_filepath, index_col=False)
+        self.assertEqual(test_output, 'CSV generated')
+        self.assertEqual(gpt_data['Alert ID'].tolist(), [1, 2])
+        self.assertEqual(gpt_data['Incident Category'].tolist(), ['Stabbing'] * 2)
 
 class TestParseUWAlertsParseTxtData(unittest.TestCase):
     """
@@ -227,22 +247,17 @@ class TestParseUWAlertsParseTxtData(unittest.TestCase):
             parse_txt_data(filepath='../data/UW_Alerts_2018_2022.txt',
                            out_filepath='../data/uw_alerts_gpt.csv',
                            file_start=-1)
-    """
-    The test below is commented out because it requires
-    API keys. Github's build tests fail because our project
-    gitignores the .env containing the API keys.
-    When running coverage locally with the following test
-    included, we obtain an overall coverage of 92%.
-    """
-    # def test_txt_file_output(self):
-    #     """Test for parse_txt_data output"""
-    #     load_dotenv('../.env')
-    #     openai.api_key = os.getenv('OPENAI_API_KEY')
-    #     filepath = '../data/UW_Alerts_TEST.txt'
-    #     out_filepath = '../data/uw_alerts_gpt_TEST.csv'
-    #     test_output = parse_txt_data(filepath=filepath,
-    #                                  out_filepath=out_filepath)
-    #     self.assertEqual(test_output, 'Parsing complete')
+    def test_txt_file_output(self):
+        """Test for parse_txt_data output from the stand-in OpenAI server"""
+        with tempfile.TemporaryDirectory() as tmp_dir, standin_openai():
+            out_filepath = os.path.join(tmp_dir, 'uw_alerts_gpt_TEST.csv')
+            test_output = parse_txt_data(filepath='../data/UW_Alerts_TEST.txt',
+                                         out_filepath=out_filepath)
+            gpt_data = pd.read_csv(out_filepath, index_col=False)
+        self.assertEqual(test_output, 'Parsing complete')
+        expected = pd.read_csv('../data/uw_alerts_gpt_TEST.csv', index_col=False)
+        self.assertEqual(gpt_data['Nearest Address to Incident'].tolist(),
+                         expected['Nearest Address to Incident'].tolist())
 
 class TestParseUWAlertsCleanGPTOutput(unittest.TestCase):
     """
@@ -297,6 +312,60 @@ class TestParseUWAlertsCleanGPTOutput(unittest.TestCase):
     #     with self.assertRaises(ValueError):
     #         clean_gpt_output(gpt_output=[1,2,3], gmaps_client=gmaps)
 
+class TestParseUWAlertsCleanNewAlerts(unittest.TestCase):
+    """
+    Test methods for clean_new_alerts function.
+    """
+    def setUp(self):
+        dirname = os.path.dirname(__file__)
+        self.uw_alerts = pd.read_csv(
+            os.path.join(dirname, '../../data/uw_alerts_clean.csv'), index_col=False)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.geocoded = []
+        def geocode(address):
+            self.geocoded.append(address)
+            return [{'formatted_address': address,
+                     'geometry': {'location': {'lat': 47.66, 'lng': -122.31}}}]
+        self.gmaps = googlemaps.Client(key='AIzaTestKey')
+        self.gmaps.geocode = geocode
+        # an update of the newest incident missing its time and address
+        self.new_alerts = generate_ids(self.uw_alerts, pd.DataFrame({
+            'Date': ['nan'], 'Report Time': ['nan'], 'Incident Time': ['nan'],
+            'Nearest Address to Incident': [float('nan')], 'Incident Category': ['Stabbing'],
+            'Incident Summary': ['Suspect in custody.'],
+            'Incident Alert': ['UPDATE at 9:30pm: Suspect in custody.'],
+            'Alert Type': ['Update']}), 'Update')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def clean(self, function, *args):
+        """Runs a cleaning function with the fake geocoder"""
+        cache = GeocodeCache(os.path.join(self.tmp_dir, function.__name__ + '.sqlite'))
+        return function(*args, gmaps_client=self.gmaps, rate_limiter=RateLimiter(),
+                        geocode_cache=cache)
+
+    def test_same_as_full_clean(self):
+        """Test that new alerts are cleaned as in the whole dataset"""
+        incremental = self.clean(clean_new_alerts, self.new_alerts, self.uw_alerts)
+        n_full = len(self.geocoded)
+        full = self.clean(clean_gpt_output,
+                          pd.concat([self.new_alerts, self.uw_alerts], ignore_index=True))
+        self.assertEqual(n_full, 1)
+        self.assertGreater(len(self.geocoded), n_full + 10)
+        pdt.assert_frame_equal(incremental, full.iloc[:1][incremental.columns])
+        self.assertEqual(incremental['Nearest Address to Incident'].values[0],
+                         'Padelford Garage')
+        self.assertEqual(str(incremental['Report Time'].values[0]), '20:47:00')
+        self.assertEqual(incremental['Incident ID'].values[0], 98)
+
+    def test_new_alerts_df(self):
+        """Test for requiring new alerts"""
+        with self.assertRaises(ValueError):
+            clean_new_alerts(self.new_alerts.iloc[:0], self.uw_alerts, gmaps_client=self.gmaps)
+        with self.assertRaises(ValueError):
+            clean_new_alerts(self.new_alerts, 'uw_alerts.csv', gmaps_client=self.gmaps)
+
 class TestParseUWAlertsScrapeUWAlerts(unittest.TestCase):
     """
     Test methods for scrape_uw_alerts function.
@@ -309,26 +378,27 @@ class TestParseUWAlertsScrapeUWAlerts(unittest.TestCase):
         """Test for requiring string filepath"""
         with self.assertRaises(ValueError):
             scrape_uw_alerts(uw_alert_filepath=1)
-    """
-    The test below is commented out because it requires
-    API keys. Github's build tests fail because our project
-    gitignores the .env containing the API keys.
-    When running coverage locally with the following test
-    included, we obtain an overall coverage of 92%.
-    """
-    # def test_scrape_uw_alerts_output(self):
-    #     """Test for scrape_uw_alerts output"""
-    #     dirname = os.path.dirname(__file__)
-    #     file_path = os.path.join(dirname,
-    #                              "../../data/uw_alerts_clean_TEST.csv")
-    #     scrape_output = scrape_uw_alerts(uw_alert_filepath=file_path)
-    #     clean_test_file = pd.read_csv(file_path, index_col=False)
-    #     clean_test_file = clean_test_file.head(1)
-    #     try:
-    #         self.assertEqual(scrape_output, None)
-    #     except AssertionError:
-    #         pdt.assert_frame_equal(scrape_output.reset_index(drop=True),
-    #                                clean_test_file.reset_index(drop=True))
+    def test_scrape_uw_alerts_output(self):
+        """Test for scrape_uw_alerts output from the stand-in servers"""
+        page_content = ('<div id="main_content"><p>March 10, 2023</p>'
+                        '<p>ORIGINAL POST at 9:15 a.m.: Police activity at Padelford'
+                        ' Garage. Avoid the area.</p></div>')
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                standin_openai(load_geocodes()) as server:
+            file_path = os.path.join(tmp_dir, 'uw_alerts_clean_TEST.csv')
+            shutil.copyfile('../data/uw_alerts_clean_TEST.csv', file_path)
+            gmaps_client = make_gmaps_client('AIza-standin', base_url=server.url)
+            scrape_output = scrape_uw_alerts(uw_alert_filepath=file_path,
+                                             page_content=page_content,
+                                             gmaps_client=gmaps_client)
+            clean_test_file = pd.read_csv(file_path, index_col=False)
+            self.assertIsNone(scrape_uw_alerts(uw_alert_filepath=file_path,
+                                               page_content=page_content,
+                                               gmaps_client=gmaps_client))
+        self.assertEqual(scrape_output[['Alert ID', 'Incident ID']].values.tolist(),
+                         [[267, 99]])
+        self.assertEqual(scrape_output['Google Address'].values[0], 'Seattle, WA 98105, USA')
+        self.assertEqual(len(clean_test_file.index), 3)
 
 if __name__ == '__main__':
     unittest.main()
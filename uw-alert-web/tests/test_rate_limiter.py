@@ -0,0 +1,146 @@
+"""
+Tests for rate_limiter.py
+"""
+import threading
+import time
+import unittest
+#pylint: disable=import-error
+from parse_uw_alerts.rate_limiter import TokenBucket, RateLimiter, is_retryable, \
+    get_rate_limiter
+
+class FakeClock:
+    """Clock advanced only by its sleep method"""
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def clock(self):
+        """Returns the fake time"""
+        return self.now
+
+    def sleep(self, seconds):
+        """Advances the fake time"""
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+class APIError(Exception):
+    """Error shaped like the openai errors"""
+    def __init__(self, http_status, headers=None):
+        super().__init__(f"status {http_status}")
+        self.http_status = http_status
+        self.headers = headers or {}
+
+class TestTokenBucket(unittest.TestCase):
+    """
+    Test methods for TokenBucket class.
+    """
+    def test_rate(self):
+        """Test that requests beyond the burst wait for new tokens"""
+        fake = FakeClock()
+        bucket = TokenBucket(2, clock=fake.clock, sleep=fake.sleep)
+        for _ in range(6):
+            bucket.acquire()
+        # 2 tokens of burst, then one every half second
+        self.assertAlmostEqual(fake.now, 2.0)
+
+    def test_large_amount(self):
+        """Test that amounts above the capacity wait for a full bucket"""
+        fake = FakeClock()
+        bucket = TokenBucket(10, capacity=100, clock=fake.clock, sleep=fake.sleep)
+        self.assertEqual(bucket.acquire(500), 0)
+        self.assertAlmostEqual(bucket.acquire(50), 5.0)
+
+    def test_threads(self):
+        """Test that concurrent threads share the rate"""
+        bucket = TokenBucket(200, capacity=1)
+        start = time.monotonic()
+        threads = [threading.Thread(target=lambda: [bucket.acquire() for _ in range(10)])
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # 40 tokens at 200/s after one token of burst
+        self.assertGreaterEqual(time.monotonic() - start, 39 / 200 * 0.9)
+
+    def test_invalid_rate(self):
+        """Test for requiring a positive rate"""
+        with self.assertRaises(ValueError):
+            TokenBucket(0)
+
+class TestIsRetryable(unittest.TestCase):
+    """
+    Test methods for is_retryable function.
+    """
+    def test_statuses(self):
+        """Test that 429 and 5xx are retried, other errors are not"""
+        self.assertTrue(is_retryable(APIError(429)))
+        self.assertTrue(is_retryable(APIError(503)))
+        self.assertFalse(is_retryable(APIError(400)))
+        self.assertFalse(is_retryable(ValueError('bad input')))
+
+class TestRateLimiter(unittest.TestCase):
+    """
+    Test methods for RateLimiter class.
+    """
+    def test_retries_with_backoff(self):
+        """Test that retryable errors are retried with growing delays"""
+        fake = FakeClock()
+        limiter = RateLimiter(max_retries=3, base_delay=1, sleep=fake.sleep)
+        errors = [APIError(429), APIError(500), APIError(502)]
+        def flaky():
+            if errors:
+                raise errors.pop(0)
+            return 'ok'
+        self.assertEqual(limiter.call(flaky), 'ok')
+        self.assertEqual(limiter.stats['retries'], 3)
+        self.assertEqual(len(fake.sleeps), 3)
+        for attempt, delay in enumerate(fake.sleeps):
+            self.assertGreaterEqual(delay, 2 ** attempt / 2)
+            self.assertLessEqual(delay, 2 ** attempt)
+
+    def test_gives_up(self):
+        """Test that errors are raised after max_retries or when not retryable"""
+        fake = FakeClock()
+        limiter = RateLimiter(max_retries=2, sleep=fake.sleep)
+        def always_limited():
+            raise APIError(429)
+        with self.assertRaises(APIError):
+            limiter.call(always_limited)
+        self.assertEqual(limiter.stats['calls'], 3)
+        def bad_request():
+            raise APIError(400)
+        with self.assertRaises(APIError):
+            limiter.call(bad_request)
+        self.assertEqual(limiter.stats['calls'], 4)
+
+    def test_retry_after(self):
+        """Test that the Retry-After header is honored"""
+        fake = FakeClock()
+        limiter = RateLimiter(base_delay=0.1, sleep=fake.sleep)
+        errors = [APIError(429, {'Retry-After': '7'})]
+        def limited():
+            if errors:
+                raise errors.pop()
+            return 'ok'
+        limiter.call(limited)
+        self.assertEqual(fake.sleeps, [7.0])
+
+    def test_tokens_per_minute(self):
+        """Test that calls wait for their tokens"""
+        fake = FakeClock()
+        limiter = RateLimiter(tokens_per_minute=6000, clock=fake.clock, sleep=fake.sleep)
+        limiter.call(len, 'a', tokens=6000)
+        self.assertEqual(fake.sleeps, [])
+        limiter.call(len, 'a', tokens=3000)
+        self.assertEqual(fake.sleeps, [30.0])
+
+    def test_shared_limiter(self):
+        """Test that the service limiters are process-wide"""
+        self.assertIs(get_rate_limiter('openai'), get_rate_limiter('openai'))
+        self.assertIsNotNone(get_rate_limiter('openai').token_bucket)
+        with self.assertRaises(ValueError):
+            get_rate_limiter('bing')
+
+if __name__ == '__main__':
+    unittest.main()
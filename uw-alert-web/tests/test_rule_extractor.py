@@ -0,0 +1,114 @@
+"""
+Tests for rule_extractor.py
+"""
+import unittest
+from unittest import mock
+#pylint: disable=import-error
+from parse_uw_alerts.rule_extractor import extract_alert, find_address, \
+    find_category, GPT_COLUMNS
+from parse_uw_alerts.parse_uw_alerts import prompt_gpt
+
+ROBBERY = ['October 27, 2022\n', '\n',
+           'ORIGINAL POST at 8:50 p.m.: Attempted armed robbery at business at'
+           ' 1400 block of NE 42nd St. at 8:35pm. Avoid area. Info: alert.uw.edu\n']
+UPDATE = ['October 27, 2022\n',
+          'UPDATE at 9:02 p.m. Seattle Police investigation is still ongoing and'
+          ' the suspect has not been found. Updates provided here as available.\n']
+SINGLE = ('| Date | Report Time | Incident Time | Nearest Address to Incident |'
+          ' Incident Category | Incident Summary |\n|---|---|---|---|---|---|\n'
+          '| 03/05/2019 | 8:50 PM | | | Robbery | Attempted robbery |\n')
+NARRATIVE = ['October 20, 2022\n', 'October 20, 2022\n',
+             'TEST of UW Alert system today; info on Great ShakeOut 2022\n',
+             'The UW Alert notification system will be tested on Thursday.\n']
+
+class TestExtractAlert(unittest.TestCase):
+    """
+    Test methods for extract_alert function.
+    """
+    def test_original(self):
+        """Test that a routine alert is read with full confidence"""
+        table, confidence = extract_alert(ROBBERY)
+        self.assertEqual(list(table.columns), GPT_COLUMNS)
+        self.assertEqual(table.iloc[0].tolist()[:5],
+                         ['10/27/2022', '8:50 PM', '8:35 PM', '1400 block of NE 42nd St',
+                          'Attempted Robbery'])
+        self.assertEqual(table['Incident Summary'].values[0],
+                         'Attempted armed robbery at business at'
+                         ' 1400 block of NE 42nd St. at 8:35pm.')
+        self.assertEqual(confidence, 1.0)
+
+    def test_update(self):
+        """Test that updates without a location are still confident"""
+        table, confidence = extract_alert(UPDATE)
+        self.assertEqual(table['Report Time'].values[0], '9:02 PM')
+        self.assertEqual(table['Nearest Address to Incident'].values[0], '')
+        self.assertEqual(table['Incident Category'].values[0], 'Police Investigation')
+        self.assertEqual(confidence, 0.9)
+
+    def test_low_confidence(self):
+        """Test that alerts without the alert header score low"""
+        _, confidence = extract_alert(NARRATIVE)
+        self.assertLessEqual(confidence, 0.5)
+        _, confidence = extract_alert([ROBBERY[0], ROBBERY[2] + 'Details. ' * 100])
+        self.assertLessEqual(confidence, 0.5)
+
+    def test_date(self):
+        """Test for requiring a date line"""
+        with self.assertRaises(ValueError):
+            extract_alert(['UPDATE at 9:02 p.m.\n'])
+
+    def test_abbreviated_date(self):
+        """Test that abbreviated months are read and unknown ones score 0"""
+        for date_line, date in [('Jan 5, 2019\n', '01/05/2019'),
+                                ('Sept 5, 2019\n', '09/05/2019')]:
+            table, confidence = extract_alert([date_line] + ROBBERY[1:])
+            self.assertEqual(table['Date'].values[0], date)
+            self.assertEqual(confidence, 1.0)
+        _, confidence = extract_alert(['Smarch 5, 2019\n'] + ROBBERY[1:])
+        self.assertEqual(confidence, 0)
+
+class TestFindAddress(unittest.TestCase):
+    """
+    Test methods for find_address and find_category functions.
+    """
+    def test_addresses(self):
+        """Test blocks, intersections and landmarks"""
+        self.assertEqual(find_address('Shots fired near NE 43rd St. and University Way NE.'),
+                         'NE 43rd St. and University Way NE')
+        self.assertEqual(find_address('A fire at Stevens Court this morning'),
+                         'Stevens Court')
+        self.assertEqual(find_address('Power is out on campus'), '')
+
+    def test_categories(self):
+        """Test that specific categories win over general ones"""
+        self.assertEqual(find_category('Seattle Fire Department responded to a'
+                                       ' shooting'), 'Shooting')
+        self.assertEqual(find_category('Shots were fired'), 'Shots Fired')
+        self.assertEqual(find_category('Robbery, the suspect had a gun'), 'Armed Robbery')
+        self.assertEqual(find_category('Classes are canceled'), '')
+
+class TestPromptGPTFastPath(unittest.TestCase):
+    """
+    Test methods for prompt_gpt with the rule-based fast path.
+    """
+    @mock.patch('parse_uw_alerts.parse_uw_alerts.get_llm_cache', return_value=None)
+    @mock.patch('parse_uw_alerts.parse_uw_alerts.openai.Completion.create')
+    def test_fast_path(self, create, _):
+        """Test that confident alerts do not call OpenAI"""
+        gpt_table, alert_type = prompt_gpt(ROBBERY, return_alert_type=True)
+        create.assert_not_called()
+        self.assertEqual(alert_type, 'Original')
+        self.assertEqual(gpt_table['Nearest Address to Incident'].values[0],
+                         '1400 block of NE 42nd St')
+        self.assertEqual(gpt_table.attrs['extraction'], {'method': 'rules', 'confidence': 1.0})
+
+    @mock.patch('parse_uw_alerts.parse_uw_alerts.get_llm_cache', return_value=None)
+    @mock.patch('parse_uw_alerts.parse_uw_alerts.request_completion', return_value=SINGLE)
+    def test_unknown_date(self, request, _):
+        """Test that alerts with a date the rules cannot read go to GPT"""
+        gpt_table = prompt_gpt(['Smarch 5, 2019\n'] + ROBBERY[1:])
+        request.assert_called_once()
+        self.assertEqual(gpt_table.attrs['extraction']['method'], 'gpt')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+"""
+Tests for segmenter.py
+"""
+import io
+import os
+import unittest
+#pylint: disable=import-error
+from parse_uw_alerts.segmenter import iter_alert_chunks, UPDATE_PATTERN, ORIGINAL_PATTERN
+
+ARCHIVE = ('March 9, 2023\n'
+           'UPDATE at 9pm: suspect found\n'
+           '\n'
+           'Original post: robbery reported\n'
+           '\n'
+           'March 8, 2023\n'
+           'Police activity near campus\n')
+
+class TestIterAlertChunks(unittest.TestCase):
+    """
+    Test methods for iter_alert_chunks function.
+    """
+    def test_chunks(self):
+        """Test that updates, original posts and days become separate chunks"""
+        chunks = list(iter_alert_chunks(io.StringIO(ARCHIVE)))
+        self.assertEqual(chunks, [
+            ('March 9, 2023\n', ['UPDATE at 9pm: suspect found\n', '\n'], 1),
+            ('March 9, 2023\n', ['Original post: robbery reported\n', '\n'], 3),
+            ('March 8, 2023\n', ['March 8, 2023\n', 'Police activity near campus\n'], 5)])
+
+    def test_file_start(self):
+        """Test that lines before file_start are skipped but counted"""
+        chunks = list(iter_alert_chunks(io.StringIO(ARCHIVE), file_start=2))
+        self.assertEqual([offset for _, _, offset in chunks], [5])
+        self.assertEqual(list(iter_alert_chunks(io.StringIO('no date\nUPDATE: x\n'))), [])
+
+    def test_streaming(self):
+        """Test that chunks are yielded before the whole archive is read"""
+        read = []
+        def lines():
+            for line in ARCHIVE.splitlines(keepends=True):
+                read.append(line)
+                yield line
+        chunks = iter_alert_chunks(lines())
+        next(chunks)
+        self.assertEqual(len(read), 4)
+
+    def test_archive(self):
+        """Test that the archive chunks are ordered slices starting at each alert"""
+        dirname = os.path.dirname(__file__)
+        with open(os.path.join(dirname, '../../data/UW_Alerts_2018_2022.txt'),
+                  encoding='UTF-8') as archive:
+            lines = archive.readlines()
+        chunks = list(iter_alert_chunks(iter(lines)))
+        self.assertGreater(len(chunks), 200)
+        end = 0
+        for date_line, chunk_lines, offset in chunks:
+            self.assertGreaterEqual(offset, end)
+            self.assertEqual(chunk_lines, lines[offset:offset + len(chunk_lines)])
+            self.assertIn(date_line, lines[:offset + 1])
+            end = offset + len(chunk_lines)
+        self.assertEqual(end, len(lines))
+        offsets = {offset for _, _, offset in chunks}
+        for i, line in enumerate(lines[chunks[0][2]:], start=chunks[0][2]):
+            if UPDATE_PATTERN.match(line) or ORIGINAL_PATTERN.match(line):
+                self.assertIn(i, offsets)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+Tests for sqlite_store.py
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+import pandas as pd
+import pandas.testing as pdt
+#pylint: disable=import-error
+from alert_store.alert_store import AlertStore
+from alert_store.sqlite_store import SqliteAlertStore, migrate_csv_to_sqlite
+from visualization_manager.visualization_manager import get_urgent_incidents
+
+class TestSqliteAlertStore(unittest.TestCase):
+    """
+    Test methods for SqliteAlertStore class.
+    """
+    def setUp(self):
+        dirname = os.path.dirname(__file__)
+        self.csv_path = os.path.join(dirname, "../../data/uw_alerts_clean.csv")
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, 'uw_alerts.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_migration_matches_csv(self):
+        """Test that the migrated alerts match the csv store"""
+        store = migrate_csv_to_sqlite(self.csv_path, self.db_path)
+        csv_alerts = AlertStore(self.csv_path).get_alerts()
+        db_alerts = store.get_alerts()
+        self.assertEqual(len(db_alerts), len(csv_alerts))
+        pdt.assert_frame_equal(db_alerts[['Date', 'Report Time', 'Alert ID',
+                                          'Incident ID', 'lat', 'lng']],
+                               csv_alerts[['Date', 'Report Time', 'Alert ID',
+                                           'Incident ID', 'lat', 'lng']])
+        self.assertEqual(db_alerts['geometry'].iloc[0], csv_alerts['geometry'].iloc[0])
+
+    def test_migration_one_shot(self):
+        """Test that migrating twice does not duplicate alerts"""
+        migrate_csv_to_sqlite(self.csv_path, self.db_path)
+        store = migrate_csv_to_sqlite(self.csv_path, self.db_path)
+        self.assertEqual(len(store), len(pd.read_csv(self.csv_path)))
+
+    def test_wal_and_indexes(self):
+        """Test that the database uses WAL mode and indexes"""
+        SqliteAlertStore(self.db_path)
+        conn = sqlite3.connect(self.db_path)
+        self.assertEqual(conn.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+        indexes = {row[1] for row in conn.execute('PRAGMA index_list(alerts)')}
+        conn.close()
+        for index in ['idx_alerts_incident_id', 'idx_alerts_alert_id',
+                      'idx_alerts_report_datetime']:
+            self.assertIn(index, indexes)
+
+    def test_append_alerts(self):
+        """Test that appended alerts come first and bump the version"""
+        store = migrate_csv_to_sqlite(self.csv_path, self.db_path)
+        version = store.version
+        now = datetime.now()
+        new_alert = store.get_raw_alerts().head(1)
+        new_alert['Date'] = now.date()
+        new_alert['Report Time'] = now.time().replace(microsecond=0)
+        new_alert['Alert ID'] = 1000
+        new_alert['Incident ID'] = 500
+        store.append_alerts(new_alert)
+        self.assertEqual(store.version, version + 1)
+        alerts = store.get_alerts()
+        self.assertEqual(alerts['Alert ID'].iloc[0], 1000)
+        self.assertEqual(alerts['report_datetime'].iloc[0], pd.Timestamp(
+            datetime.combine(now.date(), now.time().replace(microsecond=0))))
+
+    def test_query_urgent_alerts(self):
+        """Test that the indexed query gives the same urgent incidents"""
+        store = migrate_csv_to_sqlite(self.csv_path, self.db_path)
+        recent = datetime.now() - timedelta(hours=2)
+        alerts = store.get_raw_alerts()
+        alerts.loc[alerts['Incident ID'] == 98, 'Date'] = recent.strftime('%m/%d/%y')
+        alerts.loc[alerts['Incident ID'] == 98, 'Report Time'] = recent.strftime('%H:%M:%S')
+        store.replace_alerts(alerts)
+        candidates = store.query_urgent_alerts(time_frame=24)
+        self.assertEqual(set(candidates['Incident ID']), {98})
+        pdt.assert_frame_equal(
+            get_urgent_incidents(candidates, time_frame=24),
+            get_urgent_incidents(store.get_alerts(), time_frame=24))
+
+    def test_db_path(self):
+        """Test for requiring a string database path"""
+        with self.assertRaises(ValueError):
+            SqliteAlertStore(1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+"""
+Tests for standin_services.py
+"""
+import unittest
+from unittest import mock
+import openai
+#pylint: disable=import-error
+from parse_uw_alerts.standin_services import StandInServer, load_completions, \
+    load_geocodes, alert_key
+from parse_uw_alerts.batch_prompt import BATCH_TASK, format_batch_alert, \
+    parse_batch_completion
+from parse_uw_alerts.geocode_cache import make_gmaps_client
+from parse_uw_alerts.parse_uw_alerts import GPT_TASK, parse_completion, \
+    request_completion
+from parse_uw_alerts.rate_limiter import RateLimiter
+
+STABBING = ('March 9, 2023\nUPDATE at 8:47pm: UWPD continues to investigate the stabbing'
+            ' near Padelford Garage. The victim, who does not appear to affiliated with the'
+            ' UW, is being transported to UW Medical Center - Montlake. No further suspect'
+            ' description has been provided and a suspect has not been located. Please'
+            ' stay vigilant. Any further updates will be provided here as they become'
+            ' available.')
+UNKNOWN = 'March 10, 2023\nORIGINAL POST at 9:15 a.m.: Shooting near Stevens Court.'
+
+class TestLoadCompletions(unittest.TestCase):
+    """
+    Test methods for load_completions and load_geocodes functions.
+    """
+    def test_completions(self):
+        """Test that stored alerts have rows in the GPT formats"""
+        completions = load_completions()
+        rows = completions[alert_key(STABBING.split('\n', 1)[1])]
+        self.assertEqual(rows[0][:5], ['03/09/2023', '08:47 PM', '', 'Padelford Garage',
+                                       'Stabbing'])
+
+    def test_geocodes(self):
+        """Test that alerts without an address give the University District"""
+        geocodes = load_geocodes()
+        self.assertEqual(geocodes[''][0]['formatted_address'],
+                         'University District, Seattle, WA, USA')
+        self.assertIn('location', geocodes['padelford garage'][0]['geometry'])
+
+class TestStandInServer(unittest.TestCase):
+    """
+    Test methods for the StandInServer class.
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.completions = load_completions()
+        cls.geocodes = load_geocodes()
+
+    def test_arguments(self):
+        """Test for requiring valid latency and error_rate"""
+        with self.assertRaises(ValueError):
+            StandInServer({}, {}, latency=-1)
+        with self.assertRaises(ValueError):
+            StandInServer({}, {}, error_rate=2)
+
+    @mock.patch.object(openai, 'api_key', 'sk-standin')
+    def test_completion(self):
+        """Test streamed and whole completions of a prompt_gpt prompt"""
+        prompt = GPT_TASK + f'Text: """\n{STABBING}"""\n'
+        with StandInServer(self.completions, {}) as server, \
+                mock.patch.object(openai, 'api_base', server.openai_api_base):
+            streamed = request_completion(prompt, RateLimiter())
+            whole = openai.Completion.create(engine='text-davinci-003', prompt=prompt,
+                                             max_tokens=500)
+        self.assertEqual(streamed.strip(), whole['choices'][0]['text'].strip())
+        self.assertEqual(parse_completion(streamed)['Incident Category'].values[0],
+                         'Stabbing')
+        self.assertEqual(server.stats['completions'], 2)
+
+    def test_unknown_alert(self):
+        """Test that alerts without canned rows are read with the rules"""
+        server = StandInServer({}, {})
+        table = parse_completion(server.completion(GPT_TASK + f'Text: """\n{UNKNOWN}"""\n'))
+        self.assertEqual(table.iloc[0][['Date', 'Report Time', 'Nearest Address to Incident',
+                                        'Incident Category']].tolist(),
+                         ['03/10/2023', '9:15 AM', 'Stevens Court', 'Shooting'])
+
+    def test_batch_completion(self):
+        """Test that batch prompts get rows tagged with the alert ids"""
+        server = StandInServer(self.completions, {})
+        prompt = BATCH_TASK + format_batch_alert(0, STABBING) + format_batch_alert(1, UNKNOWN)
+        tables = parse_batch_completion(server.completion(prompt), 2)
+        self.assertEqual(tables[0]['Incident Category'].values[0], 'Stabbing')
+        self.assertEqual(tables[1]['Incident Category'].values[0], 'Shooting')
+
+    def test_geocode(self):
+        """Test geocodes through a Google Maps Client"""
+        with StandInServer({}, self.geocodes) as server:
+            gmaps_client = make_gmaps_client('AIza-standin', base_url=server.url)
+            result = gmaps_client.geocode('Padelford Garage, University District, Seattle WA')
+        self.assertEqual(result[0]['formatted_address'], 'Seattle, WA 98105, USA')
+
+    @mock.patch.object(openai, 'api_key', 'sk-standin')
+    def test_errors(self):
+        """Test that injected errors are retried by the RateLimiter"""
+        rate_limiter = RateLimiter(sleep=lambda seconds: None)
+        prompt = GPT_TASK + f'Text: """\n{STABBING}"""\n'
+        with StandInServer(self.completions, {}, error_rate=0.5, seed=1) as server, \
+                mock.patch.object(openai, 'api_base', server.openai_api_base):
+            for _ in range(4):
+                request_completion(prompt, rate_limiter)
+        self.assertGreater(server.stats['errors'], 0)
+        self.assertEqual(server.stats['completions'], 4 + server.stats['errors'])
+        self.assertEqual(rate_limiter.stats['retries'], server.stats['errors'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+"""
+Tests for street_geocoder.py
+"""
+import unittest
+#pylint: disable=import-error
+from parse_uw_alerts.street_geocoder import normalize_street, ordinal, \
+    get_street_geocoder
+from parse_uw_alerts.geocode_cache import geocode_addresses
+
+def distance(result, lat, lng):
+    """Returns the approximate distance in meters from a result to a point"""
+    location = result[0]['geometry']['location']
+    return ((location['lat'] - lat) ** 2 + ((location['lng'] - lng) * 0.67) ** 2) ** 0.5 * 111000
+
+class TestNormalizeStreet(unittest.TestCase):
+    """
+    Test methods for normalize_street and ordinal functions.
+    """
+    def test_street_names(self):
+        """Test that alert street names take the STNAME_ORD format"""
+        self.assertEqual(normalize_street('NE 42 Street.'), 'NE 42ND ST')
+        self.assertEqual(normalize_street('U Way NE'), 'UNIVERSITY WAY NE')
+        self.assertEqual(normalize_street('17th NB Avenue NE'), '17TH AVE NE')
+        self.assertEqual(normalize_street('NE Ravenna EB BV'), 'NE RAVENNA BLVD')
+
+    def test_ordinal(self):
+        """Test ordinal suffixes"""
+        self.assertEqual([ordinal(n) for n in [1, 2, 3, 11, 12, 13, 21, 42, 45]],
+                         ['1ST', '2ND', '3RD', '11TH', '12TH', '13TH', '21ST', '42ND', '45TH'])
+
+class TestStreetGeocoder(unittest.TestCase):
+    """
+    Test methods for StreetGeocoder class.
+    """
+    def setUp(self):
+        self.geocoder = get_street_geocoder()
+
+    def test_intersection(self):
+        """Test that spellings of an intersection resolve to the same point"""
+        result = self.geocoder.geocode('NE 45th St & University Way NE')
+        self.assertEqual(result[0]['formatted_address'],
+                         'NE 45th St & University Way NE, Seattle, WA, USA')
+        self.assertLess(distance(result, 47.6613, -122.3131), 30)
+        location = result[0]['geometry']['location']
+        for address in ['University Way NE and NE 45th St.', 'NE 45th Street/U Way',
+                        'NE 45 St. and NE University Way']:
+            self.assertEqual(self.geocoder.geocode(address)[0]['geometry']['location'],
+                             location)
+
+    def test_fuzzy(self):
+        """Test that misnamed streets match but other numbers do not"""
+        result = self.geocoder.geocode('NE 47th St. & Roosevelt Ave. NE')
+        self.assertEqual(result[0]['formatted_address'],
+                         'NE 47th St & Roosevelt Way NE, Seattle, WA, USA')
+        self.assertIsNone(self.geocoder.geocode('NE 39th St & Roosevelt Way NE'))
+
+    def test_block(self):
+        """Test that block addresses are interpolated between cross streets"""
+        result = self.geocoder.geocode('4300 block of University Way NE')
+        self.assertEqual(result[0]['formatted_address'],
+                         '4300 University Way NE, Seattle, WA, USA')
+        self.assertEqual(result[0]['geometry']['location_type'], 'RANGE_INTERPOLATED')
+        self.assertLess(distance(result, 47.6597, -122.3131), 60)
+        self.assertLess(distance(self.geocoder.geocode('1400 NE 42nd'),
+                                 47.6581, -122.3133), 60)
+
+    def test_between(self):
+        """Test that 'X between A and B' is the middle of the two intersections"""
+        between = self.geocoder.geocode('NE 45th St between 17th Ave NE and 21st Ave NE')
+        west = self.geocoder.geocode('NE 45th St & 17th Ave NE')
+        east = self.geocoder.geocode('NE 45th St & 21st Ave NE')
+        self.assertAlmostEqual(between[0]['geometry']['location']['lng'],
+                               (west[0]['geometry']['location']['lng'] +
+                                east[0]['geometry']['location']['lng']) / 2)
+
+    def test_landmarks(self):
+        """Test that landmarks and lone streets are left to Google"""
+        for address in ['Padelford Garage', 'Montlake Blvd. NE', 'Unknown', '', 'nan']:
+            self.assertIsNone(self.geocoder.geocode(address))
+
+    def test_google_fallback(self):
+        """Test that only unresolved addresses are sent to Google"""
+        calls = []
+        def geocode(address):
+            calls.append(address)
+            return [{'formatted_address': address, 'geometry': {}}]
+        results = geocode_addresses(['NE 42nd St and Brooklyn Ave NE', 'Husky Stadium'],
+                                    geocode, local_geocode=self.geocoder.geocode)
+        self.assertEqual(calls, ['Husky Stadium, University District, Seattle WA'])
+        self.assertEqual(results[0][0]['source'], 'udistrict_streets')
+
+if __name__ == '__main__':
+    unittest.main()
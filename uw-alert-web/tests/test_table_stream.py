@@ -0,0 +1,88 @@
+"""
+Tests for table_stream.py
+"""
+import unittest
+from unittest import mock
+import openai
+#pylint: disable=import-error
+from parse_uw_alerts.table_stream import completion_max_tokens, read_table_stream
+from parse_uw_alerts.parse_uw_alerts import request_completion
+from parse_uw_alerts.rate_limiter import RateLimiter
+
+TABLE = ['\n| Date | Report Time | Incident Time | Nearest Address to Incident |',
+         ' Incident Category | Incident Summary |\n|---|---|---|---|---|---|\n',
+         '| 03/09/2023 | 8:47 PM | 8:30 PM | 4500 University Way NE |',
+         ' Robbery | Suspect displayed a knife |\n']
+
+def make_events(texts, finish_reason='stop', read=None):
+    """Yields streamed completion events, counting the events read"""
+    for index, text in enumerate(texts):
+        if read is not None:
+            read.append(index)
+        last = index == len(texts) - 1
+        yield {'choices': [{'text': text, 'finish_reason': finish_reason if last else None}]}
+
+class TestReadTableStream(unittest.TestCase):
+    """
+    Test methods for read_table_stream function.
+    """
+    def test_early_stop(self):
+        """Test that reading stops at the first line after the table"""
+        read = []
+        rows = []
+        completion, complete = read_table_stream(
+            make_events(TABLE + ['\nThe suspect', ' is described as', ' a man.'], read=read),
+            on_row=lambda row: rows.append((len(read), row)))
+        self.assertTrue(complete)
+        self.assertEqual(completion, ''.join(TABLE))
+        self.assertEqual(len(read), 5)
+        # The first row is handed on before the stream ends
+        self.assertEqual([count for count, _ in rows], [2, 2, 4])
+
+    def test_cut_off(self):
+        """Test that a completion cut off by max_tokens is incomplete"""
+        completion, complete = read_table_stream(make_events(TABLE[:3], 'length'))
+        self.assertFalse(complete)
+        self.assertTrue(completion.endswith('4500 University Way NE |'))
+        _, complete = read_table_stream(make_events(TABLE[:3] + [' Robbery | Knife |']))
+        self.assertTrue(complete)
+
+class TestRequestCompletion(unittest.TestCase):
+    """
+    Test methods for request_completion and completion_max_tokens functions.
+    """
+    def test_max_tokens(self):
+        """Test that max_tokens follows the prompt size within the context"""
+        self.assertEqual(completion_max_tokens(100, 4097), 178)
+        self.assertEqual(completion_max_tokens(4000, 4097), 97)
+
+    @mock.patch('parse_uw_alerts.parse_uw_alerts.openai.Completion.create')
+    def test_retry_cut_off(self, create):
+        """Test that a cut off completion is requested again with the full context"""
+        create.side_effect = [make_events(TABLE[:3], 'length'), make_events(TABLE)]
+        completion = request_completion('Extract a table', rate_limiter=RateLimiter())
+        self.assertEqual(completion, ''.join(TABLE).rstrip('\n'))
+        first, second = [call.kwargs for call in create.call_args_list]
+        self.assertTrue(first['stream'])
+        self.assertLess(first['max_tokens'], 200)
+        self.assertGreater(second['max_tokens'], 4000)
+
+    @mock.patch('parse_uw_alerts.parse_uw_alerts.openai.Completion.create')
+    def test_retry_stream_error(self, create):
+        """Test that an error in the middle of a stream retries the whole completion"""
+        def broken_events():
+            yield from make_events(TABLE[:2])
+            raise openai.error.APIConnectionError('Connection reset')
+        create.side_effect = [broken_events(), make_events(TABLE)]
+        rate_limiter = RateLimiter(sleep=lambda seconds: None)
+        rows = []
+        completion = request_completion('Extract a table', rate_limiter=rate_limiter,
+                                        on_row=rows.append)
+        self.assertEqual(completion, ''.join(TABLE).rstrip('\n'))
+        self.assertEqual(create.call_count, 2)
+        self.assertEqual(rate_limiter.stats['retries'], 1)
+        # Lines read before the error are handed on again
+        self.assertEqual(len(rows), 5)
+
+if __name__ == '__main__':
+    unittest.main()
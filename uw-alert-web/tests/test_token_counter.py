@@ -0,0 +1,100 @@
+"""
+Tests for token_counter.py
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+#pylint: disable=import-error
+from parse_uw_alerts import token_counter
+from parse_uw_alerts.token_counter import GPT2TokenCounter, approximate_token_count, \
+    count_tokens, find_gpt2_merges
+
+MERGES = "#version: 0.2\nh e\nl l\nhe ll\nhell o\nĠ w\no r\nĠw or\n"
+
+class TestGPT2TokenCounter(unittest.TestCase):
+    """
+    Test methods for GPT2TokenCounter class.
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.merges_path = os.path.join(self.tmp_dir, 'merges.txt')
+        with open(self.merges_path, 'w', encoding='utf8') as merges_file:
+            merges_file.write(MERGES)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        token_counter.load_token_counter.cache_clear()
+
+    def test_byte_pair_merges(self):
+        """Test that words are split into their merged pieces"""
+        counter = GPT2TokenCounter(self.merges_path)
+        self.assertEqual(counter.count_word('hello'), 1)
+        # Ġwor + l + d
+        self.assertEqual(counter.count_word(' world'), 3)
+        self.assertEqual(counter.count('hello world'), 4)
+        # Unknown bytes are one token each
+        self.assertEqual(counter.count('é'), 2)
+
+    def test_found_in_tokenizer_dir(self):
+        """Test that count_tokens uses merges.txt from GPT2_TOKENIZER_DIR"""
+        with mock.patch.dict(os.environ, {'GPT2_TOKENIZER_DIR': self.tmp_dir}):
+            self.assertEqual(find_gpt2_merges(), self.merges_path)
+            token_counter.load_token_counter.cache_clear()
+            self.assertEqual(count_tokens('hello world'), 4)
+            self.assertIs(token_counter.load_token_counter(),
+                          token_counter.load_token_counter())
+
+    def test_merges_path(self):
+        """Test for requiring an existing merges file"""
+        with self.assertRaises(ValueError):
+            GPT2TokenCounter(os.path.join(self.tmp_dir, 'missing.txt'))
+
+class TestCountTokens(unittest.TestCase):
+    """
+    Test methods for count_tokens and approximate_token_count functions.
+    """
+    def setUp(self):
+        self.prompt = ('Extract a markdown table from the following alert message.\n'
+                       'Text: """October 21, 2019\nUW Alert: Police are responding to '
+                       'a report of a robbery near NE 45th St & University Way NE."""')
+
+    def tearDown(self):
+        token_counter.load_token_counter.cache_clear()
+
+    def test_approximation_overestimates(self):
+        """Test that the approximation is not below the word count"""
+        words = token_counter.GPT2_PATTERN.findall(self.prompt)
+        self.assertGreaterEqual(approximate_token_count(self.prompt), len(words))
+        self.assertGreaterEqual(approximate_token_count('!!!!!!'), 2)
+        self.assertEqual(approximate_token_count(''), 0)
+
+    def test_fallback(self):
+        """Test that count_tokens approximates without merges.txt"""
+        with mock.patch.object(token_counter, 'find_gpt2_merges', return_value=None):
+            token_counter.load_token_counter.cache_clear()
+            self.assertEqual(count_tokens(self.prompt), approximate_token_count(self.prompt))
+
+    def test_without_transformers(self):
+        """Test that counting does not import transformers, in a new interpreter"""
+        script = ('import sys\n'
+                  'from parse_uw_alerts.token_counter import count_tokens\n'
+                  f'count_tokens({self.prompt!r})\n'
+                  "print('transformers' in sys.modules)\n")
+        output = subprocess.run([sys.executable, '-c', script],
+                                cwd=os.path.join(os.path.dirname(__file__), '..'),
+                                capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), 'False')
+
+    def test_string_input(self):
+        """Test for requiring a string"""
+        with self.assertRaises(ValueError):
+            count_tokens(None)
+        with self.assertRaises(ValueError):
+            approximate_token_count(1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+"""
+Tests for the import cost of uw-alert-web.py
+"""
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+# Modules of the ingestion stack, which the map pages must not import
+INGESTION_MODULES = ['openai', 'transformers', 'googlemaps',
+                     'uw-alert-web.parse_uw_alerts.parse_uw_alerts',
+                     'uw-alert-web.parse_uw_alerts.street_geocoder']
+
+# Seconds allowed for importing the app module in a fresh interpreter,
+# checked against the best of the runs. Measured at ~0.7 s; the default
+# leaves room for slow or shared runners and catches the ingestion stack
+# or the street index loading at import. UW_ALERTS_IMPORT_BUDGET sets a
+# tighter budget on a known machine.
+IMPORT_BUDGET_SECONDS = float(os.getenv('UW_ALERTS_IMPORT_BUDGET') or 5)
+
+IMPORT_SCRIPT = """
+import importlib, json, sys, time
+start = time.perf_counter()
+module = importlib.import_module('uw-alert-web.uw-alert-web')
+seconds = time.perf_counter() - start
+street_index_loaded = module.load_street_index.cache_info().currsize > 0
+client = module.app.test_client()
+status = [client.get(route).status_code for route in ['/', '/past', '/api/alerts']]
+print(json.dumps({
+    'seconds': seconds,
+    'status': status,
+    'street_index_loaded': street_index_loaded,
+    'ingestion_modules': sorted(name for name in %r if name in sys.modules),
+}))
+""" % INGESTION_MODULES
+
+def import_app():
+    """Imports the app in a new interpreter and returns its measurements"""
+    repo_dir = os.path.join(os.path.dirname(__file__), '../..')
+    env = dict(os.environ, UW_ALERTS_PRELOAD='1')
+    env.pop('UW_ALERTS_POLL_INTERVAL', None)
+    output = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT], cwd=repo_dir, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+class TestAppImport(unittest.TestCase):
+    """
+    Test methods for importing uw-alert-web.py.
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.runs = [import_app() for _ in range(2)]
+
+    def test_read_routes_skip_ingestion_stack(self):
+        """Test that map pages are served without the parser or openai, and that the
+        street index is built on first use, not at import"""
+        for run in self.runs:
+            self.assertEqual(run['status'], [200, 200, 200])
+            self.assertEqual(run['ingestion_modules'], [])
+            self.assertFalse(run['street_index_loaded'])
+
+    def test_import_budget(self):
+        """Test that the app module imports within the budget"""
+        self.assertLess(min(run['seconds'] for run in self.runs), IMPORT_BUDGET_SECONDS)
+
+if __name__ == '__main__':
+    unittest.main()
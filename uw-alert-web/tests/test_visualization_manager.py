@@ -14,9 +14,12 @@ import numpy as np
 #pylint: disable=import-error
 from visualization_manager.visualization_manager import \
     filter_geodf, \
+    filter_geodf_batch, \
     get_folium_map, \
     get_urgent_incidents, \
-    attach_marker_ids
+    get_urgent_expiry, \
+    attach_marker_ids, \
+    StreetIndex
 
 class TestGetUrgentAlerts(unittest.TestCase):
     """
@@ -175,6 +178,51 @@ class TestGetUrgentAlerts(unittest.TestCase):
         with self.assertRaises(TypeError):
             get_urgent_incidents(alerts_df=[], time_frame=4)
 
+class TestGetUrgentExpiry(unittest.TestCase):
+    """
+    Tests get_urgent_expiry method in
+    visualization_manager.py.
+    """
+    def test_oldest_urgent_alert(self):
+        """
+        The expiry is when the oldest urgent alert
+        leaves the time frame
+        """
+        now = datetime.now().replace(second=0, microsecond=0)
+        three_hours_ago = now - timedelta(hours=3)
+        one_hour_ago = now - timedelta(hours=1)
+        test_data = pd.DataFrame({
+            'Date': [one_hour_ago.strftime('%m/%d/%Y'),
+                     three_hours_ago.strftime('%m/%d/%Y'),
+                     (now - timedelta(days=3)).strftime('%m/%d/%Y')],
+            'Report Time': [one_hour_ago.strftime("%H:%M"),
+                            three_hours_ago.strftime("%H:%M"),
+                            "10:00"]
+        })
+        expiry = get_urgent_expiry(test_data, time_frame=4)
+        self.assertEqual(expiry, three_hours_ago + timedelta(hours=4))
+
+    def test_missing_report_time(self):
+        """
+        Alerts from today without a report time
+        expire at midnight
+        """
+        today = datetime.today()
+        test_data = pd.DataFrame({
+            'Date': [today.strftime('%m/%d/%Y')],
+            'Report Time': [None]
+        })
+        expiry = get_urgent_expiry(test_data, time_frame=4)
+        self.assertEqual(expiry, datetime.combine(today.date() + timedelta(days=1),
+                                                  datetime.min.time()))
+
+    def test_no_urgent_alerts(self):
+        """
+        Without urgent alerts there is nothing to expire
+        """
+        test_data = pd.DataFrame({'Date': ['1/1/20'], 'Report Time': ['10:00']})
+        self.assertIsNone(get_urgent_expiry(test_data, time_frame=4))
+
 class TestFilterGeoDF(unittest.TestCase):
     """
     Tests methods for filter_geodf function
@@ -269,6 +317,69 @@ class TestFilterGeoDF(unittest.TestCase):
                 filter_geodf(gdf, lat=point[0], lon=point[1])
 
 
+class TestFilterGeoDFBatch(unittest.TestCase):
+    """
+    Tests methods for filter_geodf_batch function
+    and StreetIndex class in visualization_manager.py
+    """
+    def setUp(self):
+        dirname = os.path.dirname(__file__)
+        file_path = os.path.join(dirname, "../../data/SeattleGISData/udistrict_streets.geojson")
+        self.gdf = gpd.read_file(file_path)
+
+    # One shot tests
+    def test_matches_filter_geodf(self):
+        """
+        The batched query should return the same streets
+        and distances as one filter_geodf call per point
+        """
+        points = [[47.657489, -122.318281],
+                  [47.660443, -122.319788],
+                  [47.66131221275655, -122.31431884850726],
+                  [10.0, 15.0]]
+        street_index = StreetIndex(self.gdf)
+        results = filter_geodf_batch(self.gdf, points, street_index=street_index)
+        self.assertEqual(len(results), len(points))
+        for point, result in zip(points, results):
+            expected = filter_geodf(self.gdf, lat=point[0], lon=point[1])
+            self.assertEqual(sorted(expected['UNITDESC']), sorted(result['UNITDESC']))
+            np.testing.assert_allclose(sorted(expected['distance']),
+                                       sorted(result['distance']))
+            self.assertTrue(result['distance'].is_monotonic_increasing)
+
+    def test_query_does_not_modify_gdf(self):
+        """
+        Querying the index should not add columns to
+        the indexed dataframe
+        """
+        street_index = StreetIndex(self.gdf)
+        street_index.query(47.657489, -122.318281)
+        self.assertNotIn('distance', self.gdf.columns)
+
+    # Edge case tests
+    def test_empty_coords(self):
+        """
+        Edge case test for a map with no alerts
+        """
+        self.assertEqual(filter_geodf_batch(self.gdf, []), [])
+
+    def test_valid_lon_lat(self):
+        """
+        Edge case test to check that invalid longitude, latitude
+        values raise a ValueError
+        """
+        with self.assertRaises(ValueError):
+            filter_geodf_batch(self.gdf, [[47.6, -122.3], [-90.4, -130]])
+
+    def test_gdf_input_type(self):
+        """
+        Edge case test to check that the index requires
+        a geopandas dataframe
+        """
+        with self.assertRaises(TypeError):
+            StreetIndex("String")
+
+
 class TestGetFoliumMap(unittest.TestCase):
     """
     Tests methods for get_folium_map function
@@ -8,22 +8,215 @@ It handles requests from the frontend to update the map with new information.
 import io
 import os
 import json
-import ast
-import pandas as pd
-import openai
-import googlemaps
-from flask import Flask, render_template, request, redirect, url_for
+import threading
+from functools import lru_cache
+from flask import Flask, render_template, request, redirect, url_for, jsonify
 from dotenv import load_dotenv
 
 # Our modules
 #pylint: disable="import-error"
 from .visualization_manager.visualization_manager import get_folium_map
 from .visualization_manager.visualization_manager import get_urgent_incidents, attach_marker_ids
-from .parse_uw_alerts import parse_uw_alerts
+from .visualization_manager.visualization_manager import get_urgent_expiry
+from .visualization_manager.visualization_manager import load_street_index, get_transformer
+from .visualization_manager.map_cache import MapCache
+from .visualization_manager.clusters import get_clustered_map, CLUSTER_MIN_ALERTS
+from .parse_uw_alerts.blog_poller import BlogPoller, poller_interval
+from .parse_uw_alerts.ingest_jobs import IngestJobQueue
+from .parse_uw_alerts.id_allocator import IdAllocator, get_id_allocator, STATE_SUFFIX
+from .alert_store.alert_store import AlertStore
+from .alert_store.sqlite_store import migrate_csv_to_sqlite
+from .alert_store.geojson import parse_alert_query, query_etag, filter_alerts
+from .alert_store.geojson import to_feature_collection
 
 app = Flask(__name__, template_folder='../templates', static_folder='../static')
 app.default_charset = 'utf-8'
 
+# Alerts are loaded once per worker and reloaded only when the data changes.
+# Setting UW_ALERTS_DB to a database path uses the SQLite backend, migrating
+# the csv into it on first use.
+ALERTS_FILEPATH = os.path.join(os.path.dirname(__file__), "../data/uw_alerts_clean.csv")
+# Incident and Alert IDs come from counters persisted next to the store,
+# shared by the threads and worker processes that ingest alerts and
+# seeded again when the stored data is rewritten
+if os.getenv('UW_ALERTS_DB'):
+    ALERT_STORE = migrate_csv_to_sqlite(ALERTS_FILEPATH, os.getenv('UW_ALERTS_DB'))
+    ID_ALLOCATOR = IdAllocator(os.getenv('UW_ALERTS_DB') + STATE_SUFFIX,
+                               fingerprint=lambda: ALERT_STORE.version)
+else:
+    ALERT_STORE = AlertStore(ALERTS_FILEPATH)
+    ID_ALLOCATOR = get_id_allocator(ALERTS_FILEPATH)
+# Rendered (map_html, marker_json) keyed by template, time_frame and data version
+MAP_CACHE = MapCache(max_size=16)
+# Serialized /api/alerts responses keyed by their ETag
+API_CACHE = MapCache(max_size=64)
+
+# The ingestion stack (openai, transformers, googlemaps) is imported on first
+# use, so workers that only serve map pages never load it.
+# pylint: disable=import-outside-toplevel
+def load_parse_uw_alerts():
+    """
+    Imports the parse_uw_alerts module on first use.
+
+    Returns
+    -------
+    parse_uw_alerts : module
+        The parse_uw_alerts module
+    """
+    from .parse_uw_alerts import parse_uw_alerts
+    return parse_uw_alerts
+
+@lru_cache(maxsize=1)
+def get_gmaps_client():
+    """
+    Loads the API keys from the .env file and creates the
+    Google Maps Client once per process.
+
+    Returns
+    -------
+    gmaps_client : googlemaps.Client
+        Client shared by the ingestion routes and the blog poller
+    """
+    import openai
+    load_dotenv(os.path.join(os.path.dirname(__file__), '../.env'))
+    openai.api_key = os.getenv('OPENAI_API_KEY')
+    return load_parse_uw_alerts().make_gmaps_client(os.getenv('GOOGLE_MAPS_API_KEY'))
+
+# Held while new alerts are cleaned against the stored incidents and
+# stored, so an update is cleaned after the alert it follows is stored
+INGEST_LOCK = threading.Lock()
+
+def ingest_blog_page(page_content):
+    """
+    Ingests a fetched emergency.uw.edu page into the alert store.
+
+    Parameters
+    ----------
+    page_content : bytes
+        html of the blog page
+
+    Returns
+    -------
+    The new alerts as a Pandas DataFrame, or None if the page
+    has no new alert
+    """
+    with INGEST_LOCK:
+        return load_parse_uw_alerts().scrape_uw_alerts(uw_alert_filepath=ALERTS_FILEPATH,
+                                                alert_store=ALERT_STORE,
+                                                page_content=page_content,
+                                                gmaps_client=get_gmaps_client(),
+                                                id_allocator=ID_ALLOCATOR)
+
+def ingest_alert_text(text):
+    """
+    Runs the prompt_gpt -> generate_ids -> clean_new_alerts pipeline
+    on alert text submitted through the demo page and stores the
+    result. Runs on the INGEST_JOBS worker threads.
+
+    Parameters
+    ----------
+    text : str
+        One or more UW Alerts as free text
+
+    Returns
+    -------
+    result : dict
+        Number of stored alerts and the new data version
+    """
+    parse_uw_alerts = load_parse_uw_alerts()
+    gmaps = get_gmaps_client()
+    buf = io.StringIO(text)
+    gpt_output = parse_uw_alerts.prompt_gpt(buf.readlines(),return_alert_type=True)
+    with INGEST_LOCK:
+        uw_alerts = ALERT_STORE.get_raw_alerts()
+        cleaned_gpt_output = parse_uw_alerts.generate_ids(
+            uw_alerts,
+            gpt_table=gpt_output[0],
+            alert_type=gpt_output[1],
+            id_allocator=ID_ALLOCATOR
+        )
+        gpt_table = parse_uw_alerts.clean_new_alerts(cleaned_gpt_output, uw_alerts,
+                                                     gmaps_client=gmaps)
+        ALERT_STORE.append_alerts(gpt_table)
+        ID_ALLOCATOR.sync()
+    MAP_CACHE.invalidate()
+    return {'alerts': len(gpt_table), 'data_version': str(ALERT_STORE.snapshot()[1])}
+
+# Alerts submitted on the demo page are ingested on a bounded thread pool.
+# Job states are written to UW_ALERTS_INGEST_DIR (default data/ingest_jobs)
+# so every worker can report them.
+INGEST_JOBS = IngestJobQueue(
+    ingest_alert_text,
+    max_workers=int(os.getenv('UW_ALERTS_INGEST_WORKERS', '2')),
+    state_dir=os.getenv('UW_ALERTS_INGEST_DIR') or
+    os.path.join(os.path.dirname(ALERTS_FILEPATH), 'ingest_jobs'))
+
+# With UW_ALERTS_POLL_INTERVAL set, the blog is polled in the background and
+# /fully_update only re-renders. The lock file keeps a single gunicorn worker polling.
+BLOG_POLLER = None
+if poller_interval() is not None:
+    BLOG_POLLER = BlogPoller(ingest_blog_page, interval=poller_interval(),
+                             lock_path=ALERTS_FILEPATH + '.poller.lock',
+                             on_update=MAP_CACHE.invalidate)
+
+def start_background_tasks():
+    """
+    Starts the blog poller. Threads do not survive a fork, so with
+    gunicorn's preload_app this runs in each worker after the fork
+    (see gunicorn.conf.py) instead of at import.
+    """
+    if BLOG_POLLER is not None:
+        BLOG_POLLER.start()
+
+def preload_assets():
+    """
+    Loads the street index, the coordinate transformer and the alerts.
+    Called in the gunicorn master when preload_app is set, so forked
+    workers share these copy-on-write instead of each loading them.
+    """
+    load_street_index()
+    get_transformer()
+    ALERT_STORE.snapshot()
+
+if not os.getenv('UW_ALERTS_PRELOAD'):
+    start_background_tasks()
+
+def render_alert_page(template, time_frame):
+    """
+    Renders `template` with the map of the alerts that are urgent
+    within `time_frame` hours. Large alert sets are drawn as clusters
+    per zoom level. The rendered map is cached until the alerts change
+    or an urgent alert crosses the time_frame boundary.
+
+    Parameters
+    ----------
+    template : str
+        Name of the html template to render
+    time_frame : int
+        The time_frame cutoff in hours passed to get_urgent_incidents
+
+    Returns
+    -------
+    HTTP response containing html content that is
+    sent to front end in flask
+    """
+    version = ALERT_STORE.snapshot()[1]
+    cache_key = (template, time_frame, version)
+    rendered = MAP_CACHE.get(cache_key)
+    if rendered is None:
+        alert_df = ALERT_STORE.query_urgent_alerts(time_frame)
+        urgent_alerts_df = get_urgent_incidents(alert_df, time_frame=time_frame)
+        if len(urgent_alerts_df) > CLUSTER_MIN_ALERTS:
+            updated_map, updated_marker_dict = get_clustered_map(urgent_alerts_df)
+        else:
+            alert_map, marker_dict = get_folium_map(urgent_alerts_df)
+            updated_map, updated_marker_dict = attach_marker_ids(alert_map, marker_dict)
+        rendered = (updated_map, json.dumps(updated_marker_dict))
+        MAP_CACHE.put(cache_key, rendered,
+                      expires_at=get_urgent_expiry(alert_df, time_frame=time_frame))
+    return render_template(template, map_html=rendered[0], alert_dict=rendered[1],
+                           data_version=str(version))
+
 @app.route('/')
 def render_home_page():
     """
@@ -36,15 +229,7 @@ def render_home_page():
     HTTP response containing html content that is
     sent to front end in flask
     """
-    # sample alerts
-    dirname = os.path.dirname(__file__)
-    filename = os.path.join(dirname, "../data/uw_alerts_clean.csv")
-    alert_df = pd.read_csv(filename, converters = {'geometry': ast.literal_eval})
-    urgent_alerts_df = get_urgent_incidents(alert_df, time_frame=24*7)
-    alert_map, marker_dict = get_folium_map(urgent_alerts_df)
-    updated_map, updated_marker_dict = attach_marker_ids(alert_map, marker_dict)
-    marker_json = json.dumps(updated_marker_dict)
-    return render_template('home.html', map_html=updated_map, alert_dict=marker_json)
+    return render_alert_page('home.html', time_frame=24*7)
 
 @app.route('/redirect_to_home', methods=['POST'])
 def redirect_to_home():
@@ -72,15 +257,7 @@ def render_demo_page():
     HTTP response containing demo page html content that is
     sent to front end in flask
     """
-    # sample alerts
-    dirname = os.path.dirname(__file__)
-    filename = os.path.join(dirname, "../data/uw_alerts_clean.csv")
-    alert_df = pd.read_csv(filename, converters = {'geometry': ast.literal_eval})
-    urgent_alerts_df = get_urgent_incidents(alert_df, time_frame=24)
-    alert_map, marker_dict = get_folium_map(urgent_alerts_df)
-    updated_map, updated_marker_dict = attach_marker_ids(alert_map, marker_dict)
-    marker_json = json.dumps(updated_marker_dict)
-    return render_template('demo.html', map_html=updated_map, alert_dict=marker_json)
+    return render_alert_page('demo.html', time_frame=24)
 
 @app.route('/past', methods=['GET'])
 def render_past_page():
@@ -94,14 +271,7 @@ def render_past_page():
     HTTP response containing past page html content that is
     sent to front end in flask
     """
-    dirname = os.path.dirname(__file__)
-    filename = os.path.join(dirname, "../data/uw_alerts_clean.csv")
-    alert_df = pd.read_csv(filename, converters = {'geometry': ast.literal_eval})
-    urgent_alerts_df = get_urgent_incidents(alert_df, time_frame=500000)
-    alert_map, marker_dict = get_folium_map(urgent_alerts_df)
-    updated_map, updated_marker_dict = attach_marker_ids(alert_map, marker_dict)
-    marker_json = json.dumps(updated_marker_dict)
-    return render_template('past.html', map_html=updated_map, alert_dict=marker_json)
+    return render_alert_page('past.html', time_frame=500000)
 
 @app.route('/about', methods=['GET'])
 def about():
@@ -115,72 +285,101 @@ def about():
     """
     return render_template('/about.html')
 
-#pylint: disable=too-many-locals
+@app.route('/api/alerts', methods=['GET'])
+def api_alerts():
+    """
+    Returns the alerts as a GeoJSON FeatureCollection, filtered by
+    the optional query parameters since, until (ISO dates or
+    datetimes), bbox (min_lng,min_lat,max_lng,max_lat) and category
+    (comma separated). Responses carry an ETag of the data version
+    and the query, so polling clients get an empty 304 until the
+    alerts change.
+
+    Returns
+    -------
+    HTTP response containing the GeoJSON FeatureCollection,
+    304 if the client's ETag is current or 400 for an invalid query
+    """
+    try:
+        query = parse_alert_query(request.args)
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+    alerts_df, version = ALERT_STORE.snapshot()
+    etag = query_etag(version, query)
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        body = API_CACHE.get(etag)
+        if body is None:
+            body = json.dumps(to_feature_collection(filter_alerts(alerts_df, **query)))
+            API_CACHE.put(etag, body)
+        response = app.response_class(body, mimetype='application/geo+json')
+    response.set_etag(etag)
+    return response
+
 @app.route('/update_map',methods=['POST'])
 def update_map():
     """
-    Takes the text input from demo page 
-    through flask and rerenders the demo page
-    with the new alerts.
+    Takes the text input from demo page through flask and
+    queues an ingestion job that adds the new alerts.
 
     Returns
     -------
-    HTTP response containing demo page html content that is
-    sent to front end in flask
+    HTTP 202 response with the job id and its status url,
+    400 without text input or 503 if too many jobs are pending
     """
-    #Parsing
-    load_dotenv('../env')
-    openai.api_key = os.getenv('OPENAI_API_KEY')
-    uw_alert_filepath='../data/uw_alerts_clean.csv'
-    uw_alerts = pd.read_csv(uw_alert_filepath,index_col=False)
-    new_data = request.form['text-input']
-    buf = io.StringIO(new_data)
-    gpt_output = parse_uw_alerts.prompt_gpt(buf.readlines(),return_alert_type=True)
-    google_maps_api_key=os.getenv('GOOGLE_MAPS_API_KEY')
-    gmaps = googlemaps.Client(key=google_maps_api_key)
-    cleaned_gpt_output = parse_uw_alerts.generate_ids(
-        uw_alert_filepath,
-        gpt_table=gpt_output[0],
-        alert_type=gpt_output[1]
-    )
-    gpt_table = parse_uw_alerts.clean_gpt_output(gpt_output = cleaned_gpt_output,gmaps_client=gmaps)
-    uw_alerts =pd.concat([gpt_table,uw_alerts],ignore_index=True)
-    uw_alerts.to_csv(uw_alert_filepath,index=False)
-    #send cleaned csv into viz manager
-    dirname = os.path.dirname(__file__)
-    filename = os.path.join(dirname, "../data/uw_alerts_clean.csv")
-    alert_df = pd.read_csv(filename, converters = {'geometry': ast.literal_eval})
-    urgent_alerts_df = get_urgent_incidents(alert_df, time_frame=24)
-    alert_map, marker_dict = get_folium_map(urgent_alerts_df)
-    updated_map, updated_marker_dict = attach_marker_ids(alert_map, marker_dict)
-    marker_json = json.dumps(updated_marker_dict)
-    return render_template('demo.html', map_html=updated_map, alert_dict=marker_json)
+    new_data = request.form.get('text-input', '')
+    if not new_data.strip():
+        return jsonify({'error': 'text-input must not be empty'}), 400
+    job_id = INGEST_JOBS.submit(new_data)
+    if job_id is None:
+        return jsonify({'error': 'too many pending ingestion jobs'}), 503
+    status_url = url_for('update_map_status', job_id=job_id)
+    return jsonify({'job_id': job_id, 'status_url': status_url}), 202, \
+        {'Location': status_url}
+
+@app.route('/update_map/<job_id>',methods=['GET'])
+def update_map_status(job_id):
+    """
+    Reports the status of an ingestion job queued by update_map.
+
+    Returns
+    -------
+    HTTP response with the job status as JSON, or 404
+    for an unknown job id
+    """
+    job = INGEST_JOBS.status(job_id)
+    if job is None:
+        return jsonify({'error': 'unknown job id'}), 404
+    return jsonify(job)
 
 @app.route('/fully_update', methods=['GET'])
 def fully_update():
     """
-    Scrape the UW Blog website and creates a folium map with 
-    new data if it exists.
+    Returns the home page if there are new alerts. When the blog
+    poller runs in the background, the alerts are only compared with
+    the `version` the page was rendered with. Otherwise the UW Blog
+    website is scraped inside the request.
 
     Returns
     -------
     Fully rendered HTML page that is sent to the
-    front end to display the updated map.
-
-    """
-    output = parse_uw_alerts.scrape_uw_alerts()
-    #pylint: disable=no-else-return
-    if output is not None:
-        dirname = os.path.dirname(__file__)
-        filename = os.path.join(dirname, "../data/uw_alerts_clean.csv")
-        alert_df = pd.read_csv(filename, converters = {'geometry': ast.literal_eval})
-        urgent_alerts_df = get_urgent_incidents(alert_df, time_frame=24*7)
-        alert_map, marker_dict = get_folium_map(urgent_alerts_df)
-        updated_map, updated_marker_dict = attach_marker_ids(alert_map, marker_dict)
-        marker_json = json.dumps(updated_marker_dict)
-        return render_template('/home.html', map_html=updated_map, alert_dict=marker_json)
-    else:
+    front end to display the updated map, or an
+    empty 300 response when there are no new alerts.
+
+    """
+    if BLOG_POLLER is None:
+        with INGEST_LOCK:
+            output = load_parse_uw_alerts().scrape_uw_alerts(uw_alert_filepath=ALERTS_FILEPATH,
+                                                             alert_store=ALERT_STORE,
+                                                             gmaps_client=get_gmaps_client(),
+                                                             id_allocator=ID_ALLOCATOR)
+        if output is None:
+            return '', 300
+        MAP_CACHE.invalidate()
+    elif request.args.get('version') == str(ALERT_STORE.snapshot()[1]):
         return '', 300
+    return render_alert_page('home.html', time_frame=24*7)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,292 @@
+"""
+Name: Alert Clusters
+What it does:
+- Groups alert coordinates into grid clusters for every zoom
+  level of the map. Cells are a fixed number of screen pixels
+  wide, so the cells of one zoom level split into four cells
+  at the next level (a quadtree over Web Mercator tiles)
+- Renders a leaflet map that draws the cluster summaries of the
+  current zoom level and expands them to individual markers
+  only once the user zooms in
+
+outputs:
+- Clustered html leaflet map for large alert sets (e.g. /past)
+"""
+import json
+import numpy as np
+import pandas as pd
+import folium
+from .visualization_manager import get_base_map
+
+# Zoom levels that get precomputed clusters. From EXPAND_ZOOM on,
+# individual markers are drawn.
+MIN_ZOOM = 10
+EXPAND_ZOOM = 17
+# Cluster cell width in screen pixels
+CELL_PIXELS = 60
+# Alert sets with more alerts than this are rendered clustered
+CLUSTER_MIN_ALERTS = 50
+
+
+def latlng_to_pixels(lats, lngs, zoom):
+    """
+    Projects coordinates to Web Mercator pixel coordinates.
+
+    Parameters
+    ----------
+    lats, lngs : array-like
+        Latitudes and longitudes in degrees
+    zoom : int
+        Leaflet zoom level (256 pixel tiles)
+
+    Returns
+    -------
+    (x, y) : tuple of np.ndarray
+        Pixel coordinates, y growing southwards as in leaflet
+    """
+    lats = np.clip(np.asarray(lats, dtype=float), -85.0511, 85.0511)
+    lngs = np.asarray(lngs, dtype=float)
+    scale = 256 * 2 ** zoom
+    x = (lngs + 180) / 360 * scale
+    sin_lat = np.sin(np.radians(lats))
+    y = (0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * np.pi)) * scale
+    return x, y
+
+
+def get_alert_coords(alert_df):
+    """
+    Returns
+    -------
+    (lats, lngs) : tuple of np.ndarray
+        Coordinates of the geometry column of `alert_df`,
+        NaN for alerts without a geocoded location
+    """
+    locations = [geometry.get('location', {}) if isinstance(geometry, dict) else {}
+                 for geometry in alert_df['geometry']]
+    lats = np.array([location.get('lat', np.nan) for location in locations], dtype=float)
+    lngs = np.array([location.get('lng', np.nan) for location in locations], dtype=float)
+    return lats, lngs
+
+
+# pylint: disable=too-many-locals
+def build_zoom_clusters(lats, lngs, min_zoom=MIN_ZOOM, max_zoom=EXPAND_ZOOM - 1,
+                        cell_pixels=CELL_PIXELS):
+    """
+    Groups points into grid cells of `cell_pixels` screen pixels
+    for each zoom level from min_zoom to max_zoom.
+
+    Parameters
+    ----------
+    lats, lngs : array-like
+        Coordinates of the alerts. NaN coordinates are skipped.
+    min_zoom, max_zoom : int
+        Range of zoom levels to cluster
+    cell_pixels : int
+        Width of a cluster cell in screen pixels
+
+    Returns
+    -------
+    zoom_clusters : dict
+        For every zoom level, a list of clusters with the keys
+            - lat, lng : centroid of the clustered points
+            - count : number of points
+            - bounds : [[south, west], [north, east]]
+            - members : positions of the points in `lats`
+    """
+    if not isinstance(cell_pixels, int) or cell_pixels <= 0:
+        raise ValueError("cell_pixels must be a positive integer")
+    if min_zoom > max_zoom:
+        raise ValueError("min_zoom must not be greater than max_zoom")
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    positions = np.flatnonzero(~(np.isnan(lats) | np.isnan(lngs)))
+    lats, lngs = lats[positions], lngs[positions]
+    x_0, y_0 = latlng_to_pixels(lats, lngs, 0)
+
+    zoom_clusters = {}
+    for zoom in range(min_zoom, max_zoom + 1):
+        cell_size = cell_pixels / 2 ** zoom
+        cells = np.column_stack([np.floor(x_0 / cell_size), np.floor(y_0 / cell_size)])
+        if len(cells) == 0:
+            zoom_clusters[zoom] = []
+            continue
+        _, labels = np.unique(cells, axis=0, return_inverse=True)
+        labels = labels.ravel()
+        counts = np.bincount(labels)
+        mean_lats = np.bincount(labels, weights=lats) / counts
+        mean_lngs = np.bincount(labels, weights=lngs) / counts
+        order = np.argsort(labels, kind='stable')
+        groups = np.split(order, np.cumsum(counts)[:-1])
+        zoom_clusters[zoom] = [{
+            'lat': float(mean_lats[label]),
+            'lng': float(mean_lngs[label]),
+            'count': int(counts[label]),
+            'bounds': [[float(lats[group].min()), float(lngs[group].min())],
+                       [float(lats[group].max()), float(lngs[group].max())]],
+            'members': positions[group].tolist(),
+        } for label, group in enumerate(groups)]
+    return zoom_clusters
+
+
+CLUSTER_SCRIPT = """
+(function() {
+    var map = %(map_id)s;
+    var zoomClusters = %(clusters)s;
+    var points = %(points)s;
+    var minZoom = %(min_zoom)d, expandZoom = %(expand_zoom)d;
+    var layer = L.layerGroup().addTo(map);
+
+    function formatTime(reportTime) {
+        if (typeof reportTime !== 'string' || reportTime.split(':').length !== 3) {
+            return '';
+        }
+        var parts = reportTime.split(':');
+        var hour = parseInt(parts[0], 10);
+        return ((hour + 11) %% 12 + 1) + ':' + parts[1] + (hour < 12 ? ' AM' : ' PM');
+    }
+
+    function showAlert(id) {
+        var alert = JSON.parse(localStorage.getItem('alertDescs'))[id];
+        var alertFrame = parent.document.getElementById('alertcontainer');
+        var html = '<h2>' + alert[0] + ' - ' + alert[3] + ' ' + formatTime(alert[1]) +
+            '</h2><br>';
+        alert[2].forEach(function(message, i) {
+            if (i > 0) {
+                html += '<div style="background-color: #2C2C2C; color: #2C2C2C; ' +
+                    'height: 2px; width: 100%%; margin: 0;"></div><br>';
+            }
+            html += '<p>' + message + '</p><br>';
+        });
+        alertFrame.innerHTML = html;
+    }
+
+    function addMarker(lat, lng, id) {
+        L.marker([lat, lng], {
+            icon: L.AwesomeMarkers.icon(
+                {icon: 'circle-exclamation', markerColor: 'red', prefix: 'fa'})
+        }).on('click', function() { showAlert(id); }).addTo(layer);
+    }
+
+    function addCluster(cluster) {
+        var size = 30 + 6 * Math.min(Math.floor(Math.log10(cluster[2])), 3);
+        L.marker([cluster[0], cluster[1]], {
+            icon: L.divIcon({
+                className: '',
+                iconSize: [size, size],
+                html: '<div style="width: ' + size + 'px; height: ' + size + 'px; ' +
+                    'line-height: ' + size + 'px; border-radius: 50%%; text-align: center; ' +
+                    'background: rgba(220, 40, 40, 0.75); color: white; ' +
+                    'font-family: sans-serif;">' + cluster[2] + '</div>'
+            })
+        }).on('click', function() {
+            if (map.getZoom() >= expandZoom - 1) {
+                map.setView([cluster[0], cluster[1]], expandZoom);
+            } else {
+                map.fitBounds(cluster[3], {maxZoom: expandZoom});
+            }
+        }).addTo(layer);
+    }
+
+    function draw() {
+        layer.clearLayers();
+        var zoom = map.getZoom();
+        var bounds = map.getBounds().pad(0.5);
+        if (zoom >= expandZoom) {
+            points.forEach(function(point) {
+                if (bounds.contains([point[0], point[1]])) {
+                    addMarker(point[0], point[1], point[2]);
+                }
+            });
+            return;
+        }
+        zoomClusters[Math.max(minZoom, zoom)].forEach(function(cluster) {
+            if (!bounds.contains([cluster[0], cluster[1]])) {
+                return;
+            }
+            if (cluster[2] === 1) {
+                addMarker(cluster[0], cluster[1], cluster[4]);
+            } else {
+                addCluster(cluster);
+            }
+        });
+    }
+
+    map.on('moveend', draw);
+    draw();
+})();
+"""
+
+
+# pylint: disable=too-many-locals
+def get_clustered_map(alert_df, min_zoom=MIN_ZOOM, expand_zoom=EXPAND_ZOOM,
+                      cell_pixels=CELL_PIXELS):
+    """
+    Given information about alerts, return a rendered html leaflet
+    map that shows clusters of the alerts below `expand_zoom` and
+    individual markers from `expand_zoom` on. Unlike get_folium_map,
+    no popup, street layer or script is generated per alert, so the
+    map stays small for the full alert history.
+
+    Parameters
+    ----------
+    alert_df : pandas DataFrame
+        Result of get_urgent_incidents. Relevant Columns:
+            - Incident Category
+            - Incident Alert
+            - Date
+            - Report Time
+            - geometry
+    min_zoom : int
+        Lowest zoom level with precomputed clusters
+    expand_zoom : int
+        Zoom level from which individual markers are drawn
+    cell_pixels : int
+        Width of a cluster cell in screen pixels
+
+    Returns
+    -------
+    m_html : str
+        A rendered html leaflet map to display on the web application.
+    alert_dict : dict
+        The alert metadata in the format of the attach_marker_ids
+        output, read by the map when a marker is clicked.
+        example:
+            alert_dict[i] = (
+                alert_categories[i], alert_report_time[i], incident_messages[i], date[i]
+        )
+    """
+    if not isinstance(alert_df, pd.DataFrame):
+        raise TypeError("alert_df must be a pandas DataFrame")
+    for col in ["Incident Category", "Incident Alert", "Date", "Report Time", "geometry"]:
+        if col not in alert_df.columns:
+            raise ValueError("""alert_df must have the following columns: Incident Category,
+                                Incident Alert, Date, Report Time, geometry""")
+    alert_map = get_base_map()
+    lats, lngs = get_alert_coords(alert_df)
+    zoom_clusters = build_zoom_clusters(lats, lngs, min_zoom=min_zoom,
+                                        max_zoom=expand_zoom - 1, cell_pixels=cell_pixels)
+    # [lat, lng, count, bounds, alert index of single alert clusters]
+    clusters = {zoom: [[cluster['lat'], cluster['lng'], cluster['count'], cluster['bounds'],
+                        cluster['members'][0]] for cluster in level]
+                for zoom, level in zoom_clusters.items()}
+    points = [[float(lats[i]), float(lngs[i]), i] for i in range(len(lats))
+              if not (np.isnan(lats[i]) or np.isnan(lngs[i]))]
+    script = CLUSTER_SCRIPT % {
+        'map_id': alert_map.get_name(),
+        'clusters': json.dumps(clusters),
+        'points': json.dumps(points),
+        'min_zoom': min_zoom,
+        'expand_zoom': expand_zoom,
+    }
+    alert_map.get_root().script.add_child(folium.Element(script))
+
+    alert_dict = {}
+    for i, values in enumerate(alert_df[['Incident Category', 'Report Time',
+                                         'Incident Alert', 'Date']].itertuples(
+                                             index=False, name=None)):
+        category, report_time, messages, date = values
+        if not isinstance(messages, (list, tuple)):
+            messages = (messages,)
+        alert_dict[str(i)] = (category, report_time if isinstance(report_time, str) else None,
+                              tuple(messages), date)
+    return alert_map.get_root().render(), alert_dict
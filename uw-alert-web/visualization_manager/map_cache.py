@@ -0,0 +1,91 @@
+"""
+Name: Map Cache
+What it does:
+- Caches rendered folium maps and their marker metadata so
+  repeated page loads do not rebuild the same map
+- Bounded in size with least-recently-used eviction
+- Entries can expire at a given time, e.g. when an alert
+  leaves the urgent time frame
+
+inputs:
+- key: hashable, e.g. (template, time_frame, dataset version)
+- value: e.g. (map_html, marker_json)
+"""
+from collections import OrderedDict
+from datetime import datetime
+import threading
+
+
+class MapCache:
+    """
+    Thread-safe LRU cache of rendered maps.
+
+    Parameters
+    ----------
+    max_size : int (default=32)
+        The maximum number of rendered maps to keep
+    """
+    def __init__(self, max_size=32):
+        if not isinstance(max_size, int) or max_size < 1:
+            raise ValueError("max_size must be an integer 1 or greater")
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Parameters
+        ----------
+        key : hashable
+            The cache key
+
+        Returns
+        -------
+        value : object
+            The cached value, or None if the key is missing
+            or its entry has expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is not None and datetime.now() >= entry[1]:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, expires_at=None):
+        """
+        Stores a value, evicting the least recently used
+        entry if the cache is full.
+
+        Parameters
+        ----------
+        key : hashable
+            The cache key
+        value : object
+            The value to cache
+        expires_at : datetime (default=None)
+            Time after which the entry is stale. None never expires.
+        """
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """
+        Drops every cached entry. Called after the alerts are written.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
@@ -15,16 +15,23 @@ outputs:
 - interactive street visualization
 """
 
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, time
+from functools import lru_cache
 import os
 import re
+import numpy as np
 import pyproj
 import folium
 from folium.plugins import HeatMap
 import pandas as pd
 import geopandas as gpd
-from shapely.geometry import Point
-from shapely.ops import nearest_points, transform
+import shapely
+from shapely import STRtree
+
+# Projected CRS (UTM zone 10N) used to measure street distances in meters
+PROJECTED_CRS = "EPSG:32610"
+UDISTRICT_STREETS_PATH = os.path.join(
+    os.path.dirname(__file__), "../../data/SeattleGISData/udistrict_streets.geojson")
 
 # pylint: disable=too-many-locals
 def get_urgent_incidents(alerts_df, time_frame):
@@ -37,7 +44,10 @@ def get_urgent_incidents(alerts_df, time_frame):
     alerts_df: pd.DataFrame
         Pandas dataframe that contains columns
         ['Incident ID', 'Alert ID', 'Date', 'Report Time'].
-        Result of reading in data/uw_alerts_clean.csv
+        Result of reading in data/uw_alerts_clean.csv.
+        If present, the parsed 'date' and 'report_datetime'
+        columns of an alert store are used instead of parsing
+        Date and Report Time again. alerts_df is not modified.
     time_frame: int
         The time_frame cutoff in hours that specifies
         the number of hours before the current time to
@@ -57,24 +67,30 @@ def get_urgent_incidents(alerts_df, time_frame):
             raise ValueError("Invalid alerts_df schema")
 
     # Step 1: Extract dataframe of alerts with Report time
-    report_times_df = alerts_df[~alerts_df['Report Time'].isna()].copy()
+    report_times_df = alerts_df[~alerts_df['Report Time'].isna()]
     # Filter by time. Remove alerts beyond time cutoff
-    report_times_df.loc[:, 'report_datetime'] = pd.to_datetime(
-        report_times_df['Date'] + \
-        ' ' + \
-        report_times_df['Report Time'])
+    # (alert stores provide the parsed report_datetime column already)
+    if 'report_datetime' in report_times_df.columns:
+        report_datetimes = report_times_df['report_datetime']
+    else:
+        report_datetimes = pd.to_datetime(
+            report_times_df['Date'] + \
+            ' ' + \
+            report_times_df['Report Time'])
     # Extracting incidents that are within the timeframe
     urgent_datetime_alerts = report_times_df[
-        report_times_df['report_datetime'] > datetime.now() - timedelta(hours=time_frame)]
+        report_datetimes > datetime.now() - timedelta(hours=time_frame)]
     incident_id_set1 = set(urgent_datetime_alerts['Incident ID'].drop_duplicates().to_list())
 
     # Step 2: Keep incidents/alerts that occured on the same day, but have no Report time
-    alerts_df['date'] = pd.to_datetime(alerts_df['Date'])
-
     # Filter by date
     # Remove alerts with no report time
     urgent_date_alerts = alerts_df[alerts_df['Report Time'].isna()]
-    today_filter = urgent_date_alerts['date'].dt.date == datetime.now().date()
+    if 'date' in urgent_date_alerts.columns:
+        alert_dates = urgent_date_alerts['date']
+    else:
+        alert_dates = pd.to_datetime(urgent_date_alerts['Date'])
+    today_filter = alert_dates.dt.date == datetime.now().date()
     urgent_date_alerts = urgent_date_alerts[today_filter]
     incident_id_set2 = set(urgent_date_alerts['Incident ID'].drop_duplicates().to_list())
 
@@ -84,8 +100,6 @@ def get_urgent_incidents(alerts_df, time_frame):
     # Step 4: Filtering original dataframe to alerts with urgent incident ids
     urgent_alerts_df = alerts_df[alerts_df['Incident ID'].isin(urgent_inc_ids)]
 
-    urgent_alerts_df = urgent_alerts_df.drop(columns='date')
-
     # No urgent alerts
     if len(urgent_alerts_df) == 0:
         return urgent_alerts_df
@@ -143,7 +157,162 @@ def get_urgent_incidents(alerts_df, time_frame):
     return merged_df
 
 
-def filter_geodf(gdf, lat, lon, max_distance=10):
+def get_urgent_expiry(alerts_df, time_frame):
+    """
+    Returns the time at which get_urgent_incidents(alerts_df, time_frame)
+    may next return a different set of incidents without alerts_df
+    changing, i.e. the earliest time an urgent alert crosses the
+    time_frame boundary or a same day alert without a Report time
+    stops being today's.
+
+    Parameters
+    ----------
+    alerts_df: pd.DataFrame
+        Same input as get_urgent_incidents
+    time_frame: int
+        The time_frame cutoff in hours
+
+    Returns
+    -------
+    expiry : datetime or None
+        The earliest boundary crossing, or None if no alert is urgent
+    """
+    if not isinstance(alerts_df, type(pd.DataFrame())):
+        raise TypeError("alerts_df must be of type pd.DataFrame")
+    now = datetime.now()
+    has_report_time = ~alerts_df['Report Time'].isna()
+    if 'report_datetime' in alerts_df.columns:
+        report_datetimes = alerts_df.loc[has_report_time, 'report_datetime']
+    else:
+        report_datetimes = pd.to_datetime(
+            alerts_df.loc[has_report_time, 'Date'] + ' ' + \
+            alerts_df.loc[has_report_time, 'Report Time'])
+    urgent_datetimes = report_datetimes[report_datetimes > now - timedelta(hours=time_frame)]
+
+    expiries = []
+    if len(urgent_datetimes) > 0:
+        expiries.append(urgent_datetimes.min().to_pydatetime() + timedelta(hours=time_frame))
+    if 'date' in alerts_df.columns:
+        alert_dates = alerts_df.loc[~has_report_time, 'date']
+    else:
+        alert_dates = pd.to_datetime(alerts_df.loc[~has_report_time, 'Date'])
+    if (alert_dates.dt.date == now.date()).any():
+        expiries.append(datetime.combine(now.date() + timedelta(days=1), time.min))
+    if len(expiries) == 0:
+        return None
+    return min(expiries)
+
+
+@lru_cache(maxsize=1)
+def get_transformer():
+    """
+    Returns the (cached) pyproj Transformer that projects
+    lon/lat coordinates (EPSG:4326) to PROJECTED_CRS.
+
+    Returns
+    -------
+    transformer : pyproj.Transformer
+        Transformer with always_xy=True, so inputs are (lon, lat)
+    """
+    return pyproj.Transformer.from_proj(
+        pyproj.Proj("EPSG:4326"),
+        pyproj.Proj(PROJECTED_CRS), always_xy=True)
+
+
+class StreetIndex:
+    """
+    Spatial index over a streets GeoDataFrame. The street
+    geometries are projected to PROJECTED_CRS once and held
+    in a shapely STRtree, so finding the streets near an alert
+    is a single indexed `dwithin` query instead of projecting
+    every street per alert.
+
+    Parameters
+    ----------
+    gdf : Geopandas dataframe
+        The geopandas dataframe with the streets
+        data geometries in lon/lat coordinates
+    """
+    def __init__(self, gdf):
+        if not isinstance(gdf, type(gpd.GeoDataFrame())):
+            raise TypeError("gdf must be a geopandas.GeoDataFrame")
+        self.gdf = gdf
+        transformer = get_transformer()
+        self.projected = shapely.transform(
+            np.asarray(gdf.geometry.values, dtype=object),
+            lambda coords: np.column_stack(
+                transformer.transform(coords[:, 0], coords[:, 1])))
+        self.tree = STRtree(self.projected)
+
+    def query(self, lat, lon, max_distance=10):
+        """
+        Returns the streets within `max_distance` meters of a
+        single point. See filter_geodf for the output format.
+        """
+        return self.query_many([(lat, lon)], max_distance=max_distance)[0]
+
+    def query_many(self, coords, max_distance=10):
+        """
+        Finds the streets near every point in `coords` with one
+        vectorized projection, STRtree query and distance call.
+
+        Parameters
+        ----------
+        coords : list of (lat, lon)
+            Points of interest, e.g. the alert coordinates of a map
+        max_distance: int (default=10)
+            The max distance of streets from each point
+            in meters
+
+        Returns
+        -------
+        gdfs : list of Geopandas dataframes
+            One filtered dataframe per point, in the order of `coords`,
+            with the same columns as the filter_geodf output.
+        """
+        coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        lats, lons = coords[:, 0], coords[:, 1]
+        if ((lats > 90) | (lats < -90) | (lons < -180) | (lons > 180)).any():
+            raise ValueError("""invalid lat, lon combination, outside of valid bounds:\n
+                lat:[-90,90]\n
+                lon:[-180,180]""")
+        if len(coords) == 0:
+            return []
+        points = shapely.points(np.column_stack(get_transformer().transform(lons, lats)))
+        point_idx, street_idx = self.tree.query(
+            points, predicate='dwithin', distance=max_distance)
+        distances = shapely.distance(points[point_idx], self.projected[street_idx])
+        # Keep strictly closer streets, grouped by point and sorted by distance
+        keep = distances < max_distance
+        point_idx, street_idx, distances = point_idx[keep], street_idx[keep], distances[keep]
+        order = np.lexsort((distances, point_idx))
+        point_idx, street_idx, distances = point_idx[order], street_idx[order], distances[order]
+        bounds = np.searchsorted(point_idx, np.arange(len(coords) + 1))
+
+        gdfs = []
+        for i in range(len(coords)):
+            rows = slice(bounds[i], bounds[i + 1])
+            filtered = self.gdf.iloc[street_idx[rows]].copy()
+            filtered['distance'] = distances[rows]
+            gdfs.append(filtered)
+        return gdfs
+
+
+@lru_cache(maxsize=1)
+def load_street_index():
+    """
+    Reads data/SeattleGISData/udistrict_streets.geojson and builds its
+    StreetIndex once per process.
+
+    Returns
+    -------
+    street_index : StreetIndex
+        The shared index of the U-District streets
+    """
+    return StreetIndex(gpd.read_file(UDISTRICT_STREETS_PATH))
+
+
+def filter_geodf(gdf, lat, lon, max_distance=10, street_index=None):
     """
     Given a latitude and longitude, returns a geopandas
     dataframe with the closest street objects within the
@@ -161,7 +330,10 @@ def filter_geodf(gdf, lat, lon, max_distance=10):
     max_distance: int (default=10)
         The max distance of streets from the point
         in meters
-    
+    street_index: StreetIndex (default=None)
+        A prebuilt index of `gdf`. When None, one is
+        built for this call.
+
     Returns
     -------
     gdf : Geopandas dataframe
@@ -179,41 +351,56 @@ def filter_geodf(gdf, lat, lon, max_distance=10):
             - geometry (geometry) : shapely geometry object
             - distance (float64) : distance in meters from the point
     """
+    return filter_geodf_batch(gdf, [(lat, lon)], max_distance=max_distance,
+                              street_index=street_index)[0]
 
-    if not isinstance(gdf, type(gpd.GeoDataFrame())):
-        raise TypeError("gdf must be a geopandas.GeoDataFrame")
-    if (lat > 90) | (lat < -90) | (lon <-180) | (lon > 180):
-        raise ValueError("""invalid lat, lon combination, outside of valid bounds:\n
-            lat:[-90,90]\n
-            lon:[-180,180]""")
-
-    # Point of interest
-    alert_point = Point([lon, lat])
-
-    # Define transformation
-    project = pyproj.Transformer.from_proj(
-        pyproj.Proj("EPSG:4326"),
-        pyproj.Proj("EPSG:32610"), always_xy=True)
 
-    # Projecting point
-    projected_alert_point = transform(project.transform, alert_point)
+def filter_geodf_batch(gdf, coords, max_distance=10, street_index=None):
+    """
+    Batched form of filter_geodf that handles all the
+    alert points of a map in one vectorized query.
 
-    distances = []
-    for street in gdf.geometry:
-        # Projecting each linestring
-        projected_street = transform(project.transform, street)
-        # find the nearest points on the line and point geometries
-        nearest_point_on_line, nearest_point_on_point = nearest_points(projected_street,
-            projected_alert_point)
-        # calculate the distance between the two nearest points
-        distance = nearest_point_on_line.distance(nearest_point_on_point)
-        distances.append(distance)
+    Parameters
+    ----------
+    gdf : Geopandas dataframe
+        The geopandas dataframe with the streets
+        data geometries
+    coords : list of (lat, lon)
+        The locations of the alerts
+    max_distance: int (default=10)
+        The max distance of streets from each point
+        in meters
+    street_index: StreetIndex (default=None)
+        A prebuilt index of `gdf`. When None, one is
+        built for this call.
 
-    gdf['distance'] = distances
-    gdf = gdf.sort_values('distance')
-    gdf = gdf[gdf['distance'] < max_distance]
+    Returns
+    -------
+    gdfs : list of Geopandas dataframes
+        One filter_geodf result per point, in the order of `coords`
+    """
+    if not isinstance(gdf, type(gpd.GeoDataFrame())):
+        raise TypeError("gdf must be a geopandas.GeoDataFrame")
+    if street_index is None:
+        street_index = StreetIndex(gdf)
+    return street_index.query_many(coords, max_distance=max_distance)
 
-    return gdf
+def get_base_map():
+    """
+    Returns
+    -------
+    alert_map : folium.Map
+        An empty map of the U-district area with the Mapbox dark tiles
+    """
+    # pylint: disable=line-too-long
+    mapbox_api_key=os.getenv('MAPBOX_API_KEY')
+    tileset_id_str = "dark-v11"
+    tilesize_pixels = "512"
+    tile = f"https://api.mapbox.com/styles/v1/mapbox/{tileset_id_str}/tiles/{tilesize_pixels}/{{z}}/{{x}}/{{y}}@2x?access_token={mapbox_api_key}"
+    return folium.Map(location=[47.66, -122.32],
+                    zoom_start=15,
+                    tiles = tile,
+                    attr="Maptiler Dark")
 
 # pylint: disable=too-many-locals
 def get_folium_map(alert_df: pd.DataFrame):
@@ -253,18 +440,8 @@ def get_folium_map(alert_df: pd.DataFrame):
             raise ValueError("""alert_df must have the following columns: Incident Category,
                                 Incident Alert, Nearest Address to Incident, geometry""")
     # Display the U-District area
-    dirname = os.path.dirname(__file__)
-    udistrict_streets = os.path.join(dirname, "../../data/SeattleGISData/udistrict_streets.geojson")
-    gdf = gpd.read_file(udistrict_streets)
-    # pylint: disable=line-too-long
-    mapbox_api_key=os.getenv('MAPBOX_API_KEY')
-    tileset_id_str = "dark-v11"
-    tilesize_pixels = "512"
-    tile = f"https://api.mapbox.com/styles/v1/mapbox/{tileset_id_str}/tiles/{tilesize_pixels}/{{z}}/{{x}}/{{y}}@2x?access_token={mapbox_api_key}"
-    alert_map = folium.Map(location=[47.66, -122.32],
-                    zoom_start=15,
-                    tiles = tile,
-                    attr="Maptiler Dark")
+    street_index = load_street_index()
+    alert_map = get_base_map()
 
     alert_coords = [list(loc["location"].values()) for loc in alert_df["geometry"]]
     alert_categories = list(alert_df["Incident Category"])
@@ -273,11 +450,15 @@ def get_folium_map(alert_df: pd.DataFrame):
     date = list(alert_df['Date'])
     alert_report_time = list(alert_df["Report Time"])
 
+    # Streets that are close to each alert, found in one batched query
+    nearby_streets = filter_geodf_batch(street_index.gdf, alert_coords,
+                                        street_index=street_index)
+
     marker_dict = {}
     # Plotting each alert on the map
     for i, coord in enumerate(alert_coords):
         # Display streets that are close to the alert
-        filtered_streets = filter_geodf(gdf, coord[0], coord[1])
+        filtered_streets = nearby_streets[i]
         folium.Choropleth(
             geo_data=filtered_streets,
             line_weight=3,